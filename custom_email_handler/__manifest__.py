@@ -15,7 +15,9 @@
         'security/ir.model.access.csv',
         'views/sendgrid_config_views.xml',
         'views/res_config_settings_views.xml',
+        'views/sendgrid_event_views.xml',
         'data/sendgrid_data.xml',
+        'data/ir_cron_data.xml',
     ],
     'installable': True,
     'auto_install': False,
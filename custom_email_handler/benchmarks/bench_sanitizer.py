@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark the precompiled content sanitizer against the legacy multi-pass cleaning.
+
+Runs without an Odoo server (``html_sanitize`` is not part of the measurement):
+
+    python3 custom_email_handler/benchmarks/bench_sanitizer.py [--size-kb 512] [--rounds 20] [--fuzz 200000]
+
+Before timing, random bodies built from markers, phrases and word fragments are cleaned
+by both implementations, which must give identical output.
+"""
+import argparse
+import importlib.util
+import random
+import re
+import time
+from pathlib import Path
+
+_spec = importlib.util.spec_from_file_location(
+    "content_sanitizer", Path(__file__).resolve().parent.parent / "tools" / "content_sanitizer.py")
+content_sanitizer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(content_sanitizer)
+
+LEGACY_BODY_REPLACEMENTS = {
+    r'\b(CLICK HERE|CLICK NOW)\b': 'View Details',
+    r'\b(BUY NOW|PURCHASE NOW)\b': 'View Product',
+    r'\b(LIMITED TIME|ACT NOW)\b': 'Available Now',
+    r'\b(URGENT|HURRY)\b': 'Important',
+    r'\b(FREE|100% FREE)\b': 'Complimentary',
+    r'\b(GUARANTEE|GUARANTEED)\b': 'Assured',
+    r'\b(AMAZING|INCREDIBLE)\b': 'Notable',
+}
+
+
+def legacy_clean_body(body):
+    body = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', body)
+    body = re.sub(r'\*\*', '', body)
+    for pattern, replacement in LEGACY_BODY_REPLACEMENTS.items():
+        body = re.sub(pattern, replacement, body, flags=re.IGNORECASE)
+    return body
+
+
+# Fragments the fuzzed bodies are made of: markers, phrases, their pieces and separators
+FUZZ_TOKENS = (
+    "**", "*", "***", " ", "\n", "<p>", "</p>", ">", "-", "%", "x", "ed", "d", "here", "now", "100",
+    "100% ", "free", "FREE", "Free", "click", "click here", "CLICK NOW", "buy now", "purchase now",
+    "limited time", "act now", "urgent", "hurry", "guarantee", "guaranteed", "amazing", "incredible",
+)
+
+
+def fuzz(engine, cases, seed=0):
+    """Compare ``engine`` with the legacy cleaning on ``cases`` random bodies; return the mismatches."""
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(cases):
+        body = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 12)))
+        if engine.clean_body(body) != legacy_clean_body(body):
+            mismatches.append(body)
+    return mismatches
+
+
+def make_newsletter(size_kb):
+    block = (
+        '<tr><td class="content" style="padding:12px;font-family:Arial">'
+        '<h2>**Amazing** offers this week</h2>'
+        '<p>Our <a href="https://example.com/p?id=42">latest catalogue</a> is out. CLICK HERE to browse '
+        'it, or simply reply to this email. Delivery is free for orders above 100 GEL, '
+        'satisfaction guaranteed. Hurry, this is a limited time offer.</p>'
+        '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor '
+        'incididunt ut labore et dolore magna aliqua.</p></td></tr>\n'
+    )
+    repeat = max(1, size_kb * 1024 // len(block))
+    return '<html><body><table>' + block * repeat + '</table></body></html>'
+
+
+def bench(fn, body, rounds):
+    best = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn(body)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--fuzz", type=int, default=200000, help="random bodies compared with the legacy output")
+    args = parser.parse_args()
+
+    body = make_newsletter(args.size_kb)
+    engine = content_sanitizer.get_sanitizer()
+    if engine.clean_body(body) != legacy_clean_body(body):
+        raise SystemExit("precompiled output differs from legacy output")
+    mismatches = fuzz(engine, args.fuzz)
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} of {args.fuzz} fuzzed bodies differ from legacy output, "
+                         f"e.g. {mismatches[0]!r}")
+    print(f"fuzzed bodies  : {args.fuzz} identical to legacy")
+
+    legacy = bench(legacy_clean_body, body, args.rounds)
+    single = bench(engine.clean_body, body, args.rounds)
+    print(f"body size      : {len(body) / 1024:.0f} KiB")
+    print(f"legacy (9 pass): {legacy * 1000:8.2f} ms")
+    print(f"precompiled    : {single * 1000:8.2f} ms")
+    print(f"speedup        : {legacy / single:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
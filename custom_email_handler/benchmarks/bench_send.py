@@ -0,0 +1,152 @@
+"""Throughput benchmark of the SendGrid send path against the local mock server.
+
+Pushes N ``mail.mail`` records through ``MailMail._send_via_custom_service`` with a
+temporary ``sendgrid.config`` pointed at ``tools/mock_sendgrid.py``, then reports
+messages/sec, request latency percentiles, memory high-water mark and query count.
+Everything runs inside a savepoint that is rolled back, so it is safe on a copy of a
+production database. From ``odoo-bin shell -d <db>``:
+
+    from odoo.addons.custom_email_handler.benchmarks.bench_send import run_benchmark
+    run_benchmark(env, n=1000, latency_ms=80, max_in_flight=8)
+    run_benchmark(env, n=1000, batch_send=True, same_body=True)
+"""
+import logging
+import resource
+import threading
+import time
+import tracemalloc
+
+from odoo.addons.custom_email_handler.tools import mock_sendgrid, sendgrid_client
+
+_logger = logging.getLogger(__name__)
+
+BODY_BLOCK = (
+    '<p>Hello {name}, our <a href="https://example.com/catalogue">latest catalogue</a> is out. '
+    'CLICK HERE to browse it, or simply reply to this email. Lorem ipsum dolor sit amet, '
+    'consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.</p>\n'
+)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _make_body(index, body_kb, same_body):
+    block = BODY_BLOCK.format(name="customer" if same_body else f"customer {index}")
+    return "<div>" + block * max(1, body_kb * 1024 // len(block)) + "</div>"
+
+
+def run_benchmark(env, n=500, latency_ms=50, jitter_ms=0, error_rate=0.0, rate_limit=0,
+                  batch_send=False, max_in_flight=1, recipients_per_mail=1, body_kb=10,
+                  same_body=False, trace_memory=True):
+    """Send ``n`` generated mails through the mock server and return the measured figures.
+
+    :param latency_ms, jitter_ms, error_rate, rate_limit: mock server behaviour
+      (see ``MockSendGridServer``); ``rate_limit`` is in requests per second
+    :param batch_send, max_in_flight: the matching ``custom_email_handler.*`` settings
+    :param same_body: give all mails the same body, which is what batching groups on
+    :param trace_memory: track the Python heap peak with ``tracemalloc`` (slower)
+    """
+    server = mock_sendgrid.MockSendGridServer(
+        latency=latency_ms / 1000, jitter=jitter_ms / 1000, error_rate=error_rate, rate_limit=rate_limit,
+    ).start()
+    latencies = []
+    latencies_lock = threading.Lock()
+    mail_ids = []
+    config_id = None
+    try:
+        with env.cr.savepoint(flush=False):
+            IrConfigParam = env['ir.config_parameter'].sudo()
+            for key, value in (
+                ('use_custom_service', 'True'),
+                ('batch_send', 'True' if batch_send else ''),
+                ('max_in_flight', str(max_in_flight)),
+                ('rate_limit', ''),
+                ('max_retries', '0'),
+            ):
+                IrConfigParam.set_param(f'custom_email_handler.{key}', value)
+
+            SendGridConfig = env['sendgrid.config'].sudo()
+            SendGridConfig.search([]).write({'active': False})
+            config = SendGridConfig.create({
+                'name': 'Benchmark (mock server)',
+                'api_key': 'SG.benchmark',
+                'api_url': server.url,
+                'sender_email': 'bench@example.com',
+                'routing_weight': 1,
+            })
+            config_id = config.id
+
+            mails = env['mail.mail'].sudo().create([{
+                'subject': 'Benchmark newsletter',
+                'body_html': _make_body(i, body_kb, same_body),
+                'email_to': ','.join(f'bench{i}.{r}@example.com' for r in range(recipients_per_mail)),
+                'auto_delete': False,
+            } for i in range(n)])
+            mail_ids = mails.ids
+            env.flush_all()
+
+            # Time every HTTP request as the pooled client sees it
+            client = config._get_sendgrid_client()
+            send = client.send
+
+            def timed_send(data):
+                t0 = time.perf_counter()
+                try:
+                    return send(data)
+                finally:
+                    with latencies_lock:
+                        latencies.append(time.perf_counter() - t0)
+            client.send = timed_send
+
+            if trace_memory:
+                tracemalloc.start()
+            queries_before = getattr(env.cr, 'sql_log_count', 0)
+            t0 = time.perf_counter()
+            mails.send(auto_commit=False)
+            env.flush_all()
+            elapsed = time.perf_counter() - t0
+            queries = getattr(env.cr, 'sql_log_count', 0) - queries_before
+            heap_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            if trace_memory:
+                tracemalloc.stop()
+
+            states = {}
+            for mail in mails:
+                states[mail.state] = states.get(mail.state, 0) + 1
+            raise _Rollback()
+    except _Rollback:
+        pass
+    finally:
+        server.stop()
+        # The savepoint rollback restored the old configurations behind the routing cache
+        env.registry.clear_cache()
+        if config_id:
+            sendgrid_client.invalidate([(env.cr.dbname, config_id)])
+        if mail_ids:
+            with env.registry.cursor() as cr:
+                cr.execute("DELETE FROM sendgrid_send_ledger WHERE mail_id = ANY(%s)", [mail_ids])
+
+    result = {
+        'mails': n,
+        'seconds': round(elapsed, 3),
+        'mails_per_second': round(n / elapsed, 1) if elapsed else 0.0,
+        'requests': len(latencies),
+        'latency_ms': {
+            f'p{pct}': round(_percentile(latencies, pct) * 1000, 1) for pct in (50, 95, 99)
+        },
+        'queries': queries,
+        'heap_peak_kb': heap_peak // 1024 if heap_peak is not None else None,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'states': states,
+        'server': dict(server.stats),
+    }
+    _logger.info("[SendGrid] Benchmark | %s", result)
+    return result
+
+
+class _Rollback(Exception):
+    """Raised to roll the benchmark savepoint back once the figures are collected."""
@@ -1,52 +1,155 @@
+import base64
 import json
 import logging
 from odoo import http
 from odoo.http import request
 
+from ..tools import event_signature
+
 _logger = logging.getLogger(__name__)
 
+# Emails stored per create() call while reading streamed (NDJSON) bodies
+INBOUND_BATCH_SIZE = 200
+# JSON bodies are parsed in memory as a whole; larger posts must use NDJSON
+INBOUND_JSON_MAX_BYTES = 32 * 1024 * 1024
+
+
 class SendGridWebhook(http.Controller):
     
     @http.route('/webhook/sendgrid/incoming', type='http', auth='public', methods=['POST'], csrf=False)
     def handle_incoming_email(self, **kwargs):
-        """Handle incoming email webhooks from SendGrid"""
+        """Handle incoming email webhooks from SendGrid.
+
+        Accepts SendGrid Inbound Parse multipart posts, a JSON email object, a JSON array
+        of emails, or newline-delimited JSON (one email per line, read as a stream).
+        JSON bodies are loaded in memory whole and refused (413) above ``INBOUND_JSON_MAX_BYTES``;
+        send NDJSON for larger posts. Emails are only queued here; messages are created
+        by a cron in batches.
+        """
         try:
-            data = json.loads(request.httprequest.get_data())
-            
-            # Process the incoming email data
-            self._process_webhook_email(data)
-            
-            return json.dumps({'status': 'success'})
+            content_type = (request.httprequest.mimetype or '').lower()
+            if content_type == 'multipart/form-data':
+                queued = self._queue_multipart_email()
+            elif content_type in ('application/x-ndjson', 'application/jsonl'):
+                queued = self._queue_ndjson_emails()
+            else:
+                too_large = (request.httprequest.content_length or 0) > INBOUND_JSON_MAX_BYTES
+                if not too_large:
+                    # Content-Length is missing on chunked posts: the read itself is bounded
+                    body = request.httprequest.stream.read(INBOUND_JSON_MAX_BYTES + 1)
+                    too_large = len(body) > INBOUND_JSON_MAX_BYTES
+                if too_large:
+                    message = ("JSON body larger than %d bytes, post it as application/x-ndjson"
+                               % INBOUND_JSON_MAX_BYTES)
+                    _logger.warning("Refused SendGrid inbound post: %s", message)
+                    return request.make_json_response({'status': 'error', 'message': message}, status=413)
+                data = json.loads(body)
+                queued = self._queue_json_emails(data if isinstance(data, list) else [data])
+
+            if queued:
+                request.env.ref('custom_email_handler.ir_cron_process_sendgrid_inbound').sudo()._trigger()
+            return json.dumps({'status': 'success', 'queued': queued})
             
         except Exception as e:
             _logger.error(f"Error processing SendGrid webhook: {str(e)}")
             return json.dumps({'status': 'error', 'message': str(e)})
-    
-    def _process_webhook_email(self, data):
-        """Process incoming email from SendGrid webhook data"""
-        # Extract email details from SendGrid webhook data
-        
-        sender = data.get('from', {}).get('email', '')
-        subject = data.get('subject', '')
-        body_html = data.get('html', '')
-        body_text = data.get('text', '')
-        
-        # Create mail message in Odoo
-        mail_message = request.env['mail.message'].sudo().create({
-            'subject': subject,
-            'body': body_html or body_text,
-            'email_from': sender,
-            'message_type': 'email',
-        })
-        
-        # Process attachments if any
-        attachments = data.get('attachments', [])
-        for attachment in attachments:
-            request.env['ir.attachment'].sudo().create({
+
+    @http.route('/webhook/sendgrid/events', type='http', auth='public', methods=['POST'], csrf=False)
+    def handle_events(self, **kwargs):
+        """Handle SendGrid Event Webhook posts (a JSON array of delivery/engagement events).
+
+        Posts must carry a valid Signed Event Webhook signature for the public key set in
+        the settings; others are refused, so delivery statistics cannot be forged. Events
+        are bulk inserted in the request; a non-2xx answer makes SendGrid redeliver the
+        batch, and redelivered events are deduplicated on ``sg_event_id``.
+        """
+        payload = request.httprequest.get_data()
+        public_key = request.env['ir.config_parameter'].sudo().get_param(
+            'custom_email_handler.event_webhook_public_key')
+        if not public_key:
+            _logger.error("Refused SendGrid event webhook post: no verification key is configured")
+            return request.make_json_response({'status': 'error', 'message': 'Webhook not configured'}, status=403)
+        headers = request.httprequest.headers
+        if not event_signature.verify(public_key, headers.get(event_signature.SIGNATURE_HEADER),
+                                      headers.get(event_signature.TIMESTAMP_HEADER), payload):
+            _logger.warning("Refused SendGrid event webhook post with an invalid signature")
+            return request.make_json_response({'status': 'error', 'message': 'Invalid signature'}, status=403)
+        try:
+            events = json.loads(payload)
+            if isinstance(events, dict):
+                events = [events]
+            created = request.env['sendgrid.event'].sudo()._ingest(events)
+            return request.make_json_response({'status': 'success', 'received': len(events), 'stored': created})
+        except Exception as e:
+            _logger.error(f"Error processing SendGrid event webhook: {str(e)}")
+            return request.make_json_response({'status': 'error', 'message': str(e)}, status=500)
+
+    def _queue_json_emails(self, items):
+        """Queue JSON email objects (``from``, ``subject``, ``html``, ``text``, ``attachments``)."""
+        Inbound = request.env['sendgrid.inbound.email']
+        emails, attachments = [], {}
+        for data in items:
+            if not isinstance(data, dict):
+                continue
+            sender = data.get('from') or {}
+            emails.append({
+                'sender': sender.get('email', '') if isinstance(sender, dict) else str(sender),
+                'subject': data.get('subject', ''),
+                'body_html': data.get('html', ''),
+                'body_text': data.get('text', ''),
+            })
+            atts = [{
                 'name': attachment.get('name'),
                 'datas': attachment.get('content'),
-                'res_model': 'mail.message',
-                'res_id': mail_message.id,
+            } for attachment in data.get('attachments') or []]
+            if atts:
+                attachments[len(emails) - 1] = atts
+        if emails:
+            Inbound._enqueue(emails, attachments)
+        return len(emails)
+
+    def _queue_ndjson_emails(self):
+        """Queue newline-delimited JSON emails, parsing the body line by line."""
+        queued, batch = 0, []
+        for line in request.httprequest.stream:
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= INBOUND_BATCH_SIZE:
+                queued += self._queue_json_emails(batch)
+                batch = []
+        if batch:
+            queued += self._queue_json_emails(batch)
+        return queued
+
+    def _queue_multipart_email(self):
+        """Queue a SendGrid Inbound Parse post.
+
+        Werkzeug spools uploaded files to temporary files while parsing, so attachments
+        are read one at a time instead of together with the whole request body.
+        """
+        form = request.httprequest.form
+        files = request.httprequest.files
+        try:
+            attachment_info = json.loads(form.get('attachment-info') or '{}')
+        except ValueError:
+            attachment_info = {}
+
+        atts = []
+        for field_name, storage in files.items(multi=True):
+            info = attachment_info.get(field_name) or {}
+            atts.append({
+                'name': info.get('filename') or storage.filename or field_name,
+                'mimetype': info.get('type') or storage.mimetype or 'application/octet-stream',
+                'datas': base64.b64encode(storage.read()),
             })
-        
-        _logger.info(f"Processed SendGrid incoming email: {subject} from {sender}")
\ No newline at end of file
+            storage.close()
+
+        request.env['sendgrid.inbound.email']._enqueue([{
+            'sender': form.get('from', ''),
+            'subject': form.get('subject', ''),
+            'body_html': form.get('html', ''),
+            'body_text': form.get('text', ''),
+        }], {0: atts} if atts else None)
+        return 1
@@ -1,3 +1,7 @@
 from . import email_service
 from . import mail_thread
-from . import res_config_settings
\ No newline at end of file
+from . import res_config_settings
+from . import sendgrid_inbound
+from . import sendgrid_event
+from . import sendgrid_ledger
+from . import incoming_mail_job
@@ -4,19 +4,39 @@ import logging
 import re
 import time
 
-from odoo import fields, models, _
+import requests
+
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError
 from odoo.tools import html_sanitize
 
-from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import (
-    Mail, Email, Attachment, FileContent, FileName, FileType, Disposition, ReplyTo
+    Mail, Email, To, Personalization, CustomArg, Attachment, FileContent, FileName, FileType, Disposition, ReplyTo
 )
 from sendgrid.helpers.mail.header import Header
 from sendgrid.helpers.mail.category import Category
 
+from ..tools import content_sanitizer, rate_limiter, render_cache, send_metrics, sendgrid_client, sendgrid_router
+
 _logger = logging.getLogger(__name__)
 
+# SendGrid v3 limit on personalizations (and total recipients) per /mail/send request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+class SendGridSendError(UserError):
+    """A failed SendGrid request, classified for the retry scheduler.
+
+    ``retry_at`` is the epoch time before which the request should not be retried
+    (only set for rate-limited requests); permanent errors have ``retryable`` False.
+    """
+
+    def __init__(self, message, status_code=None, retryable=False, retry_at=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_at = retry_at
+
 
 class SendGridConfig(models.Model):
     _name = "sendgrid.config"
@@ -29,6 +49,106 @@ class SendGridConfig(models.Model):
     sender_email = fields.Char(string="Default Sender Email", required=True)
     sender_name = fields.Char(string="Default Sender Name")
     active = fields.Boolean(default=True)
+    body_cleaning_rules = fields.Text(
+        string="Body Replacement Rules",
+        help="One 'PHRASE => Replacement' rule per line, matched case-insensitively on whole "
+             "words of the HTML body. Leave empty to use the built-in promotional phrase list.",
+    )
+    subject_blocked_phrases = fields.Text(
+        string="Subject Blocked Phrases",
+        help="One phrase per line removed from subject lines. Leave empty to use the built-in list.",
+    )
+    routing_weight = fields.Integer(
+        string="Routing Weight", default=0,
+        help="Share of outbound mail sent through this configuration (weighted round-robin among "
+             "configurations with a positive weight). With no positive weight anywhere, the default "
+             "configuration from the settings is used.",
+    )
+    sender_domains = fields.Char(
+        string="Sender Domains",
+        help="Comma-separated sender domains (e.g. example.com) whose mail is always routed to this "
+             "configuration.",
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Key, URL or archival changes must not keep using a stale pooled client
+        sendgrid_client.invalidate(self._config_keys())
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        keys = self._config_keys()
+        res = super().unlink()
+        sendgrid_client.invalidate(keys)
+        self.env.registry.clear_cache()
+        return res
+
+    def _config_keys(self):
+        """Keys of the process-wide clients, buckets and throttle state of these configurations.
+
+        They include the database name since databases served by one process share ids.
+        """
+        return [(self.env.cr.dbname, config_id) for config_id in self.ids]
+
+    @api.model
+    @tools.ormcache()
+    def _get_routing_table(self):
+        """Active configurations as ``((id, weight, sender_domains), ...)``.
+
+        Cached until a configuration is created, written or deleted, so routing does not
+        search configurations for every batch.
+        """
+        return tuple(
+            (config.id, config.routing_weight, tuple(
+                domain.strip().lstrip("@").lower()
+                for domain in (config.sender_domains or "").split(",") if domain.strip()
+            ))
+            for config in self.sudo().search([("active", "=", True)])
+        )
+
+    @api.model
+    def _route(self, sender_email=None):
+        """Pick the configuration that should send mail from ``sender_email``.
+
+        Configurations listing the sender's domain win; otherwise mail is spread by
+        weighted round-robin over configurations with a positive weight. Without
+        weights, the default configuration of the settings (or the first active one) is
+        used. Configurations whose API key is currently rate-limited are skipped in favour
+        of the others of their pool, then of any other active configuration; only when
+        every key is throttled does mail keep its first choice.
+        """
+        table = self._get_routing_table()
+        if not table:
+            return self.browse()
+
+        dbname = self.env.cr.dbname
+        available = [row for row in table if not sendgrid_router.is_throttled((dbname, row[0]))]
+
+        domain = (sender_email or "").rpartition("@")[2].strip(" >").lower()
+        pool = [row for row in table if domain and domain in row[2]]
+        if not pool:
+            pool = [row for row in table if not row[2] and row[1] > 0]
+        if not pool:
+            IrConfigParam = self.env['ir.config_parameter'].sudo()
+            try:
+                default_id = int(IrConfigParam.get_param('custom_email_handler.default_service_id') or 0)
+            except ValueError:
+                default_id = 0
+            ids = [row[0] for row in table]
+            pool = [table[ids.index(default_id) if default_id in ids else 0]]
+
+        candidates = [row for row in pool if row in available] or available or pool
+        if len(candidates) == 1:
+            return self.browse(candidates[0][0])
+        _db, config_id = sendgrid_router.router.pick([((dbname, row[0]), max(row[1], 1)) for row in candidates])
+        return self.browse(config_id)
 
     def send_email(self, to_emails, subject, body_html, attachments=None, cc=None, bcc=None, reply_to=None):
         self.ensure_one()
@@ -63,34 +183,21 @@ class SendGridConfig(models.Model):
         _logger.debug("[SendGrid] _norm_list from scalar -> %s", out)
         return out
 
+    def _get_content_sanitizer(self):
+        """Return the compiled cleaning engine for this configuration's rules."""
+        return content_sanitizer.get_sanitizer(
+            content_sanitizer.parse_body_rules(self.body_cleaning_rules),
+            content_sanitizer.parse_subject_phrases(self.subject_blocked_phrases),
+        )
+
     def _clean_email_body(self, body_html):
         """Clean email body content to improve deliverability and avoid promotions folder"""
         if not body_html:
             return ""
         
-        # Convert to string if not already
-        body = str(body_html)
-        
-        # Remove or convert problematic ** symbols that might interfere with email delivery
-        # Convert **text** to <strong>text</strong> for proper HTML formatting
-        body = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', body)
-        
-        # Remove any remaining lone ** symbols
-        body = re.sub(r'\*\*', '', body)
-        
-        # Replace promotional language with more neutral alternatives
-        promotional_replacements = {
-            r'\b(CLICK HERE|CLICK NOW)\b': 'View Details',
-            r'\b(BUY NOW|PURCHASE NOW)\b': 'View Product',
-            r'\b(LIMITED TIME|ACT NOW)\b': 'Available Now',
-            r'\b(URGENT|HURRY)\b': 'Important',
-            r'\b(FREE|100% FREE)\b': 'Complimentary',
-            r'\b(GUARANTEE|GUARANTEED)\b': 'Assured',
-            r'\b(AMAZING|INCREDIBLE)\b': 'Notable',
-        }
-        
-        for pattern, replacement in promotional_replacements.items():
-            body = re.sub(pattern, replacement, body, flags=re.IGNORECASE)
+        # Convert **text** to <strong>text</strong>, drop lone ** and replace
+        # promotional language with neutral alternatives (precompiled rules)
+        body = self._get_content_sanitizer().clean_body(str(body_html))
         
         # Sanitize HTML to ensure safe content
         try:
@@ -106,31 +213,50 @@ class SendGridConfig(models.Model):
         if not subject:
             return ""
         
-        # Remove excessive punctuation and symbols
-        subject = re.sub(r'[!]{2,}', '!', subject)  # Multiple exclamation marks
-        subject = re.sub(r'[?]{2,}', '?', subject)  # Multiple question marks
-        subject = re.sub(r'[$]{2,}', '$', subject)  # Multiple dollar signs
-        
-        # Remove promotional phrases from subject
-        promotional_patterns = [
-            r'\b(FREE|100% FREE)\b',
-            r'\b(URGENT|HURRY)\b', 
-            r'\b(ACT NOW|CLICK NOW)\b',
-            r'\b(LIMITED TIME|OFFER EXPIRES)\b',
-            r'\b(SALE|DISCOUNT)\b',
-            r'\b(WIN|WINNER)\b',
-            r'\b(GUARANTEE|GUARANTEED)\b'
-        ]
-        
-        for pattern in promotional_patterns:
-            subject = re.sub(pattern, '', subject, flags=re.IGNORECASE)
-        
-        # Clean up extra spaces
-        subject = re.sub(r'\s+', ' ', subject).strip()
+        # Collapse repeated !, ? and $, drop promotional phrases and extra spaces
+        subject = self._get_content_sanitizer().clean_subject(subject)
         
         _logger.debug("[SendGrid] Subject cleaned: %s", subject)
         return subject
 
+    def _render_email_body(self, body_html):
+        """Return ``(cleaned_html, plain_text)`` for a body, reusing earlier results.
+
+        Results are cached by body hash and cleaning-rule version, so a mass mailing
+        only cleans and converts each distinct body once per process.
+        """
+        if not body_html:
+            return "", ""
+        body = str(body_html)
+        key = render_cache.body_cache.make_key(body, self._get_content_sanitizer().version)
+        cached = render_cache.body_cache.get(key)
+        if cached is not None:
+            _logger.debug("[SendGrid] Body render cache hit (%s)", key)
+            return cached
+        cleaned_body = self._clean_email_body(body)
+        rendered = (cleaned_body, self._html_to_plain_text(cleaned_body))
+        render_cache.body_cache.put(key, rendered)
+        return rendered
+
+    @api.model
+    def get_send_metrics(self):
+        """Aggregated send-path metrics of this worker process (timings, counts, caches)."""
+        snapshot = send_metrics.metrics.snapshot()
+        snapshot["body_cache"] = render_cache.body_cache.stats()
+        return snapshot
+
+    @api.model
+    def reset_send_metrics(self):
+        send_metrics.metrics.reset()
+        return True
+
+    def _log_render_cache_stats(self):
+        stats = render_cache.body_cache.stats()
+        _logger.debug(
+            "[SendGrid] Body render cache | hits=%d | misses=%d | entries=%d | evictions=%d",
+            stats["hits"], stats["misses"], stats["entries"], stats["evictions"],
+        )
+
     def _html_to_plain_text(self, html_content):
         """Convert HTML content to plain text for better deliverability"""
         if not html_content:
@@ -189,33 +315,147 @@ class SendGridConfig(models.Model):
                     except Exception as e:
                         _logger.warning("[SendGrid] Failed to add category %s: %s", category_name, e)
 
+    def send_email_batch(self, recipient_groups, subject, body_html, attachments=None, reply_to=None):
+        """Send one message to several independent recipient groups in a single API call.
+
+        Each entry of ``recipient_groups`` becomes its own SendGrid personalization, so
+        recipients of different groups never see each other. SendGrid accepts at most
+        ``SENDGRID_MAX_PERSONALIZATIONS`` personalizations/recipients per request.
+        """
+        self.ensure_one()
+        _logger.debug(
+            "[SendGrid] send_email_batch called | groups=%d | subject_len=%s | body_len=%s | atts=%s",
+            len(recipient_groups or []),
+            len(subject or ""),
+            len(body_html or ""),
+            len(attachments or []),
+        )
+        return self._send_via_sendgrid_batch(recipient_groups, subject, body_html, attachments, reply_to)
+
     def _send_via_sendgrid(self, to_emails, subject, body_html, attachments=None, cc=None, bcc=None, reply_to=None):
         t0 = time.time()
+        client = self._get_sendgrid_client()
+        msg = self._prepare_sendgrid_message(to_emails, subject, body_html, attachments, cc, bcc, reply_to)
+        return deliver_sendgrid_message(client, msg, t0, self._get_rate_limiter())
+
+    def _send_via_sendgrid_batch(self, recipient_groups, subject, body_html, attachments=None, reply_to=None):
+        t0 = time.time()
+        client = self._get_sendgrid_client()
+        msg = self._prepare_sendgrid_batch_message(recipient_groups, subject, body_html, attachments, reply_to)
+        return deliver_sendgrid_message(client, msg, t0, self._get_rate_limiter())
+
+    def _prepare_sendgrid_message(self, to_emails, subject, body_html, attachments=None, cc=None, bcc=None, reply_to=None,
+                                  custom_args=None):
+        """Build the complete message for one recipient list, without sending it.
+
+        ``custom_args`` are echoed back by SendGrid in Event Webhook events.
+        """
+        with send_metrics.metrics.timer("normalize"):
+            tos = self._norm_list(to_emails)
+        if not tos:
+            _logger.error("[SendGrid] No recipients after normalization")
+            raise UserError(_("At least one recipient is required"))
+        _logger.debug("[SendGrid] To list normalized: %s", tos)
+
+        msg = self._build_sendgrid_message(subject, body_html, attachments, reply_to, to_emails=tos)
+
+        cc_list = self._norm_list(cc)
+        for e in cc_list:
+            msg.add_cc(e)
+        if cc_list:
+            _logger.debug("[SendGrid] CC: %s", cc_list)
+
+        bcc_list = self._norm_list(bcc)
+        for e in bcc_list:
+            msg.add_bcc(e)
+        if bcc_list:
+            _logger.debug("[SendGrid] BCC: %s", bcc_list)
+
+        for name, value in (custom_args or {}).items():
+            msg.add_custom_arg(CustomArg(name, str(value)))
+
+        return msg
+
+    def _prepare_sendgrid_batch_message(self, recipient_groups, subject, body_html, attachments=None, reply_to=None,
+                                        custom_args=None):
+        """Build one message with a personalization per recipient group, without sending it.
+
+        ``custom_args``, when given, is a list parallel to ``recipient_groups`` holding
+        the custom args of each personalization (echoed back in Event Webhook events).
+        """
+        args_list = custom_args or [None] * len(recipient_groups or [])
+        with send_metrics.metrics.timer("normalize"):
+            normalized = [(self._norm_list(g), args) for g, args in zip(recipient_groups or [], args_list)]
+            normalized = [(tos, args) for tos, args in normalized if tos]
+            groups = [tos for tos, _args in normalized]
+        if not groups:
+            _logger.error("[SendGrid] No recipients after normalization")
+            raise UserError(_("At least one recipient is required"))
+        total_recipients = sum(len(tos) for tos in groups)
+        if len(groups) > SENDGRID_MAX_PERSONALIZATIONS or total_recipients > SENDGRID_MAX_PERSONALIZATIONS:
+            raise UserError(_("SendGrid accepts at most %s recipients per request (got %s)")
+                            % (SENDGRID_MAX_PERSONALIZATIONS, total_recipients))
+
+        msg = self._build_sendgrid_message(subject, body_html, attachments, reply_to)
+        for tos, args in normalized:
+            personalization = Personalization()
+            for e in tos:
+                personalization.add_to(To(e))
+            for name, value in (args or {}).items():
+                personalization.add_custom_arg(CustomArg(name, str(value)))
+            msg.add_personalization(personalization)
+        _logger.debug("[SendGrid] Personalizations: %d | recipients: %d", len(groups), total_recipients)
+
+        return msg
+
+    def _get_sendgrid_client(self):
+        """Return the pooled HTTP client of this configuration (safe to use from any thread)."""
+        self.ensure_one()
+        sg = sendgrid_client.get_client(self._config_keys()[0], self._get_api_key(), self.api_url)
+        _logger.debug("[SendGrid] Client ready | host=%s | eu_mode=%s",
+                      sg.host, sg.host == sendgrid_client.EU_HOST)
+        return sg
+
+    def _get_rate_limiter(self):
+        """Return the token bucket shared by all threads sending through this configuration."""
+        self.ensure_one()
+        IrConfigParam = self.env['ir.config_parameter'].sudo()
+        try:
+            rate = float(IrConfigParam.get_param('custom_email_handler.rate_limit', 0) or 0)
+        except ValueError:
+            rate = 0
+        return rate_limiter.get_bucket(self._config_keys()[0], rate)
+
+    def _get_api_key(self):
         key = (self.api_key or "").strip()
         if not key:
             _logger.error("[SendGrid] Missing SendGrid API key")
             raise UserError(_("SendGrid API key is required"))
         _logger.debug("[SendGrid] Using API key=%s", key)
+        return key
 
-        tos = self._norm_list(to_emails)
-        if not tos:
-            _logger.error("[SendGrid] No recipients after normalization")
-            raise UserError(_("At least one recipient is required"))
-        _logger.debug("[SendGrid] To list normalized: %s", tos)
+    def _build_sendgrid_message(self, subject, body_html, attachments=None, reply_to=None, to_emails=None):
+        """Build the recipient-independent part of a SendGrid message.
 
-        # Clean subject line to avoid promotional flags
-        cleaned_subject = self._clean_subject_line(subject) or "(no subject)"
-        _logger.debug("[SendGrid] Subject resolved: %r", cleaned_subject)
+        When ``to_emails`` is given they all go into a single personalization, as before;
+        otherwise the caller adds personalizations itself.
+        """
+        with send_metrics.metrics.timer("clean"):
+            # Clean subject line to avoid promotional flags
+            cleaned_subject = self._clean_subject_line(subject) or "(no subject)"
+            _logger.debug("[SendGrid] Subject resolved: %r", cleaned_subject)
 
-        # Clean the email body to remove problematic ** symbols and promotional content
-        cleaned_body = self._clean_email_body(body_html)
+            # Clean the email body to remove problematic ** symbols and promotional content,
+            # and derive its plain text version (both cached per unique body)
+            cleaned_body, plain_content = self._render_email_body(body_html)
+        t_build = time.perf_counter()
 
         from_email = Email(self.sender_email, self.sender_name or None)
         _logger.debug("[SendGrid] From: %s (%s)", self.sender_email, self.sender_name or "")
 
         msg = Mail(
             from_email=from_email,
-            to_emails=tos,
+            to_emails=to_emails,
             subject=cleaned_subject,
             html_content=cleaned_body,
         )
@@ -235,7 +475,6 @@ class SendGridConfig(models.Model):
         # Set mail settings for better deliverability
         try:
             # Add plain text version to improve deliverability
-            plain_content = self._html_to_plain_text(cleaned_body)
             if plain_content:
                 from sendgrid.helpers.mail import Content
                 msg.add_content(Content("text/plain", plain_content))
@@ -259,18 +498,6 @@ class SendGridConfig(models.Model):
         
         _logger.debug("[SendGrid] HTML content length: %d (original: %d)", len(cleaned_body), len(body_html or ""))
 
-        cc_list = self._norm_list(cc)
-        for e in cc_list:
-            msg.add_cc(e)
-        if cc_list:
-            _logger.debug("[SendGrid] CC: %s", cc_list)
-
-        bcc_list = self._norm_list(bcc)
-        for e in bcc_list:
-            msg.add_bcc(e)
-        if bcc_list:
-            _logger.debug("[SendGrid] BCC: %s", bcc_list)
-
         if reply_to:
             msg.reply_to = ReplyTo(str(reply_to).strip())
             _logger.debug("[SendGrid] Reply-To: %s", str(reply_to).strip())
@@ -285,7 +512,11 @@ class SendGridConfig(models.Model):
                 ctype = a.get("type") or a.get("mimetype") or "application/octet-stream"
                 raw = a.get("content") or a.get("datas") or b""
                 orig_len = (len(raw) if isinstance(raw, (bytes, bytearray)) else len(str(raw)))
-                if isinstance(raw, bytes):
+                if a.get("b64") is not None:
+                    # Already encoded by the caller (e.g. the mail queue): no round trip
+                    b64 = a["b64"]
+                    orig_len = len(b64)
+                elif isinstance(raw, bytes):
                     b64 = base64.b64encode(raw).decode()
                 else:
                     s = str(raw)
@@ -308,58 +539,89 @@ class SendGridConfig(models.Model):
                 )
         _logger.debug("[SendGrid] Total attachments added: %d", att_count)
 
-        try:
+        send_metrics.metrics.add_timing("build", time.perf_counter() - t_build)
+        return msg
+
+
+def deliver_sendgrid_message(sg, msg, t0=None, limiter=None):
+    """POST a prepared message through a pooled client.
+
+    Does not touch the ORM, so it can run in dispatcher threads. Waits for a token of
+    ``limiter`` (a ``TokenBucket``) when given. Returns True when SendGrid accepted the
+    message and raises ``SendGridSendError`` otherwise: 429 and 5xx answers as well as
+    network errors are retryable, other 4xx answers are permanent.
+    """
+    t0 = t0 or time.time()
+    metrics = send_metrics.metrics
+    try:
+        with metrics.timer("serialize"):
             payload = msg.get()
-            _logger.debug("[SendGrid] SendGrid payload preview: %s", json.dumps(payload, ensure_ascii=False)[:2000])
-        except Exception as plerr:
-            _logger.debug("[SendGrid] Payload preview failed: %s", plerr)
+            data = sendgrid_client.serialize(payload)
+        personalizations = payload.get("personalizations") or []
+        metrics.incr(
+            requests=1,
+            payload_bytes=len(data),
+            recipients=sum(len(p.get(k) or []) for p in personalizations for k in ("to", "cc", "bcc")),
+            attachments=len(payload.get("attachments") or []),
+        )
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("[SendGrid] SendGrid payload preview: %s", data[:2000].decode(errors="replace"))
 
-        try:
-            sg = SendGridAPIClient(key)
-            eu_mode = False
-            if self.api_url and "api.eu.sendgrid.com" in self.api_url:
-                try:
-                    sg.set_sendgrid_data_residency("eu")
-                    eu_mode = True
-                except Exception:
-                    sg.host = "https://api.eu.sendgrid.com"
-                    eu_mode = True
-            _logger.debug("[SendGrid] Client ready | host=%s | eu_mode=%s",
-                          getattr(sg, "host", "https://api.sendgrid.com"), eu_mode)
-
-            t_send = time.time()
-            resp = sg.send(msg)
-            dt = time.time() - t_send
-            _logger.debug("[SendGrid] Send attempted | status=%s | duration_ms=%d",
-                          getattr(resp, "status_code", "n/a"), int(dt * 1000))
-
-            if resp.status_code in (200, 202):
-                _logger.info("SendGrid accepted mail: %s", resp.status_code)
-                _logger.debug("[SendGrid] Response headers keys: %s", list(getattr(resp, "headers", {}).keys()))
-                _logger.debug("[SendGrid] Total time ms: %d", int((time.time() - t0) * 1000))
-                return True
-
-            body_txt = ""
-            try:
-                body_txt = resp.body.decode() if getattr(resp, "body", None) else ""
-                if body_txt:
-                    j = json.loads(body_txt)
-                    body_txt = json.dumps(j.get("errors", j), ensure_ascii=False)
-            except Exception:
-                body_txt = body_txt or ""
-
-            _logger.error("SendGrid error %s: %s", resp.status_code, body_txt[:2000])
+        if limiter:
+            limiter.acquire()
+        t_send = time.time()
+        with metrics.timer("http"):
+            resp = sg.send(data)
+        dt = time.time() - t_send
+        _logger.debug("[SendGrid] Send attempted | status=%s | duration_ms=%d",
+                      getattr(resp, "status_code", "n/a"), int(dt * 1000))
+
+        if resp.status_code in (200, 202):
+            metrics.incr(accepted=1)
+            _logger.info("SendGrid accepted mail: %s", resp.status_code)
             _logger.debug("[SendGrid] Response headers keys: %s", list(getattr(resp, "headers", {}).keys()))
             _logger.debug("[SendGrid] Total time ms: %d", int((time.time() - t0) * 1000))
-            raise UserError(_("SendGrid error %s: %s") % (resp.status_code, body_txt or _("see logs")))
-        except Exception as e:
-            body_txt = ""
-            try:
-                body = getattr(e, "body", None)
-                if body:
-                    body_txt = json.dumps(json.loads(body), ensure_ascii=False)
-            except Exception:
-                pass
-            _logger.exception("Failed to send via SendGrid%s", f" ({body_txt})" if body_txt else "")
-            _logger.debug("[SendGrid] Total time ms: %d", int((time.time() - t0) * 1000))
-            raise UserError(_("Failed to send email: %s%s") % (str(e), f" | {body_txt}" if body_txt else ""))
+            return True
+
+        body_txt = ""
+        try:
+            body_txt = resp.body.decode() if getattr(resp, "body", None) else ""
+            if body_txt:
+                j = json.loads(body_txt)
+                body_txt = json.dumps(j.get("errors", j), ensure_ascii=False)
+        except Exception:
+            body_txt = body_txt or ""
+
+        _logger.error("SendGrid error %s: %s", resp.status_code, body_txt[:2000])
+        _logger.debug("[SendGrid] Response headers keys: %s", list(getattr(resp, "headers", {}).keys()))
+        _logger.debug("[SendGrid] Total time ms: %d", int((time.time() - t0) * 1000))
+        retry_at = None
+        if resp.status_code == 429:
+            retry_at = rate_limiter.rate_limit_reset(resp.headers)
+            sendgrid_router.mark_throttled(getattr(sg, "config_key", None), retry_at)
+            if limiter:
+                limiter.pause_until(retry_at)
+        raise SendGridSendError(
+            _("SendGrid error %s: %s") % (resp.status_code, body_txt or _("see logs")),
+            status_code=resp.status_code,
+            retryable=resp.status_code == 429 or resp.status_code >= 500,
+            retry_at=retry_at,
+        )
+    except SendGridSendError:
+        metrics.incr(failed=1)
+        raise
+    except Exception as e:
+        metrics.incr(failed=1)
+        body_txt = ""
+        try:
+            body = getattr(e, "body", None)
+            if body:
+                body_txt = json.dumps(json.loads(body), ensure_ascii=False)
+        except Exception:
+            pass
+        _logger.exception("Failed to send via SendGrid%s", f" ({body_txt})" if body_txt else "")
+        _logger.debug("[SendGrid] Total time ms: %d", int((time.time() - t0) * 1000))
+        raise SendGridSendError(
+            _("Failed to send email: %s%s") % (str(e), f" | {body_txt}" if body_txt else ""),
+            retryable=isinstance(e, requests.RequestException),
+        )
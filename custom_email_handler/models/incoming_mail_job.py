@@ -0,0 +1,84 @@
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import incoming_mail
+
+_logger = logging.getLogger(__name__)
+
+# Days a processed deferred job is kept before autovacuum removes it
+JOB_RETENTION_DAYS = 7
+
+
+class IncomingMailJob(models.Model):
+    """Incoming email waiting for a deferred handler (see ``mail.thread._get_incoming_mail_handlers``).
+
+    ``message_process`` only stores the raw message here; ``_cron_process_jobs`` then calls
+    each handler once per batch of messages, one transaction per batch.
+    """
+    _name = "incoming.mail.job"
+    _description = "Deferred Incoming Mail Handler Job"
+    _order = "id"
+
+    handler = fields.Char(required=True, index=True, readonly=True)
+    sender = fields.Char(readonly=True)
+    # Raw message bytes decoded as latin-1, which round-trips any byte sequence
+    raw = fields.Text(readonly=True)
+    state = fields.Selection([
+        ("pending", "Pending"),
+        ("done", "Processed"),
+        ("error", "Error"),
+    ], default="pending", required=True, index=True)
+    error = fields.Text(readonly=True)
+
+    @api.model
+    def _enqueue(self, handler_names, sender, raw):
+        jobs = self.sudo().create([{
+            "handler": name,
+            "sender": sender,
+            "raw": raw.decode("latin-1"),
+        } for name in handler_names])
+        self.env.ref("custom_email_handler.ir_cron_process_incoming_mail_jobs")._trigger()
+        return jobs
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=200):
+        """Run pending jobs, one handler call and one transaction per batch."""
+        handlers = self.env["mail.thread"]._get_incoming_handler_index().handlers
+        while True:
+            batch = self.sudo().search([("state", "=", "pending")], limit=batch_size)
+            if not batch:
+                break
+            for name, jobs in batch.grouped("handler").items():
+                jobs._run_handler(handlers.get(name))
+            if len(batch) < batch_size:
+                break
+            self.env.cr.commit()
+
+    def _run_handler(self, spec):
+        if not spec:
+            self.write({"state": "error", "error": "Handler is no longer declared"})
+            return
+        messages = [
+            incoming_mail.IncomingMessage(job.sender, incoming_mail.parse_headers(raw), raw)
+            for job in self
+            for raw in [job.raw.encode("latin-1")]
+        ]
+        try:
+            with self.env.cr.savepoint():
+                getattr(self.env[spec["model"]].sudo(), spec["method"])(messages)
+        except Exception as e:
+            _logger.exception("Incoming mail handler %s failed on %d message(s)", spec["name"], len(self))
+            self.write({"state": "error", "error": str(e)})
+            return
+        self.write({"state": "done", "raw": False})
+
+    @api.autovacuum
+    def _gc_done_jobs(self):
+        limit_date = fields.Datetime.now() - timedelta(days=JOB_RETENTION_DAYS)
+        self.env.cr.execute(SQL(
+            "DELETE FROM incoming_mail_job WHERE state = 'done' AND write_date < %s", limit_date,
+        ))
+        _logger.info("Removed %d processed incoming mail jobs", self.env.cr.rowcount)
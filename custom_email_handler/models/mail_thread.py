@@ -1,10 +1,36 @@
-from odoo import models, api
+from odoo import models, fields, api, tools
+import base64
 import logging
+import time
+from datetime import timedelta
 from odoo.exceptions import UserError
+from odoo.tools import SQL, email_split
 import re
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ..tools import attachment_cache, incoming_mail, rate_limiter
+from .email_service import SENDGRID_MAX_PERSONALIZATIONS, deliver_sendgrid_message
 
 _logger = logging.getLogger(__name__)
 
+
+# Zero-width + control chars and whitespace hidden in pasted addresses
+_HIDDEN_CHARS_RE = re.compile(r"[\u200B-\u200D\uFEFF\r\n\t ]+")
+
+
+def _sender_domain(email_from):
+    """Lower-cased domain of the first address in ``email_from``, or ``''``."""
+    addresses = email_split(email_from or '')
+    return addresses[0].rpartition('@')[2].lower() if addresses else ''
+
+
+def _sanitize_email(addr: str) -> str:
+    """Remove hidden characters and whitespace from an email string."""
+    if not addr:
+        return ""
+    return _HIDDEN_CHARS_RE.sub("", addr).strip()
+
+
 class MailThread(models.AbstractModel):
     _inherit = 'mail.thread'
     
@@ -17,15 +43,61 @@ class MailThread(models.AbstractModel):
             model, message, custom_values, save_original, strip_attachments, thread_id
         )
     
+    @api.model
+    def _get_incoming_mail_handlers(self):
+        """Declare incoming-mail handlers, see ``tools/incoming_mail.py`` for the format.
+
+        Override and extend the returned list to plug a handler in; handlers are called
+        with a list of ``IncomingMessage(sender, headers, raw)``.
+        """
+        return []
+
+    @api.model
+    @tools.ormcache()
+    def _get_incoming_handler_index(self):
+        return incoming_mail.build_index(self._get_incoming_mail_handlers())
+
     def _process_incoming_email(self, message):
-        """Process incoming email message"""
-        _logger.info("Processing incoming email through custom handler")
-        # Add your custom incoming email processing logic here
-        # This could involve parsing email content, extracting attachments,
-        # updating records, etc.
+        """Run the incoming-mail handlers matching ``message``.
+
+        Only the headers are parsed, and only when a handler is declared at all.
+        Immediate handlers run in a savepoint so a failing one cannot abort the mail
+        gateway; deferred ones are queued as ``incoming.mail.job`` records.
+        """
+        index = self._get_incoming_handler_index()
+        if not index.handlers:
+            return
+        raw = incoming_mail.to_bytes(message)
+        headers = incoming_mail.parse_headers(raw)
+        senders = email_split(headers.get('From') or '')
+        sender = senders[0].lower() if senders else ''
+        names = incoming_mail.match(index, sender, headers)
+        if not names:
+            return
+
+        deferred = [name for name in names if index.handlers[name].get('deferred')]
+        if deferred:
+            self.env['incoming.mail.job']._enqueue(deferred, sender, raw)
+        incoming = [incoming_mail.IncomingMessage(sender, headers, raw)]
+        for name in names:
+            spec = index.handlers[name]
+            if spec.get('deferred'):
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    getattr(self.env[spec['model']].sudo(), spec['method'])(incoming)
+            except Exception:
+                _logger.exception("Incoming mail handler %s failed for mail from %s", name, sender)
 
 class MailMail(models.Model):
     _inherit = 'mail.mail'
+
+    sendgrid_retry_count = fields.Integer(
+        'SendGrid Retries', default=0, copy=False,
+        help="Number of times SendGrid answered with a transient error (429, 5xx or network) for this email")
+    sendgrid_next_attempt = fields.Datetime(
+        'Next SendGrid Attempt', copy=False, index=True,
+        help="Retry scheduled after a transient SendGrid error; the email is not sent before this time")
     
     def send(self, auto_commit=False, raise_exception=False):
         """Override send method to use custom email service"""
@@ -40,68 +112,346 @@ class MailMail(models.Model):
 
             
     def _send_via_custom_service(self, auto_commit=False, raise_exception=False):
-        sendgrid_config = self.env['sendgrid.config'].search([('active', '=', True)], limit=1)
-        if not sendgrid_config:
+        SendGridConfig = self.env['sendgrid.config']
+        if not SendGridConfig._get_routing_table():
             if raise_exception:
                 raise UserError("No active SendGrid configuration found")
             return False
-        
-        def _sanitize_email(addr: str) -> str:
-            """Remove hidden characters and whitespace from an email string."""
-            if not addr:
-                return ""
-            # Remove zero-width + control chars
-            clean = re.sub(r"[\u200B-\u200D\uFEFF\r\n\t ]+", "", addr)
-            return clean.strip()
 
-        for mail in self:
-            try:
-                # Collect recipients
-                to_emails = []
-                if mail.email_to:
-                    _logger.debug("Raw email_to: %r", mail.email_to)
-                    # Split, sanitize, and filter
-                    to_emails += [_sanitize_email(e) for e in mail.email_to.split(",") if _sanitize_email(e)]
+        IrConfigParam = self.env['ir.config_parameter'].sudo()
+        batch_send = IrConfigParam.get_param('custom_email_handler.batch_send', False)
+        try:
+            max_in_flight = int(IrConfigParam.get_param('custom_email_handler.max_in_flight', 1) or 1)
+        except ValueError:
+            max_in_flight = 1
+
+        # Mails waiting for a retry slot stay queued untouched
+        now = fields.Datetime.now()
+        due_mails = self.filtered(lambda m: not m.sendgrid_next_attempt or m.sendgrid_next_attempt <= now)
+        if len(due_mails) < len(self):
+            _logger.debug("Skipping %d email(s) scheduled for a later SendGrid retry", len(self) - len(due_mails))
+
+        # Crash recovery: mails SendGrid already accepted are not sent again
+        Ledger = self.env['sendgrid.send.ledger'].sudo()
+        already_accepted = Ledger._get_accepted(due_mails)
+        if already_accepted:
+            _logger.warning("Marking %d email(s) as sent without resending, SendGrid accepted them before (IDs %s)",
+                            len(already_accepted), already_accepted.ids)
+            self._apply_send_results([(already_accepted, None)], auto_commit)
+            due_mails -= already_accepted
+
+        if batch_send:
+            jobs = due_mails._iter_batched_send_jobs(raise_exception)
+        else:
+            jobs = due_mails._iter_send_jobs(raise_exception)
+        jobs = self._record_pending_send_jobs(jobs)
 
-                # Add from related fields
-                to_emails += [_sanitize_email(p.email) for p in mail.recipient_ids if p.email]
-                to_emails += [_sanitize_email(p.email) for p in mail.partner_ids if p.email]
+        transports = {}
+        if max_in_flight > 1:
+            self._dispatch_send_jobs_async(transports, jobs, max_in_flight, auto_commit, raise_exception)
+        else:
+            for mails, msg, config in jobs:
+                try:
+                    client, limiter = self._get_custom_service_transport(transports, config)
+                    deliver_sendgrid_message(client, msg, limiter=limiter)
+                    error = None
+                except Exception as e:
+                    error = e
+                self._apply_send_results([(mails, error)], auto_commit)
+                if error and raise_exception:
+                    raise error
 
-                # Deduplicate
-                to_emails = list({e for e in to_emails if e})
+        if due_mails:
+            SendGridConfig._log_render_cache_stats()
+        return True
+
+    @api.model
+    def _get_custom_service_transport(self, transports, config):
+        """Return the ``(client, limiter)`` of ``config``, memoized in ``transports`` for one run."""
+        if config.id not in transports:
+            transports[config.id] = (config._get_sendgrid_client(), config._get_rate_limiter())
+        return transports[config.id]
 
-                _logger.debug("Final sanitized recipient list: %s", to_emails)
+    @api.model
+    def _record_pending_send_jobs(self, jobs):
+        """Record each job in the send ledger right before it is handed to SendGrid."""
+        Ledger = self.env['sendgrid.send.ledger'].sudo()
+        for mails, msg, config in jobs:
+            Ledger._record(mails, 'pending')
+            yield mails, msg, config
+
+    def _iter_send_jobs(self, raise_exception=False):
+        """Yield ``(mails, message, config)`` send jobs, one per mail.
+
+        Message preparation needs the ORM and therefore runs in the calling
+        transaction; mails failing preparation are marked as exception right away.
+        """
+        SendGridConfig = self.env['sendgrid.config']
+        recipients = self._resolve_custom_service_recipients()
+        for mail in self:
+            try:
+                sendgrid_config = SendGridConfig._route(mail.email_from)
+                to_emails = recipients[mail.id]
                 subject = mail.subject or ''
                 body = mail.body_html or mail.body or ''
 
                 # Collect attachments
-                attachments = []
-                for attachment in mail.attachment_ids:
-                    attachments.append({
-                        'filename': attachment.name,
-                        'content': attachment.datas or '',
-                        'type': attachment.mimetype or 'application/octet-stream'
-                    })
+                attachments = self._prepare_custom_service_attachments(mail.attachment_ids)
 
                 if not to_emails:
                     raise UserError("No recipients found for email")
 
-                success = sendgrid_config.send_email(to_emails, subject, body, attachments)
+                msg = sendgrid_config._prepare_sendgrid_message(
+                    to_emails, subject, body, attachments, custom_args=mail._get_custom_service_custom_args())
+            except Exception as e:
+                _logger.error(f"Failed to send email ID {mail.id}: {str(e)}")
+                mail.write({'state': 'exception', 'failure_reason': str(e)})
+                if raise_exception:
+                    raise
+                continue
+            yield mail, msg, sendgrid_config
 
-                if success:
-                    mail.write({
-                        'state': 'sent',
-                        'message_id': f"<custom-{mail.id}@{self.env.cr.dbname}>",
-                    })
-                    if auto_commit:
-                        self.env.cr.commit()
-                else:
-                    mail.write({'state': 'exception'})
+    def _iter_batched_send_jobs(self, raise_exception=False):
+        """Yield ``(mails, message, config)`` send jobs grouping mails with identical content.
 
+        Mails sharing body, subject, attachments and sender domain become one SendGrid
+        request with one personalization per mail, so recipients stay separated exactly
+        like with one request per mail. Each request is routed on its own, which spreads
+        large groups over the weighted configurations.
+        """
+        SendGridConfig = self.env['sendgrid.config']
+        groups = {}
+        recipients = self._resolve_custom_service_recipients()
+        for mail in self:
+            try:
+                to_emails = recipients[mail.id]
+                if not to_emails:
+                    raise UserError("No recipients found for email")
             except Exception as e:
                 _logger.error(f"Failed to send email ID {mail.id}: {str(e)}")
                 mail.write({'state': 'exception', 'failure_reason': str(e)})
                 if raise_exception:
                     raise
+                continue
+            key = (
+                mail.subject or '',
+                mail.body_html or mail.body or '',
+                tuple(mail.attachment_ids.ids),
+                _sender_domain(mail.email_from),
+            )
+            groups.setdefault(key, []).append((mail, to_emails))
 
-        return True
+        for (subject, body, attachment_ids, sender_domain), entries in groups.items():
+            attachments = self._prepare_custom_service_attachments(self.env['ir.attachment'].browse(attachment_ids))
+            for chunk in self._chunk_personalizations(entries):
+                mails = self.browse([mail.id for mail, _tos in chunk])
+                try:
+                    sendgrid_config = SendGridConfig._route(sender_domain and f'@{sender_domain}')
+                    msg = sendgrid_config._prepare_sendgrid_batch_message(
+                        [tos for _mail, tos in chunk], subject, body, attachments,
+                        custom_args=[mail._get_custom_service_custom_args() for mail, _tos in chunk])
+                except Exception as e:
+                    _logger.error("Failed to prepare batch of %d emails (IDs %s): %s", len(mails), mails.ids, e)
+                    mails.write({'state': 'exception', 'failure_reason': str(e)})
+                    if raise_exception:
+                        raise
+                    continue
+                yield mails, msg, sendgrid_config
+
+    def _dispatch_send_jobs_async(self, transports, jobs, max_in_flight, auto_commit=False, raise_exception=False):
+        """Run the HTTP part of ``jobs`` on a bounded thread pool.
+
+        At most ``max_in_flight`` requests run concurrently and at most as many more
+        wait in the queue; once that limit is reached, preparation of further jobs
+        pauses until requests complete (back-pressure). Results are written back from
+        this thread, in bulk, every time a wave of requests completes. When preparing a
+        job raises, requests already in flight are still awaited and their results
+        written back before the error propagates, so accepted mails are not sent again.
+        """
+        first_error = None
+        pending = {}
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='sendgrid') as executor:
+            try:
+                for mails, msg, config in jobs:
+                    if len(pending) >= 2 * max_in_flight:
+                        first_error = self._collect_send_futures(pending, FIRST_COMPLETED, auto_commit) or first_error
+                    client, limiter = self._get_custom_service_transport(transports, config)
+                    pending[executor.submit(deliver_sendgrid_message, client, msg, None, limiter)] = mails
+            finally:
+                while pending:
+                    first_error = self._collect_send_futures(pending, ALL_COMPLETED, auto_commit) or first_error
+
+        if first_error and raise_exception:
+            raise first_error
+
+    def _collect_send_futures(self, pending, return_when, auto_commit=False):
+        done, _not_done = wait(list(pending), return_when=return_when)
+        results = [(pending.pop(future), future.exception()) for future in done]
+        self._apply_send_results(results, auto_commit)
+        return next((error for _mails, error in results if error), None)
+
+    @api.model
+    def _apply_send_results(self, results, auto_commit=False):
+        """Write back ``(mails, error)`` send outcomes with as few writes as possible.
+
+        Transient SendGrid errors requeue the mails for a later attempt instead of
+        failing them (see ``_schedule_send_retry``).
+        """
+        sent = self.browse()
+        unsent = self.browse()
+        failed = {}
+        for mails, error in results:
+            if error is None:
+                sent |= mails
+            elif getattr(error, 'retryable', False):
+                unsent |= mails
+                self._schedule_send_retry(mails, error)
+            else:
+                _logger.error("Failed to send %d email(s) (IDs %s): %s", len(mails), mails.ids, error)
+                unsent |= mails
+                failed.setdefault(str(error), self.browse())
+                failed[str(error)] |= mails
+
+        # Committed on its own right away, before the mail states below
+        Ledger = self.env['sendgrid.send.ledger'].sudo()
+        Ledger._record(sent, 'accepted')
+        Ledger._record(unsent, 'failed')
+
+        if sent:
+            sent.write({'state': 'sent', 'sendgrid_next_attempt': False})
+            self._write_custom_service_message_ids(sent)
+            _logger.info("Sent %d email(s) through SendGrid", len(sent))
+        for reason, mails in failed.items():
+            mails.write({'state': 'exception', 'failure_reason': reason})
+        if auto_commit:
+            self.env.cr.commit()
+
+    @api.model
+    def _write_custom_service_message_ids(self, mails):
+        """Set the ``<custom-{id}@{db}>`` message id of ``mails`` in one UPDATE."""
+        self.env['mail.message'].flush_model(['message_id'])
+        self.env.cr.execute(SQL(
+            """UPDATE mail_message message
+                  SET message_id = sent.message_id, write_date = %s, write_uid = %s
+                 FROM (VALUES %s) AS sent(mail_message_id, message_id)
+                WHERE message.id = sent.mail_message_id""",
+            fields.Datetime.now(), self.env.uid,
+            SQL(", ").join(
+                SQL("(%s, %s)", mail.mail_message_id.id, mail._get_custom_service_message_id()) for mail in mails
+            ),
+        ))
+        self.env['mail.message'].invalidate_model(['message_id', 'write_date', 'write_uid'])
+        mails.invalidate_recordset(['message_id'])
+
+    @api.model
+    def _schedule_send_retry(self, mails, error):
+        """Requeue mails after a transient error, or fail them once retries are exhausted.
+
+        Rate-limited requests are retried when SendGrid's rate-limit window resets,
+        other transient errors after a jittered exponential backoff. ``scheduled_date``
+        is moved as well so the mail queue cron does not pick the mails up earlier.
+        """
+        IrConfigParam = self.env['ir.config_parameter'].sudo()
+        try:
+            max_retries = int(IrConfigParam.get_param('custom_email_handler.max_retries', 5) or 0)
+        except ValueError:
+            max_retries = 5
+
+        exhausted = mails.filtered(lambda m: m.sendgrid_retry_count >= max_retries)
+        if exhausted:
+            _logger.error("Giving up on %d email(s) after %d SendGrid retries (IDs %s): %s",
+                          len(exhausted), max_retries, exhausted.ids, error)
+            exhausted.write({'state': 'exception', 'failure_reason': str(error)})
+
+        by_attempt = {}
+        for mail in mails - exhausted:
+            by_attempt.setdefault(mail.sendgrid_retry_count, self.browse())
+            by_attempt[mail.sendgrid_retry_count] |= mail
+        for attempt, group in by_attempt.items():
+            if error.retry_at:
+                delay = max(1.0, error.retry_at - time.time())
+            else:
+                delay = rate_limiter.backoff_delay(attempt)
+            next_attempt = fields.Datetime.now() + timedelta(seconds=delay)
+            _logger.warning("SendGrid %s for %d email(s), retry %d in %ds (IDs %s)",
+                            error.status_code or "network error", len(group), attempt + 1, delay, group.ids)
+            group.write({
+                'state': 'outgoing',
+                'sendgrid_retry_count': attempt + 1,
+                'sendgrid_next_attempt': next_attempt,
+                'scheduled_date': next_attempt,
+                'failure_reason': str(error),
+            })
+
+    @api.model
+    def _chunk_personalizations(self, entries):
+        """Split ``(mail, to_emails)`` entries into chunks SendGrid accepts in one request."""
+        chunk, recipients = [], 0
+        for mail, to_emails in entries:
+            if chunk and (len(chunk) >= SENDGRID_MAX_PERSONALIZATIONS
+                          or recipients + len(to_emails) > SENDGRID_MAX_PERSONALIZATIONS):
+                yield chunk
+                chunk, recipients = [], 0
+            chunk.append((mail, to_emails))
+            recipients += len(to_emails)
+        if chunk:
+            yield chunk
+
+    def _resolve_custom_service_recipients(self):
+        """Return ``{mail_id: [email, ...]}`` with sanitized recipients for the whole recordset.
+
+        Recipients and partners of all mails are fetched in bulk and their emails read
+        in one query; each list keeps the first occurrence order of ``email_to``,
+        ``recipient_ids`` then ``partner_ids`` while dropping duplicates.
+        """
+        partners = self.recipient_ids | self.partner_ids
+        partner_emails = {p['id']: p['email'] for p in partners.read(['email'])}
+
+        recipients = {}
+        for mail in self:
+            candidates = mail.email_to.split(",") if mail.email_to else []
+            candidates += [partner_emails.get(pid) for pid in mail.recipient_ids.ids]
+            candidates += [partner_emails.get(pid) for pid in mail.partner_ids.ids]
+            sanitized = (_sanitize_email(e) for e in candidates)
+            recipients[mail.id] = list(dict.fromkeys(e for e in sanitized if e))
+            _logger.debug("Final sanitized recipient list for email %s: %s", mail.id, recipients[mail.id])
+        return recipients
+
+    @api.model
+    def _prepare_custom_service_attachments(self, attachments):
+        """Return SendGrid attachment dicts carrying already base64-encoded content.
+
+        Payloads are encoded straight from the filestore and cached by checksum, so
+        an attachment shared by many mails is read and encoded once.
+        """
+        result = []
+        for attachment in attachments:
+            b64 = attachment_cache.encoded_cache.get(attachment.checksum) if attachment.checksum else None
+            if b64 is None:
+                b64 = self._encode_custom_service_attachment(attachment)
+                if attachment.checksum:
+                    attachment_cache.encoded_cache.put(attachment.checksum, b64)
+            result.append({
+                'filename': attachment.name,
+                'b64': b64,
+                'type': attachment.mimetype or 'application/octet-stream'
+            })
+        return result
+
+    @api.model
+    def _encode_custom_service_attachment(self, attachment):
+        if attachment.store_fname:
+            try:
+                return attachment_cache.b64encode_file(attachment._full_path(attachment.store_fname))
+            except OSError as e:
+                _logger.warning("Cannot stream attachment %s from filestore, reading it whole: %s", attachment.id, e)
+        return base64.b64encode(attachment.raw or b'').decode()
+
+    def _get_custom_service_custom_args(self):
+        """SendGrid custom args identifying this mail in Event Webhook events."""
+        self.ensure_one()
+        return {'odoo_mail_id': self.id, 'odoo_db': self.env.cr.dbname}
+
+    def _get_custom_service_message_id(self):
+        self.ensure_one()
+        return f"<custom-{self.id}@{self.env.cr.dbname}>"
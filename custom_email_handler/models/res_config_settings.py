@@ -12,4 +12,41 @@ class ResConfigSettings(models.TransientModel):
         'sendgrid.config',
         'SendGrid Configuration',
         config_parameter='custom_email_handler.default_service_id'
-    )
\ No newline at end of file
+    )
+    
+    sendgrid_batch_send = fields.Boolean(
+        'Batch Identical Emails',
+        config_parameter='custom_email_handler.batch_send',
+        help="Send queued emails sharing subject, body and attachments as one SendGrid "
+             "request with one personalization per email (up to 1000 per request)."
+    )
+    
+    sendgrid_max_in_flight = fields.Integer(
+        'Concurrent SendGrid Requests',
+        default=1,
+        config_parameter='custom_email_handler.max_in_flight',
+        help="Number of SendGrid API requests sent in parallel from a worker thread pool. "
+             "1 sends one request after the other inside the sending transaction."
+    )
+    
+    sendgrid_rate_limit = fields.Float(
+        'SendGrid Requests per Second',
+        config_parameter='custom_email_handler.rate_limit',
+        help="Token-bucket limit on SendGrid requests, shared by all sending threads of a "
+             "worker process. 0 disables the limiter."
+    )
+    
+    sendgrid_event_webhook_public_key = fields.Char(
+        'Event Webhook Verification Key',
+        config_parameter='custom_email_handler.event_webhook_public_key',
+        help="Public key of the SendGrid Signed Event Webhook (Mail Settings > Event Webhook). "
+             "Event posts without a valid signature for this key are refused."
+    )
+    
+    sendgrid_max_retries = fields.Integer(
+        'SendGrid Retries',
+        default=5,
+        config_parameter='custom_email_handler.max_retries',
+        help="How many times an email is retried after a rate-limit (429), server (5xx) or "
+             "network error before it is marked as failed."
+    )
@@ -0,0 +1,191 @@
+import logging
+from datetime import datetime, timezone
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Events per INSERT statement
+EVENT_INSERT_CHUNK = 1000
+
+# Event types rolled up per mail (column prefix -> SendGrid event name)
+MAIL_STAT_EVENTS = (
+    "processed", "delivered", "open", "click", "bounce",
+    "dropped", "deferred", "spamreport", "unsubscribe",
+)
+
+
+class SendGridEvent(models.Model):
+    """Raw SendGrid Event Webhook events.
+
+    Append-only: rows are bulk inserted by ``_ingest`` and never updated. Dashboards
+    should read the ``sendgrid.event.daily`` / ``sendgrid.event.mail`` rollups instead.
+    """
+    _name = "sendgrid.event"
+    _description = "SendGrid Event"
+    _order = "timestamp desc, id desc"
+    _log_access = False
+
+    mail_id = fields.Integer("Mail ID", index=True, readonly=True,
+                             help="ID of the sent mail.mail (from the odoo_mail_id custom arg)")
+    email = fields.Char(index=True, readonly=True)
+    event = fields.Char(required=True, index=True, readonly=True)
+    timestamp = fields.Datetime(required=True, index=True, readonly=True)
+    sg_event_id = fields.Char("SendGrid Event ID", readonly=True)
+    sg_message_id = fields.Char("SendGrid Message ID", index=True, readonly=True)
+    reason = fields.Text(readonly=True)
+    url = fields.Char(readonly=True)
+
+    _sql_constraints = [
+        ("sg_event_id_unique", "UNIQUE(sg_event_id)", "SendGrid events are stored once."),
+    ]
+
+    def write(self, vals):
+        raise UserError(_("SendGrid events are append-only."))
+
+    @api.model
+    def _ingest(self, events):
+        """Bulk insert a batch of Event Webhook events and update the rollups.
+
+        Events already stored (same ``sg_event_id``, e.g. on SendGrid redeliveries) are
+        ignored and do not count twice, and so are events of mails sent by another
+        database (``odoo_db`` custom arg). Events and rollups are written in one savepoint:
+        if a rollup fails, the events are not kept either, so the redelivered batch is
+        counted. Returns the number of new events.
+        """
+        rows = [row for row in (self._event_row(event) for event in events) if row]
+        inserted = []
+        with self.env.cr.savepoint():
+            for start in range(0, len(rows), EVENT_INSERT_CHUNK):
+                chunk = rows[start:start + EVENT_INSERT_CHUNK]
+                self.env.cr.execute(SQL(
+                    """INSERT INTO sendgrid_event
+                           (mail_id, email, event, timestamp, sg_event_id, sg_message_id, reason, url)
+                       VALUES %s
+                       ON CONFLICT (sg_event_id) DO NOTHING
+                       RETURNING mail_id, event, timestamp""",
+                    SQL(", ").join(SQL("(%s, %s, %s, %s, %s, %s, %s, %s)", *row) for row in chunk),
+                ))
+                inserted += self.env.cr.fetchall()
+
+            if inserted:
+                self.env["sendgrid.event.daily"]._add_events(inserted)
+                self.env["sendgrid.event.mail"]._add_events(inserted)
+        _logger.debug("[SendGrid] Ingested %d new events out of %d received", len(inserted), len(events))
+        return len(inserted)
+
+    @api.model
+    def _event_row(self, event):
+        if not isinstance(event, dict) or not event.get("event"):
+            return None
+        # Mails sent from another database sharing the SendGrid account: their
+        # odoo_mail_id means nothing here
+        if event.get("odoo_db") and event["odoo_db"] != self.env.cr.dbname:
+            return None
+        try:
+            timestamp = datetime.fromtimestamp(int(event.get("timestamp")), tz=timezone.utc).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            timestamp = fields.Datetime.now()
+        try:
+            mail_id = int(event.get("odoo_mail_id") or 0) or None
+        except (TypeError, ValueError):
+            mail_id = None
+        return (
+            mail_id,
+            event.get("email"),
+            str(event["event"])[:64],
+            timestamp,
+            event.get("sg_event_id"),
+            event.get("sg_message_id"),
+            event.get("reason") or event.get("response"),
+            event.get("url"),
+        )
+
+
+class SendGridEventDaily(models.Model):
+    """Per-day, per-event-type counters maintained incrementally on ingestion."""
+    _name = "sendgrid.event.daily"
+    _description = "SendGrid Daily Event Counts"
+    _order = "day desc, event"
+    _log_access = False
+
+    day = fields.Date(required=True, index=True, readonly=True)
+    event = fields.Char(required=True, readonly=True)
+    count = fields.Integer(readonly=True)
+
+    _sql_constraints = [
+        ("day_event_unique", "UNIQUE(day, event)", "One counter per day and event type."),
+    ]
+
+    @api.model
+    def _add_events(self, inserted):
+        counts = {}
+        for _mail_id, event, timestamp in inserted:
+            key = (timestamp.date(), event)
+            counts[key] = counts.get(key, 0) + 1
+        # Rows in conflict key order, so concurrent posts lock counters in the same order
+        self.env.cr.execute(SQL(
+            """INSERT INTO sendgrid_event_daily (day, event, count)
+               VALUES %s
+               ON CONFLICT (day, event) DO UPDATE SET count = sendgrid_event_daily.count + EXCLUDED.count""",
+            SQL(", ").join(SQL("(%s, %s, %s)", day, event, count) for (day, event), count in sorted(counts.items())),
+        ))
+
+
+class SendGridEventMail(models.Model):
+    """Per-mail event counters maintained incrementally on ingestion."""
+    _name = "sendgrid.event.mail"
+    _description = "SendGrid Events per Mail"
+    _order = "last_event_date desc"
+    _rec_name = "mail_id"
+    _log_access = False
+
+    mail_id = fields.Integer("Mail ID", required=True, readonly=True)
+    processed_count = fields.Integer("Processed", readonly=True)
+    delivered_count = fields.Integer("Delivered", readonly=True)
+    open_count = fields.Integer("Opens", readonly=True)
+    click_count = fields.Integer("Clicks", readonly=True)
+    bounce_count = fields.Integer("Bounces", readonly=True)
+    dropped_count = fields.Integer("Dropped", readonly=True)
+    deferred_count = fields.Integer("Deferred", readonly=True)
+    spamreport_count = fields.Integer("Spam Reports", readonly=True)
+    unsubscribe_count = fields.Integer("Unsubscribes", readonly=True)
+    last_event = fields.Char(readonly=True)
+    last_event_date = fields.Datetime(index=True, readonly=True)
+
+    _sql_constraints = [
+        ("mail_id_unique", "UNIQUE(mail_id)", "One rollup per mail."),
+    ]
+
+    @api.model
+    def _add_events(self, inserted):
+        stats = {}
+        for mail_id, event, timestamp in sorted((row for row in inserted if row[0]), key=lambda row: row[2]):
+            stat = stats.setdefault(mail_id, dict.fromkeys(MAIL_STAT_EVENTS, 0))
+            if event in stat:
+                stat[event] += 1
+            stat["_last"] = (event, timestamp)
+        if not stats:
+            return
+
+        columns = [SQL.identifier(f"{event}_count") for event in MAIL_STAT_EVENTS]
+        # Rows in conflict key order, so concurrent posts lock rollups in the same order
+        self.env.cr.execute(SQL(
+            """INSERT INTO sendgrid_event_mail (mail_id, %s, last_event, last_event_date)
+               VALUES %s
+               ON CONFLICT (mail_id) DO UPDATE SET %s,
+                   last_event = CASE WHEN EXCLUDED.last_event_date >= sendgrid_event_mail.last_event_date
+                                     THEN EXCLUDED.last_event ELSE sendgrid_event_mail.last_event END,
+                   last_event_date = GREATEST(sendgrid_event_mail.last_event_date, EXCLUDED.last_event_date)""",
+            SQL(", ").join(columns),
+            SQL(", ").join(
+                SQL("(%s, %s, %s, %s)", mail_id, SQL(", ").join(stat[event] for event in MAIL_STAT_EVENTS),
+                    *stat["_last"])
+                for mail_id, stat in sorted(stats.items())
+            ),
+            SQL(", ").join(
+                SQL("%s = sendgrid_event_mail.%s + EXCLUDED.%s", column, column, column) for column in columns
+            ),
+        ))
@@ -0,0 +1,112 @@
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+
+class SendGridInboundEmail(models.Model):
+    """Inbound email received from the SendGrid webhook, waiting to become a mail.message.
+
+    The webhook only stores these rows (and their attachments, linked to the row) so it
+    can acknowledge SendGrid immediately; ``_cron_process_inbound_emails`` turns them
+    into messages in batches.
+    """
+    _name = "sendgrid.inbound.email"
+    _description = "SendGrid Inbound Email Queue"
+    _order = "id"
+
+    sender = fields.Char()
+    subject = fields.Char()
+    body_html = fields.Text()
+    body_text = fields.Text()
+    state = fields.Selection([
+        ("pending", "Pending"),
+        ("done", "Processed"),
+        ("error", "Error"),
+    ], default="pending", required=True, index=True)
+    error = fields.Text(readonly=True)
+    message_id = fields.Many2one("mail.message", string="Message", readonly=True, ondelete="set null")
+
+    @api.model
+    def _enqueue(self, emails, attachments_by_index=None):
+        """Store normalized inbound emails in one batch.
+
+        ``emails`` is a list of ``{'sender', 'subject', 'body_html', 'body_text'}`` dicts and
+        ``attachments_by_index`` maps a position in that list to ``ir.attachment`` values
+        (without ``res_model``/``res_id``). Returns the created queue records.
+        """
+        records = self.sudo().create(emails)
+        attachment_vals = []
+        for index, vals_list in (attachments_by_index or {}).items():
+            for vals in vals_list:
+                attachment_vals.append(dict(vals, res_model=self._name, res_id=records[index].id))
+        if attachment_vals:
+            self.env["ir.attachment"].sudo().create(attachment_vals)
+        return records
+
+    @api.model
+    def _cron_process_inbound_emails(self, batch_size=200):
+        """Create mail.message records for pending inbound emails, one transaction per batch."""
+        while True:
+            batch = self.sudo().search([("state", "=", "pending")], limit=batch_size)
+            if not batch:
+                break
+            batch._process_batch()
+            if len(batch) < batch_size:
+                break
+            self.env.cr.commit()
+
+    def _process_batch(self):
+        """Create the messages of the batch, then write back outcomes one statement per group.
+
+        Messages are created together; when that fails, they are created again one by
+        one, each in a savepoint, so a bad email only fails itself.
+        """
+        Message = self.env["mail.message"].sudo()
+        vals_list = [{
+            "subject": email.subject or "",
+            "body": email.body_html or email.body_text or "",
+            "email_from": email.sender or "",
+            "message_type": "email",
+        } for email in self]
+        processed, errors = [], {}
+        try:
+            with self.env.cr.savepoint():
+                processed = list(zip(self.ids, Message.create(vals_list).ids))
+        except Exception as e:
+            _logger.warning("Failed to process %d SendGrid inbound emails at once, retrying one by one: %s",
+                            len(self), e)
+            for email, vals in zip(self, vals_list):
+                try:
+                    with self.env.cr.savepoint():
+                        processed.append((email.id, Message.create(vals).id))
+                except Exception as e:
+                    _logger.error("Failed to process SendGrid inbound email %s: %s", email.id, e)
+                    errors.setdefault(str(e), []).append(email.id)
+
+        for error, email_ids in errors.items():
+            self.browse(email_ids).write({"state": "error", "error": error})
+        if not processed:
+            return
+        self.env.flush_all()
+        values = SQL(", ").join(SQL("(%s, %s)", email_id, message_id) for email_id, message_id in processed)
+        self.env.cr.execute(SQL(
+            """UPDATE sendgrid_inbound_email email
+                  SET state = 'done', message_id = processed.message_id, write_date = %s, write_uid = %s
+                 FROM (VALUES %s) AS processed(email_id, message_id)
+                WHERE email.id = processed.email_id""",
+            fields.Datetime.now(), self.env.uid, values,
+        ))
+        # Attachments stored with the queued email move to its message
+        self.env.cr.execute(SQL(
+            """UPDATE ir_attachment attachment
+                  SET res_model = 'mail.message', res_id = processed.message_id
+                 FROM (VALUES %s) AS processed(email_id, message_id)
+                WHERE attachment.res_model = %s AND attachment.res_id = processed.email_id""",
+            values, self._name,
+        ))
+        self.invalidate_model(["state", "message_id", "write_date", "write_uid"])
+        self.env["ir.attachment"].invalidate_model(["res_model", "res_id"])
+        _logger.info("Processed %d SendGrid incoming email(s)", len(processed))
@@ -0,0 +1,85 @@
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Days a ledger entry is kept for crash recovery
+LEDGER_RETENTION_DAYS = 30
+
+
+class SendGridSendLedger(models.Model):
+    """Idempotency ledger of SendGrid sends, keyed like the ``<custom-{id}@{db}>`` message ids.
+
+    Entries are written in their own committed transaction right before a request is
+    posted (``pending``) and right after SendGrid answered (``accepted``/``failed``), so
+    they survive a worker killed before the sending transaction commits. Mails whose
+    entry is ``accepted`` are then marked sent without calling the API again.
+    """
+    _name = "sendgrid.send.ledger"
+    _description = "SendGrid Send Ledger"
+    _order = "id desc"
+    _log_access = False
+
+    key = fields.Char(required=True, readonly=True)
+    mail_id = fields.Integer("Mail ID", required=True, index=True, readonly=True)
+    state = fields.Selection([
+        ("pending", "Pending"),
+        ("accepted", "Accepted"),
+        ("failed", "Failed"),
+    ], required=True, readonly=True)
+    write_date = fields.Datetime("Last Update", readonly=True)
+
+    _sql_constraints = [
+        ("key_unique", "UNIQUE(key)", "One ledger entry per send key."),
+    ]
+
+    @api.model
+    def _get_key(self, mail):
+        return mail._get_custom_service_message_id().strip("<>")
+
+    @api.model
+    def _get_accepted(self, mails):
+        """Return the mails SendGrid already accepted in an earlier (crashed) run."""
+        if not mails:
+            return mails
+        keys = {self._get_key(mail): mail.id for mail in mails}
+        self.env.cr.execute(SQL(
+            "SELECT key FROM sendgrid_send_ledger WHERE state = 'accepted' AND key IN %s",
+            tuple(keys),
+        ))
+        return mails.browse([keys[key] for key, in self.env.cr.fetchall()])
+
+    @api.model
+    def _record(self, mails, state):
+        """Upsert the entries of ``mails`` in a separate, immediately committed transaction.
+
+        An ``accepted`` entry is never downgraded, so a late ``pending`` or ``failed``
+        cannot make a delivered mail look unsent.
+        """
+        if not mails:
+            return
+        now = fields.Datetime.now()
+        with self.env.registry.cursor() as cr:
+            cr.execute(SQL(
+                """INSERT INTO sendgrid_send_ledger (key, mail_id, state, write_date)
+                   VALUES %s
+                   ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, write_date = EXCLUDED.write_date
+                   WHERE sendgrid_send_ledger.state != 'accepted'""",
+                SQL(", ").join(SQL("(%s, %s, %s, %s)", self._get_key(mail), mail.id, state, now) for mail in mails),
+            ))
+
+    @api.autovacuum
+    def _gc_ledger(self):
+        """Remove old entries, pending ones left by a crashed worker included, and the
+        entries of deleted mails, which can no longer be sent again."""
+        limit_date = fields.Datetime.now() - timedelta(days=LEDGER_RETENTION_DAYS)
+        self.env.cr.execute(SQL(
+            """DELETE FROM sendgrid_send_ledger ledger
+                WHERE ledger.write_date < %s
+                   OR NOT EXISTS (SELECT 1 FROM mail_mail mail WHERE mail.id = ledger.mail_id)""",
+            limit_date,
+        ))
+        _logger.info("[SendGrid] Removed %d old send ledger entries", self.env.cr.rowcount)
@@ -0,0 +1,5 @@
+from . import test_batch_send
+from . import test_content_sanitizer
+from . import test_routing
+from . import test_send_ledger
+from . import test_sendgrid_event
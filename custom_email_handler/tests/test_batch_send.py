@@ -0,0 +1,92 @@
+from unittest.mock import patch
+
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.custom_email_handler.models.email_service import SENDGRID_MAX_PERSONALIZATIONS
+
+DELIVER = "odoo.addons.custom_email_handler.models.mail_thread.deliver_sendgrid_message"
+
+
+@tagged("post_install", "-at_install")
+class TestBatchSend(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env["sendgrid.config"].search([]).write({"active": False})
+        cls.config = cls.env["sendgrid.config"].create({
+            "name": "Test", "api_key": "SG.test", "sender_email": "noreply@example.com",
+        })
+        ICP = cls.env["ir.config_parameter"].sudo()
+        ICP.set_param("custom_email_handler.use_custom_service", "True")
+        ICP.set_param("custom_email_handler.batch_send", "True")
+
+    def setUp(self):
+        super().setUp()
+        # The send ledger writes through its own cursor, which must see the test transaction
+        if self.registry.test_cr is None:
+            self.registry.enter_test_mode(self.cr)
+            self.addCleanup(self.registry.leave_test_mode)
+        self.startPatcher(patch.object(type(self.env["mail.mail"]), "_get_custom_service_transport",
+                                       return_value=(None, None)))
+
+    def _create_mails(self, body, count, start=0):
+        return self.env["mail.mail"].create([{
+            "subject": "Newsletter",
+            "body_html": body,
+            "email_from": "noreply@example.com",
+            "email_to": f"customer{i}@example.com",
+            "auto_delete": False,
+        } for i in range(start, start + count)])
+
+    def test_mails_with_same_content_share_a_request(self):
+        newsletter = self._create_mails("<p>Newsletter</p>", 3)
+        other = self._create_mails("<p>Something else</p>", 1, start=3)
+        with patch(DELIVER, return_value=True) as deliver:
+            (newsletter | other).send()
+
+        self.assertEqual(deliver.call_count, 2)
+        payloads = sorted((call.args[1].get() for call in deliver.call_args_list),
+                          key=lambda payload: len(payload["personalizations"]))
+        self.assertEqual([len(payload["personalizations"]) for payload in payloads], [1, 3])
+        # One personalization per mail: recipients never see each other
+        self.assertEqual(
+            [(p["to"], p["custom_args"]["odoo_mail_id"]) for p in payloads[1]["personalizations"]],
+            [([{"email": mail.email_to}], str(mail.id)) for mail in newsletter],
+        )
+
+    def test_each_mail_gets_its_own_state_and_message_id(self):
+        mails = self._create_mails("<p>Newsletter</p>", 3)
+        with patch(DELIVER, return_value=True):
+            mails.send()
+        self.assertEqual(mails.mapped("state"), ["sent"] * 3)
+        self.assertEqual(mails.mapped("message_id"), [mail._get_custom_service_message_id() for mail in mails])
+        self.assertEqual(len(set(mails.mapped("message_id"))), 3)
+
+    def test_failed_batch_fails_its_mails_only(self):
+        first = self._create_mails("<p>First</p>", 2)
+        second = self._create_mails("<p>Second</p>", 2, start=2)
+        results = [(first, None), (second, UserError("Bad request"))]
+        self.env["mail.mail"]._apply_send_results(results)
+        self.assertEqual(first.mapped("state"), ["sent", "sent"])
+        self.assertEqual(first.mapped("message_id"), [mail._get_custom_service_message_id() for mail in first])
+        self.assertEqual(second.mapped("state"), ["exception", "exception"])
+        self.assertNotIn(second[0]._get_custom_service_message_id(), second.mapped("message_id"))
+
+    def test_personalizations_are_split_at_the_limit(self):
+        Mail = self.env["mail.mail"]
+        entries = [(index, [f"customer{index}@example.com"]) for index in range(2 * SENDGRID_MAX_PERSONALIZATIONS + 1)]
+        self.assertEqual([len(chunk) for chunk in Mail._chunk_personalizations(entries)],
+                         [SENDGRID_MAX_PERSONALIZATIONS, SENDGRID_MAX_PERSONALIZATIONS, 1])
+        # Recipients count too: two per mail halves the chunk
+        entries = [(index, ["a@example.com", "b@example.com"]) for index in range(SENDGRID_MAX_PERSONALIZATIONS)]
+        self.assertEqual([len(chunk) for chunk in Mail._chunk_personalizations(entries)],
+                         [SENDGRID_MAX_PERSONALIZATIONS // 2] * 2)
+
+        groups = [[f"customer{index}@example.com"] for index in range(SENDGRID_MAX_PERSONALIZATIONS)]
+        msg = self.config._prepare_sendgrid_batch_message(groups, "Newsletter", "<p>Hi</p>")
+        self.assertEqual(len(msg.get()["personalizations"]), SENDGRID_MAX_PERSONALIZATIONS)
+        with self.assertRaises(UserError):
+            self.config._prepare_sendgrid_batch_message(
+                groups + [["one-too-many@example.com"]], "Newsletter", "<p>Hi</p>")
@@ -0,0 +1,38 @@
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.custom_email_handler.benchmarks import bench_sanitizer
+from odoo.addons.custom_email_handler.tools import content_sanitizer
+
+
+@tagged("post_install", "-at_install")
+class TestContentSanitizer(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.engine = content_sanitizer.get_sanitizer()
+
+    def test_markers_before_phrases(self):
+        # Dropping a lone ** joins the words: no phrase stands on its own anymore
+        self.assertEqual(self.engine.clean_body("here**free"), "herefree")
+        self.assertEqual(self.engine.clean_body("CLICK NOW**FREE"), "CLICK NOWFREE")
+
+    def test_bold_and_phrases(self):
+        self.assertEqual(
+            self.engine.clean_body("**Amazing** offer, 100% free and guaranteed. CLICK HERE"),
+            "<strong>Notable</strong> offer, Complimentary and Assured. View Details",
+        )
+
+    def test_same_output_as_legacy(self):
+        mismatches = bench_sanitizer.fuzz(self.engine, 20000, seed=42)
+        self.assertFalse(mismatches, "%d bodies differ from the legacy cleaning, e.g. %r"
+                         % (len(mismatches), mismatches[:1]))
+        newsletter = bench_sanitizer.make_newsletter(16)
+        self.assertEqual(self.engine.clean_body(newsletter), bench_sanitizer.legacy_clean_body(newsletter))
+
+    def test_subject(self):
+        self.assertEqual(self.engine.clean_subject("FREE  offer!!! Act now??"), "offer! ?")
+
+    def test_custom_rules(self):
+        engine = content_sanitizer.get_sanitizer(
+            content_sanitizer.parse_body_rules("deal => offer\nbest deal => good offer"), None)
+        self.assertEqual(engine.clean_body("Best deal and a deal"), "good offer and a offer")
@@ -0,0 +1,76 @@
+import time
+from collections import Counter
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.custom_email_handler.tools import sendgrid_router
+
+
+@tagged("post_install", "-at_install")
+class TestRouting(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Config = cls.env["sendgrid.config"]
+        Config.search([]).write({"active": False})
+        cls.pinned = Config.create({
+            "name": "Pinned", "api_key": "key-pinned", "sender_email": "news@example.com",
+            "sender_domains": "example.com, @example.org",
+        })
+        cls.heavy = Config.create({
+            "name": "Heavy", "api_key": "key-heavy", "sender_email": "a@company.test", "routing_weight": 3,
+        })
+        cls.light = Config.create({
+            "name": "Light", "api_key": "key-light", "sender_email": "b@company.test", "routing_weight": 1,
+        })
+
+    def setUp(self):
+        super().setUp()
+        # Fresh round-robin and throttle state: both are process-wide
+        self.patch(sendgrid_router, "router", sendgrid_router.WeightedRoundRobin())
+        self.startPatcher(patch.dict(sendgrid_router._throttled_until, clear=True))
+
+    def _throttle(self, *configs):
+        for key in configs._config_keys():
+            sendgrid_router.mark_throttled(key, time.time() + 60)
+
+    def _picks(self, sender, count):
+        return Counter(self.env["sendgrid.config"]._route(sender) for _ in range(count))
+
+    def test_domain_pinning(self):
+        Config = self.env["sendgrid.config"]
+        self.assertEqual(Config._route("news@example.com"), self.pinned)
+        self.assertEqual(Config._route("Sales <sales@EXAMPLE.org>"), self.pinned)
+
+    def test_weighted_round_robin(self):
+        picks = self._picks("someone@elsewhere.test", 40)
+        self.assertEqual(picks, Counter({self.heavy: 30, self.light: 10}))
+
+    def test_default_configuration(self):
+        (self.heavy | self.light).routing_weight = 0
+        self.env["ir.config_parameter"].sudo().set_param("custom_email_handler.default_service_id", self.light.id)
+        self.assertEqual(self.env["sendgrid.config"]._route("someone@elsewhere.test"), self.light)
+
+    def test_throttled_weighted_config_is_skipped(self):
+        self._throttle(self.heavy)
+        self.assertEqual(self._picks("someone@elsewhere.test", 8), Counter({self.light: 8}))
+
+    def test_throttled_pinned_config_fails_over(self):
+        self._throttle(self.pinned)
+        self.assertNotEqual(self.env["sendgrid.config"]._route("news@example.com"), self.pinned)
+
+    def test_throttled_default_config_fails_over(self):
+        (self.heavy | self.light).routing_weight = 0
+        self.env["ir.config_parameter"].sudo().set_param("custom_email_handler.default_service_id", self.light.id)
+        self._throttle(self.light)
+        self.assertNotEqual(self.env["sendgrid.config"]._route("someone@elsewhere.test"), self.light)
+
+    def test_all_throttled_keeps_first_choice(self):
+        self._throttle(self.pinned | self.heavy | self.light)
+        self.assertEqual(self.env["sendgrid.config"]._route("news@example.com"), self.pinned)
+
+    def test_throttle_is_per_database(self):
+        sendgrid_router.mark_throttled(("other_db", self.pinned.id), time.time() + 60)
+        self.assertEqual(self.env["sendgrid.config"]._route("news@example.com"), self.pinned)
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.custom_email_handler.models.email_service import SendGridSendError
+from odoo.addons.custom_email_handler.models.sendgrid_ledger import LEDGER_RETENTION_DAYS
+
+DELIVER = "odoo.addons.custom_email_handler.models.mail_thread.deliver_sendgrid_message"
+
+
+@tagged("post_install", "-at_install")
+class TestSendLedger(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env["sendgrid.config"].search([]).write({"active": False})
+        cls.config = cls.env["sendgrid.config"].create({
+            "name": "Test", "api_key": "SG.test", "sender_email": "noreply@example.com",
+        })
+        cls.env["ir.config_parameter"].sudo().set_param("custom_email_handler.use_custom_service", "True")
+        cls.Ledger = cls.env["sendgrid.send.ledger"]
+
+    def setUp(self):
+        super().setUp()
+        # The ledger writes through its own cursor, which must see the test transaction
+        if self.registry.test_cr is None:
+            self.registry.enter_test_mode(self.cr)
+            self.addCleanup(self.registry.leave_test_mode)
+        transport = patch.object(type(self.env["mail.mail"]), "_get_custom_service_transport",
+                                 return_value=(None, None))
+        self.startPatcher(transport)
+
+    def _create_mails(self, count):
+        return self.env["mail.mail"].create([{
+            "subject": f"Ledger test {i}",
+            "body_html": "<p>Hello</p>",
+            "email_from": "noreply@example.com",
+            "email_to": f"customer{i}@example.com",
+            "auto_delete": False,
+        } for i in range(count)])
+
+    def _ledger_state(self, mail):
+        return self.Ledger.search([("key", "=", self.Ledger._get_key(mail))]).state
+
+    def test_accepted_is_never_downgraded(self):
+        mail = self._create_mails(1)
+        self.Ledger._record(mail, "pending")
+        self.assertEqual(self._ledger_state(mail), "pending")
+        self.Ledger._record(mail, "accepted")
+        self.Ledger._record(mail, "failed")
+        self.Ledger._record(mail, "pending")
+        self.assertEqual(self._ledger_state(mail), "accepted")
+
+    def test_get_accepted(self):
+        accepted, pending, unknown = self._create_mails(3)
+        self.Ledger._record(accepted, "accepted")
+        self.Ledger._record(pending, "pending")
+        self.assertEqual(self.Ledger._get_accepted(accepted | pending | unknown), accepted)
+        self.assertFalse(self.Ledger._get_accepted(self.env["mail.mail"]))
+
+    def test_gc(self):
+        recent, stale_pending, stale_accepted, deleted = self._create_mails(4)
+        self.Ledger._record(recent | stale_pending | deleted, "pending")
+        self.Ledger._record(stale_accepted, "accepted")
+        old_date = fields.Datetime.now() - timedelta(days=LEDGER_RETENTION_DAYS + 1)
+        self.env.cr.execute(
+            "UPDATE sendgrid_send_ledger SET write_date = %s WHERE mail_id IN %s",
+            [old_date, (stale_pending.id, stale_accepted.id)],
+        )
+        mail_ids = [recent.id, stale_pending.id, stale_accepted.id, deleted.id]
+        deleted.unlink()
+        self.Ledger._gc_ledger()
+        self.assertEqual(self.Ledger.search([("mail_id", "in", mail_ids)]).mapped("mail_id"), [recent.id])
+
+    def test_accepted_mail_is_not_sent_again(self):
+        accepted, new = self._create_mails(2)
+        # A previous run was killed after SendGrid accepted this mail
+        self.Ledger._record(accepted, "accepted")
+        with patch(DELIVER, return_value=True) as deliver:
+            (accepted | new).send()
+        self.assertEqual(deliver.call_count, 1)
+        self.assertEqual((accepted | new).mapped("state"), ["sent", "sent"])
+        self.assertEqual(accepted.message_id, accepted._get_custom_service_message_id())
+        self.assertEqual(self._ledger_state(new), "accepted")
+
+    def test_sent_mail_is_not_sent_twice(self):
+        mail = self._create_mails(1)
+        with patch(DELIVER, return_value=True) as deliver:
+            mail.send()
+            mail.state = "outgoing"
+            mail.send()
+        self.assertEqual(deliver.call_count, 1)
+        self.assertEqual(mail.state, "sent")
+
+    def test_permanent_failure(self):
+        mail = self._create_mails(1)
+        with patch(DELIVER, side_effect=SendGridSendError("Bad request", status_code=400)):
+            mail.send()
+        self.assertEqual(mail.state, "exception")
+        self.assertEqual(mail.failure_reason, "Bad request")
+        self.assertEqual(self._ledger_state(mail), "failed")
+
+    def test_async_dispatch_records_results(self):
+        self.env["ir.config_parameter"].sudo().set_param("custom_email_handler.max_in_flight", 4)
+        mails = self._create_mails(6)
+        self.Ledger._record(mails[0], "accepted")
+        with patch(DELIVER, return_value=True) as deliver:
+            mails.send()
+        self.assertEqual(deliver.call_count, 5)
+        self.assertEqual(set(mails.mapped("state")), {"sent"})
+        self.assertEqual(self.Ledger._get_accepted(mails), mails)
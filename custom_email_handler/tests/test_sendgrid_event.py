@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import date, datetime
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.custom_email_handler.tools import event_signature
+
+# 2026-03-01 10:00:00 UTC
+TIMESTAMP = 1772359200
+
+
+def _event(sg_event_id, event, mail_id=900001, offset=0):
+    return {
+        "sg_event_id": sg_event_id,
+        "sg_message_id": "msg-1",
+        "event": event,
+        "email": "customer@example.com",
+        "timestamp": TIMESTAMP + offset,
+        "odoo_mail_id": str(mail_id),
+    }
+
+
+@tagged("post_install", "-at_install")
+class TestSendGridEvent(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Event = self.env["sendgrid.event"]
+
+    def _daily(self, event):
+        return self.env["sendgrid.event.daily"].search([("day", "=", date(2026, 3, 1)), ("event", "=", event)])
+
+    def _mail_stats(self, mail_id):
+        return self.env["sendgrid.event.mail"].search([("mail_id", "=", mail_id)])
+
+    def test_rollups(self):
+        count = self.Event._ingest([
+            _event("e1", "processed"),
+            _event("e2", "delivered", offset=5),
+            _event("e3", "open", offset=60),
+            _event("e4", "open", offset=120),
+            _event("e5", "open", mail_id=900002, offset=30),
+            {"event": ""},
+            "not an event",
+        ])
+        self.assertEqual(count, 5)
+        self.assertEqual(self._daily("open").count, 3)
+        self.assertEqual(self._daily("delivered").count, 1)
+        stats = self._mail_stats(900001)
+        self.assertRecordValues(stats, [{
+            "processed_count": 1, "delivered_count": 1, "open_count": 2, "click_count": 0,
+            "last_event": "open", "last_event_date": datetime(2026, 3, 1, 10, 2),
+        }])
+        self.assertEqual(self._mail_stats(900002).open_count, 1)
+
+    def test_redelivery_is_not_counted_twice(self):
+        batch = [_event("e1", "delivered"), _event("e2", "open", offset=60)]
+        self.assertEqual(self.Event._ingest(batch), 2)
+        # SendGrid retries the whole batch with one more event
+        self.assertEqual(self.Event._ingest(batch + [_event("e3", "click", offset=90)]), 1)
+        self.assertEqual(self.Event.search_count([("mail_id", "=", 900001)]), 3)
+        self.assertEqual(self._daily("open").count, 1)
+        self.assertRecordValues(self._mail_stats(900001), [{
+            "delivered_count": 1, "open_count": 1, "click_count": 1, "last_event": "click",
+        }])
+
+    def test_events_of_other_databases_are_ignored(self):
+        own = dict(_event("e1", "open"), odoo_db=self.env.cr.dbname)
+        other = dict(_event("e2", "open", offset=60), odoo_db="another_database")
+        self.assertEqual(self.Event._ingest([own, other]), 1)
+        self.assertFalse(self.Event.search([("sg_event_id", "=", "e2")]))
+        self.assertEqual(self._daily("open").count, 1)
+        self.assertEqual(self._mail_stats(900001).open_count, 1)
+
+    def test_late_event_keeps_last_event(self):
+        self.Event._ingest([_event("e2", "open", offset=60)])
+        self.Event._ingest([_event("e1", "delivered")])
+        self.assertRecordValues(self._mail_stats(900001), [{
+            "delivered_count": 1, "open_count": 1, "last_event": "open",
+        }])
+
+    def test_signature(self):
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_der = private_key.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        public_key = base64.b64encode(public_der).decode()
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        payload = json.dumps([_event("e1", "open")]).encode()
+        timestamp = str(TIMESTAMP)
+        signature = base64.b64encode(
+            private_key.sign(timestamp.encode() + payload, ec.ECDSA(hashes.SHA256()))).decode()
+
+        self.assertTrue(event_signature.verify(public_key, signature, timestamp, payload))
+        self.assertTrue(event_signature.verify(public_pem, signature, timestamp, payload))
+        self.assertFalse(event_signature.verify(public_key, signature, timestamp, payload.replace(b"open", b"click")))
+        self.assertFalse(event_signature.verify(public_key, signature, str(TIMESTAMP + 1), payload))
+        self.assertFalse(event_signature.verify(public_key, "not base64!", timestamp, payload))
+        self.assertFalse(event_signature.verify(public_key, None, timestamp, payload))
+        self.assertFalse(event_signature.verify("", signature, timestamp, payload))
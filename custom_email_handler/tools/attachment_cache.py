@@ -0,0 +1,63 @@
+"""Streamed base64 encoding of filestore attachments with a per-checksum cache.
+
+SendGrid needs attachment content base64 encoded. Encoding straight from the filestore
+file avoids loading the raw bytes (and Odoo's own base64 ``datas`` copy) into memory,
+and caching the encoded payload by checksum means the same PDF sent to hundreds of
+recipients is read and encoded once per process.
+"""
+import base64
+import threading
+from collections import OrderedDict
+
+# Multiple of 3 so the base64 encodings of consecutive chunks concatenate without padding
+CHUNK_SIZE = 3 * 256 * 1024
+
+
+def b64encode_file(path, chunk_size=CHUNK_SIZE):
+    """Base64 encode a file chunk by chunk, never holding its raw content in full."""
+    out = bytearray()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            out += base64.b64encode(chunk)
+    return out.decode("ascii")
+
+
+class EncodedAttachmentCache:
+    """Thread-safe LRU of base64 payloads keyed by attachment checksum, bounded in bytes."""
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, checksum):
+        with self._lock:
+            value = self._entries.get(checksum)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(checksum)
+            self.hits += 1
+            return value
+
+    def put(self, checksum, b64):
+        if len(b64) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(checksum, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[checksum] = b64
+            self._bytes += len(b64)
+            while self._bytes > self.max_bytes:
+                _checksum, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+encoded_cache = EncodedAttachmentCache()
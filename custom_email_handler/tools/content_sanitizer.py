@@ -0,0 +1,129 @@
+"""Precompiled content cleaning engine for outgoing SendGrid mail.
+
+Bodies are cleaned in two scans with the output of the legacy cleaning: one for the
+``**`` markers, then one for all replacement phrases of a configuration, compiled once
+per process into a single alternation with a lookup table mapping every matched phrase
+to its replacement. Markers must go first: dropping a lone ``**`` can join two words and
+so change which phrases stand on word boundaries.
+"""
+import hashlib
+import re
+import threading
+
+# phrase -> neutral replacement used in HTML bodies
+DEFAULT_BODY_REPLACEMENTS = (
+    ("CLICK HERE", "View Details"),
+    ("CLICK NOW", "View Details"),
+    ("BUY NOW", "View Product"),
+    ("PURCHASE NOW", "View Product"),
+    ("LIMITED TIME", "Available Now"),
+    ("ACT NOW", "Available Now"),
+    ("URGENT", "Important"),
+    ("HURRY", "Important"),
+    ("FREE", "Complimentary"),
+    ("100% FREE", "Complimentary"),
+    ("GUARANTEE", "Assured"),
+    ("GUARANTEED", "Assured"),
+    ("AMAZING", "Notable"),
+    ("INCREDIBLE", "Notable"),
+)
+
+# phrases removed from subject lines
+DEFAULT_SUBJECT_PHRASES = (
+    "FREE", "100% FREE",
+    "URGENT", "HURRY",
+    "ACT NOW", "CLICK NOW",
+    "LIMITED TIME", "OFFER EXPIRES",
+    "SALE", "DISCOUNT",
+    "WIN", "WINNER",
+    "GUARANTEE", "GUARANTEED",
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# **text** -> <strong>text</strong>, lone ** are dropped
+_MARKER_RE = re.compile(r"\*\*(?P<inner>.*?)\*\*|\*\*")
+
+
+def _marker_repl(m):
+    inner = m.group("inner")
+    return "" if inner is None else "<strong>%s</strong>" % inner
+
+
+def parse_body_rules(text):
+    """Parse ``PHRASE => Replacement`` lines; returns None when no rule is defined."""
+    rules = []
+    for line in (text or "").splitlines():
+        phrase, sep, replacement = line.partition("=>")
+        if sep and phrase.strip():
+            rules.append((phrase.strip(), replacement.strip()))
+    return tuple(rules) or None
+
+
+def parse_subject_phrases(text):
+    """Parse one phrase per line; returns None when no phrase is defined."""
+    phrases = tuple(line.strip() for line in (text or "").splitlines() if line.strip())
+    return phrases or None
+
+
+def _phrase_alternation(phrases):
+    # Longest first, so "100% FREE" wins over "FREE" at the same position
+    ordered = sorted(set(phrases), key=len, reverse=True)
+    return "|".join(re.escape(p) for p in ordered)
+
+
+class ContentSanitizer:
+    """Compiled body/subject cleaning rules. Instances are immutable and thread-safe."""
+
+    def __init__(self, body_replacements=DEFAULT_BODY_REPLACEMENTS, subject_phrases=DEFAULT_SUBJECT_PHRASES):
+        self.body_replacements = tuple(body_replacements)
+        self.subject_phrases = tuple(subject_phrases)
+        self.version = hashlib.sha1(
+            repr((self.body_replacements, self.subject_phrases)).encode()
+        ).hexdigest()[:12]
+
+        self._body_lookup = {phrase.upper(): repl for phrase, repl in self.body_replacements}
+        self._phrase_re = self._body_lookup and re.compile(
+            r"\b(?:%s)\b" % _phrase_alternation(self._body_lookup), re.IGNORECASE)
+
+        subject_parts = [r"(?P<punct>!{2,}|\?{2,}|\${2,})"]  # collapse repeated !, ? and $
+        if self.subject_phrases:
+            subject_parts.append(r"\b(?:%s)\b" % _phrase_alternation(self.subject_phrases))
+        self._subject_re = re.compile("|".join(subject_parts), re.IGNORECASE)
+
+    def _phrase_repl(self, m):
+        return self._body_lookup.get(m.group(0).upper(), m.group(0))
+
+    def _subject_repl(self, m):
+        punct = m.group("punct")
+        return punct[0] if punct else ""
+
+    def clean_body(self, body):
+        if "**" in body:
+            body = _MARKER_RE.sub(_marker_repl, body)
+        if self._phrase_re:
+            body = self._phrase_re.sub(self._phrase_repl, body)
+        return body
+
+    def clean_subject(self, subject):
+        subject = self._subject_re.sub(self._subject_repl, subject)
+        return _WHITESPACE_RE.sub(" ", subject).strip()
+
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_sanitizer(body_replacements=None, subject_phrases=None):
+    """Return the process-wide engine for a rule set (defaults when a part is None)."""
+    key = (body_replacements, subject_phrases)
+    engine = _engines.get(key)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = ContentSanitizer(
+                    DEFAULT_BODY_REPLACEMENTS if body_replacements is None else body_replacements,
+                    DEFAULT_SUBJECT_PHRASES if subject_phrases is None else subject_phrases,
+                )
+                _engines[key] = engine
+    return engine
@@ -0,0 +1,38 @@
+"""Verification of SendGrid Signed Event Webhook requests.
+
+SendGrid signs ``timestamp + raw body`` with ECDSA P-256/SHA-256 and sends the base64 DER
+signature and the timestamp in the ``X-Twilio-Email-Event-Webhook-Signature`` and
+``X-Twilio-Email-Event-Webhook-Timestamp`` headers. The verification key is the one shown
+in the SendGrid mail settings, as base64 DER or PEM.
+"""
+import base64
+import binascii
+import functools
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_der_public_key, load_pem_public_key
+
+SIGNATURE_HEADER = "X-Twilio-Email-Event-Webhook-Signature"
+TIMESTAMP_HEADER = "X-Twilio-Email-Event-Webhook-Timestamp"
+
+
+@functools.lru_cache(maxsize=8)
+def load_public_key(public_key):
+    public_key = public_key.strip()
+    if public_key.startswith("-----BEGIN"):
+        return load_pem_public_key(public_key.encode())
+    return load_der_public_key(base64.b64decode(public_key))
+
+
+def verify(public_key, signature, timestamp, payload):
+    """Return True when ``signature`` (base64) signs ``timestamp`` + ``payload`` (bytes)."""
+    if not (public_key and signature and timestamp):
+        return False
+    try:
+        load_public_key(public_key).verify(
+            base64.b64decode(signature), timestamp.encode() + payload, ec.ECDSA(hashes.SHA256()))
+    except (InvalidSignature, binascii.Error, ValueError, TypeError):
+        return False
+    return True
@@ -0,0 +1,74 @@
+"""Indexing and matching of incoming-mail handlers on cheap header predicates.
+
+Handlers are declared by ``mail.thread._get_incoming_mail_handlers()`` as dicts:
+
+    {
+        'name': 'supplier_invoices',        # unique, used for the deferred queue
+        'model': 'account.move',            # model and method called with a list
+        'method': '_handle_supplier_mail',  # of IncomingMessage
+        'senders': ['billing@acme.com'],    # exact sender addresses
+        'domains': ['supplier.example'],    # sender domains
+        'headers': {'List-Id': 'invoices', 'X-Acme-Document': None},
+        'deferred': True,                   # queue and process in batches
+    }
+
+A handler matches when ANY of its predicates does: the sender address, its domain, or a
+header containing the given value (case-insensitive; ``None`` only requires the header).
+Predicates are indexed once so matching an incoming mail costs a few dict lookups
+whatever the number of handlers.
+"""
+from collections import namedtuple
+from email.parser import BytesHeaderParser
+
+IncomingMessage = namedtuple("IncomingMessage", ["sender", "headers", "raw"])
+
+HandlerIndex = namedtuple("HandlerIndex", ["handlers", "by_sender", "by_domain", "by_header"])
+
+_header_parser = BytesHeaderParser()
+
+
+def build_index(specs):
+    """Index handler ``specs`` (see module docstring) by sender, domain and header name."""
+    handlers, by_sender, by_domain, by_header = {}, {}, {}, {}
+    for spec in specs:
+        name = spec["name"]
+        if name in handlers:
+            raise ValueError(f"Duplicate incoming mail handler {name!r}")
+        if not (spec.get("senders") or spec.get("domains") or spec.get("headers")):
+            raise ValueError(f"Incoming mail handler {name!r} declares no sender, domain or header predicate")
+        handlers[name] = spec
+        for sender in spec.get("senders") or ():
+            by_sender.setdefault(sender.strip().lower(), []).append(name)
+        for domain in spec.get("domains") or ():
+            by_domain.setdefault(domain.strip().lstrip("@").lower(), []).append(name)
+        for header, value in (spec.get("headers") or {}).items():
+            by_header.setdefault(header.lower(), []).append((value.lower() if value else None, name))
+    return HandlerIndex(handlers, by_sender, by_domain, by_header)
+
+
+def to_bytes(message):
+    """Normalize a ``message_process`` message (str, bytes or xmlrpc Binary) to bytes."""
+    if isinstance(message, str):
+        return message.encode()
+    if hasattr(message, "data"):
+        return bytes(message.data)
+    return bytes(message)
+
+
+def parse_headers(raw):
+    """Parse only the header block of ``raw``; the body is never decoded."""
+    return _header_parser.parsebytes(raw, headersonly=True)
+
+
+def match(index, sender, headers):
+    """Return the names of the handlers matching ``sender``/``headers``, in declaration order."""
+    names = set(index.by_sender.get(sender, ()))
+    if sender:
+        names.update(index.by_domain.get(sender.rpartition("@")[2], ()))
+    for header, predicates in index.by_header.items():
+        value = headers.get(header)
+        if value is None:
+            continue
+        value = str(value).lower()
+        names.update(name for expected, name in predicates if expected is None or expected in value)
+    return [name for name in index.handlers if name in names]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Local stand-in for the SendGrid v3 ``/v3/mail/send`` endpoint.
+
+Meant for benchmarks and manual testing of the send path without hitting the real API:
+point a ``sendgrid.config`` ``api_url`` at the server (e.g. ``http://127.0.0.1:8025``).
+Every request is answered after a configurable latency with 202, a random 5xx error or,
+once the configured request rate is exceeded, a 429 carrying ``X-RateLimit-*`` headers
+like SendGrid does. Standalone usage:
+
+    python3 custom_email_handler/tools/mock_sendgrid.py --port 8025 --latency-ms 80 --error-rate 0.01
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+MAIL_SEND_PATH = "/v3/mail/send"
+
+
+class MockSendGridServer(ThreadingHTTPServer):
+    """Threaded HTTP server emulating SendGrid's mail send endpoint.
+
+    :param latency: seconds every request takes before it is answered
+    :param jitter: extra random latency, uniformly drawn in ``[0, jitter]`` seconds
+    :param error_rate: share of requests (0-1) answered with a 500/503 error
+    :param rate_limit: accepted requests per second before answering 429 (0 = unlimited)
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit=0):
+        super().__init__((host, port), _MockSendGridHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "accepted": 0, "errors": 0, "throttled": 0,
+                          "personalizations": 0, "bytes": 0}
+            self._window_start = math.floor(time.time())
+            self._window_count = 0
+
+    def start(self):
+        """Serve from a daemon thread and return ``self``."""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-sendgrid", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _decide(self, payload_size, personalizations):
+        """Return ``(status, rate_limit_reset)`` for one request and update the stats."""
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += payload_size
+            now = time.time()
+            if self.rate_limit:
+                window = math.floor(now)
+                if window != self._window_start:
+                    self._window_start, self._window_count = window, 0
+                if self._window_count >= self.rate_limit:
+                    self.stats["throttled"] += 1
+                    return 429, window + 1
+                self._window_count += 1
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return random.choice((500, 503)), None
+            self.stats["accepted"] += 1
+            self.stats["personalizations"] += personalizations
+            return 202, None
+
+
+class _MockSendGridHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.split("?")[0] != MAIL_SEND_PATH:
+            return self._reply(404, {"errors": [{"message": "Not found"}]})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._reply(401, {"errors": [{"message": "Missing API key"}]})
+        try:
+            personalizations = len(json.loads(body or b"{}").get("personalizations") or [])
+        except ValueError:
+            return self._reply(400, {"errors": [{"message": "Invalid JSON"}]})
+
+        delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        status, reset = server._decide(len(body), personalizations)
+        if status == 202:
+            self._reply(202, None, {"X-Message-Id": uuid.uuid4().hex[:22]})
+        elif status == 429:
+            self._reply(429, {"errors": [{"message": "too many requests"}]}, {
+                "X-RateLimit-Limit": str(server.rate_limit),
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(reset),
+            })
+        else:
+            self._reply(status, {"errors": [{"message": "mock server error"}]})
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        _logger.debug("[MockSendGrid] " + format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per second before 429")
+    args = parser.parse_args()
+
+    server = MockSendGridServer(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                                args.error_rate, args.rate_limit)
+    print(f"Mock SendGrid listening on {server.url}{MAIL_SEND_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
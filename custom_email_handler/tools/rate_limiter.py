@@ -0,0 +1,97 @@
+"""Token-bucket rate limiting and retry classification for SendGrid requests."""
+import random
+import threading
+import time
+
+# Delay bounds (seconds) for retries of transient failures
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``rate`` tokens per second, at most ``burst`` saved up.
+
+    A 429 answer pauses the whole bucket until SendGrid's rate-limit window resets, so
+    every thread sharing it backs off at once.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Block until a token is available; returns False if ``timeout`` elapses first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return False
+            time.sleep(wait)
+
+    def pause_until(self, epoch_seconds):
+        """Stop handing out tokens until the given wall-clock time."""
+        with self._lock:
+            target = time.monotonic() + max(0.0, epoch_seconds - time.time())
+            self._paused_until = max(self._paused_until, target)
+            self._tokens = 0.0
+
+    def is_paused(self):
+        return time.monotonic() < self._paused_until
+
+
+_buckets = {}
+_lock = threading.Lock()
+
+
+def get_bucket(key, rate, burst=None):
+    """Return the process-wide bucket for ``key``, or None when ``rate`` is not positive.
+
+    Keys must be unique across the databases served by the process, e.g.
+    ``(database name, config id)``.
+    """
+    if not rate or rate <= 0:
+        return None
+    bucket = _buckets.get(key)
+    if bucket is None or bucket.rate != float(rate):
+        with _lock:
+            bucket = _buckets.get(key)
+            if bucket is None or bucket.rate != float(rate):
+                bucket = TokenBucket(rate, burst)
+                _buckets[key] = bucket
+    return bucket
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Exponential backoff with full jitter for the ``attempt``-th retry (0-based)."""
+    return random.uniform(base / 2.0, min(cap, base * (2 ** attempt)))
+
+
+def rate_limit_reset(headers, default_delay=60):
+    """Epoch time at which a 429'd request may be retried, from SendGrid's headers."""
+    headers = headers or {}
+    reset = headers.get("X-RateLimit-Reset")
+    if reset:
+        try:
+            return float(reset)
+        except (TypeError, ValueError):
+            pass
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return time.time() + float(retry_after)
+        except (TypeError, ValueError):
+            pass
+    return time.time() + default_delay
@@ -0,0 +1,65 @@
+"""Content-addressed LRU cache for cleaned HTML bodies and their plain-text alternative.
+
+Mass mailings produce many ``mail.mail`` records with the same ``body_html``; caching by
+body hash plus cleaning-rule version makes the expensive cleaning run once per body.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """Thread-safe LRU bounded both by entry count and by total cached characters."""
+
+    def __init__(self, max_entries=256, max_chars=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(body, rules_version):
+        return "%s:%s" % (rules_version, hashlib.sha256(body.encode("utf-8", "surrogatepass")).hexdigest())
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = sum(len(part) for part in value)
+        if size > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._chars -= sum(len(part) for part in old)
+            self._entries[key] = value
+            self._chars += size
+            while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+                _key, evicted = self._entries.popitem(last=False)
+                self._chars -= sum(len(part) for part in evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by every sendgrid.config of the process; keys include the rule version
+body_cache = RenderCache()
@@ -0,0 +1,70 @@
+"""In-process instrumentation of the SendGrid send path.
+
+Collects per-phase timings (normalize, clean, build, serialize, http) together with
+message, recipient, attachment and payload byte counters. Counters are aggregated per
+Odoo worker process and exposed through ``sendgrid.config.get_send_metrics()``.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ("normalize", "clean", "build", "serialize", "http")
+
+
+class SendMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.counters = {
+                "requests": 0,
+                "accepted": 0,
+                "failed": 0,
+                "recipients": 0,
+                "attachments": 0,
+                "payload_bytes": 0,
+            }
+            # phase -> [count, total seconds, max seconds]
+            self.phases = {phase: [0, 0.0, 0.0] for phase in PHASES}
+
+    @contextmanager
+    def timer(self, phase):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_timing(phase, time.perf_counter() - t0)
+
+    def add_timing(self, phase, seconds):
+        with self._lock:
+            stat = self.phases.setdefault(phase, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+    def incr(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "counters": dict(self.counters),
+                "phases": {
+                    phase: {
+                        "count": count,
+                        "total_ms": round(total * 1000, 3),
+                        "avg_ms": round(total * 1000 / count, 3) if count else 0.0,
+                        "max_ms": round(peak * 1000, 3),
+                    }
+                    for phase, (count, total, peak) in self.phases.items()
+                },
+            }
+
+
+metrics = SendMetrics()
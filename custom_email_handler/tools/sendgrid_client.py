@@ -0,0 +1,108 @@
+"""Process-wide pool of keep-alive HTTP clients for the SendGrid v3 API.
+
+``sendgrid.SendGridAPIClient`` goes through ``python_http_client``/urllib, which opens a
+new TLS connection for every request. The clients kept here wrap a ``requests.Session``
+with a pooled adapter instead, so connections are reused across messages and can be
+shared by all Odoo worker threads of the process.
+"""
+import json
+import logging
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "https://api.sendgrid.com"
+EU_HOST = "https://api.eu.sendgrid.com"
+MAIL_SEND_PATH = "/v3/mail/send"
+
+SendGridResponse = namedtuple("SendGridResponse", ["status_code", "body", "headers"])
+
+
+def resolve_host(api_url):
+    """Return the API base URL (scheme + host) for a ``sendgrid.config.api_url`` value."""
+    if not api_url:
+        return DEFAULT_HOST
+    if "api.eu.sendgrid.com" in api_url:
+        return EU_HOST
+    parts = urlsplit(api_url.strip())
+    if parts.scheme and parts.netloc:
+        return f"{parts.scheme}://{parts.netloc}"
+    return DEFAULT_HOST
+
+
+class SendGridClient:
+    """Minimal thread-safe SendGrid v3 client backed by a pooled ``requests.Session``."""
+
+    def __init__(self, api_key, host=DEFAULT_HOST, timeout=30, pool_size=16, config_key=None):
+        # (database name, sendgrid.config id) of the configuration using the client
+        self.config_key = config_key
+        self.host = host
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "User-Agent": "odoo-custom-email-handler",
+        })
+
+    def send(self, message):
+        """POST a ``sendgrid.helpers.mail.Mail``, a payload dict or an already serialized payload."""
+        data = message if isinstance(message, (bytes, bytearray)) else serialize(message)
+        resp = self.session.post(self.host + MAIL_SEND_PATH, data=data, timeout=self.timeout)
+        return SendGridResponse(resp.status_code, resp.content, resp.headers)
+
+
+def serialize(message):
+    """Serialize a ``Mail`` or payload dict into the JSON request body."""
+    payload = message.get() if hasattr(message, "get") and not isinstance(message, dict) else message
+    return json.dumps(payload).encode()
+
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(config_key, api_key, api_url=None):
+    """Return the shared client for a configuration, creating it on first use.
+
+    ``config_key`` is ``(database name, sendgrid.config id)``: databases served by the
+    same process have overlapping ids. Clients are keyed by it, the API key and the API
+    URL, so changing the key or the URL of a configuration transparently yields a
+    fresh client in every process.
+    """
+    registry_key = (config_key, api_key, api_url or "")
+    client = _clients.get(registry_key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(registry_key)
+        if client is None:
+            _drop(config_key)
+            client = SendGridClient(api_key, resolve_host(api_url), config_key=config_key)
+            _clients[registry_key] = client
+            _logger.debug("[SendGrid] New pooled client | config=%s | host=%s", config_key, client.host)
+    return client
+
+
+def invalidate(config_keys):
+    """Forget the clients of the given ``(database name, sendgrid.config id)`` keys.
+
+    Dropped clients are not closed explicitly since another thread may still be using
+    them; their connections are released once the last reference goes away.
+    """
+    with _lock:
+        for config_key in config_keys:
+            _drop(config_key)
+
+
+def _drop(config_key):
+    for registry_key in [k for k in _clients if k[0] == config_key]:
+        _clients.pop(registry_key, None)
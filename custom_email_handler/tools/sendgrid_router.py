@@ -0,0 +1,42 @@
+"""Load distribution of outbound mail across several ``sendgrid.config`` records."""
+import threading
+import time
+
+
+class WeightedRoundRobin:
+    """Smooth weighted round-robin (as used by nginx).
+
+    Over any window, each key is picked in proportion to its weight, and picks of the
+    same key are spread out instead of coming in bursts.
+    """
+
+    def __init__(self):
+        self._current = {}
+        self._lock = threading.Lock()
+
+    def pick(self, candidates):
+        """Pick a key from ``[(key, weight), ...]`` (weights must be positive)."""
+        with self._lock:
+            total = 0
+            best = None
+            for key, weight in candidates:
+                self._current[key] = self._current.get(key, 0) + weight
+                total += weight
+                if best is None or self._current[key] > self._current[best]:
+                    best = key
+            self._current[best] -= total
+            return best
+
+
+router = WeightedRoundRobin()
+
+# (database name, config id) -> epoch time until which SendGrid rate-limits its API key
+_throttled_until = {}
+
+
+def mark_throttled(config_key, until):
+    _throttled_until[config_key] = max(_throttled_until.get(config_key, 0), until)
+
+
+def is_throttled(config_key):
+    return _throttled_until.get(config_key, 0) > time.time()
@@ -4,11 +4,13 @@
     "depends": ["base", "contacts", "crm"],
     "data": [
         "security/ir.model.access.csv",
+        "data/ir_cron_data.xml",
         "views/res_partner_view.xml",
         "views/napr_fetch_wizard_views.xml",
         "views/partner_to_crm_wizard_views.xml",
         "views/partner_to_crm_server_action.xml",
         "views/res_partner_search_view_inherit.xml",
+        "views/napr_registry_cache_views.xml",
     ],
     "license": "LGPL-3",
 }
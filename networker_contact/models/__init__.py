@@ -1,3 +1,7 @@
 from . import partner_napr_wizard
 from . import res_partner
-from . import partner_to_crm_wizard
\ No newline at end of file
+from . import partner_to_crm_wizard
+from . import napr_registry_cache
+from . import napr_conversion_cache
+from . import napr_conversion_job
+from . import napr_registry_document
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import base64
+import logging
+from collections import Counter
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import djvu_pipeline
+
+_logger = logging.getLogger(__name__)
+
+# Default of the networker_contact.conversion_cache_max_mb system parameter
+DEFAULT_MAX_MB = 512
+
+
+class NaprConversionCache(models.Model):
+    """PDF conversions of registry DJVU documents, keyed by the DJVU SHA-256 and the options.
+
+    The same filing fetched again, or for another partner, reuses the PDF instead of
+    running ``ddjvu``. PDFs live in the filestore. Least recently used entries are
+    evicted once the cache exceeds ``networker_contact.conversion_cache_max_mb``.
+    """
+    _name = "napr.conversion.cache"
+    _description = "NAPR Conversion Cache"
+    _order = "last_used desc"
+    _rec_name = "source_sha256"
+
+    source_sha256 = fields.Char("DJVU SHA-256", required=True, readonly=True)
+    options = fields.Char(required=True, readonly=True)
+    pdf = fields.Binary("PDF", attachment=True, readonly=True)
+    size = fields.Integer(readonly=True)
+    hits = fields.Integer(readonly=True)
+    last_used = fields.Datetime(readonly=True, index=True)
+
+    _sql_constraints = [
+        ("source_options_unique", "UNIQUE(source_sha256, options)", "One conversion per document and options."),
+    ]
+
+    @api.model
+    def _open_pdf(self, source_sha256, options):
+        """Return the cached PDF as an open binary file (the caller closes it), or None.
+
+        The file of the filestore is opened directly, so a hit does not load the PDF in
+        memory; it stays readable even if the attachment is garbage collected meanwhile.
+        """
+        entry = self.sudo().search([("source_sha256", "=", source_sha256), ("options", "=", options)], limit=1)
+        if not entry:
+            return None
+        attachment = self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_field", "=", "pdf"),
+            ("res_id", "=", entry.id),
+        ], limit=1)
+        if not attachment:
+            return None
+        if attachment.store_fname:
+            try:
+                return open(attachment._full_path(attachment.store_fname), "rb")
+            except OSError as e:
+                _logger.warning("NAPR: cached PDF %s is missing from the filestore: %s", source_sha256, e)
+                return None
+        # Stored in the database (ir_attachment.location = db)
+        return djvu_pipeline._spool(attachment.raw) if attachment.raw else None
+
+    @api.model
+    def _put_pdf(self, source_sha256, options, pdf):
+        if self.sudo().search_count([("source_sha256", "=", source_sha256), ("options", "=", options)], limit=1):
+            return
+        self.sudo().create({
+            "source_sha256": source_sha256,
+            "options": options,
+            "pdf": base64.b64encode(pdf),
+            "size": len(pdf),
+            "last_used": fields.Datetime.now(),
+        })
+
+    @api.model
+    def _mark_used(self, options, hits):
+        """Count ``{source_sha256: hits}`` of entries with ``options`` in one UPDATE."""
+        self.env.cr.execute(SQL(
+            """UPDATE napr_conversion_cache entry
+                  SET hits = entry.hits + used.hits, last_used = %s
+                 FROM (VALUES %s) AS used(source_sha256, hits)
+                WHERE entry.source_sha256 = used.source_sha256 AND entry.options = %s""",
+            fields.Datetime.now(),
+            SQL(", ").join(SQL("(%s, %s)", sha, count) for sha, count in sorted(hits.items())),
+            options,
+        ))
+        self.invalidate_model(["hits", "last_used"])
+
+    @api.model
+    def _batch(self, options):
+        """Return a cache handle for one fetch or job; use it as a context manager.
+
+        It works on the current cursor, from the current thread only.
+        """
+        return _CacheBatch(self.env, options)
+
+    @api.autovacuum
+    def _gc_evict_lru(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            max_bytes = int(float(ICP.get_param("networker_contact.conversion_cache_max_mb", DEFAULT_MAX_MB)) * 1024 * 1024)
+        except ValueError:
+            max_bytes = DEFAULT_MAX_MB * 1024 * 1024
+        # Keep the most recently used entries whose cumulated size fits, drop the rest
+        self.env.cr.execute(SQL(
+            """SELECT id FROM (
+                   SELECT id, SUM(size) OVER (ORDER BY last_used DESC NULLS LAST, id DESC) AS total
+                     FROM napr_conversion_cache
+               ) ranked
+              WHERE total > %s""",
+            max_bytes,
+        ))
+        evicted = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if evicted:
+            evicted.sudo().unlink()
+            _logger.info("NAPR: evicted %d conversion(s) from the cache", len(evicted))
+
+
+class _CacheBatch:
+    """``get``/``put`` of ``napr.conversion.cache`` on the cursor of the caller.
+
+    ``get`` returns an open file (see ``_open_pdf``); its hits are counted in one
+    UPDATE when the handle is closed. Each ``put`` runs in a savepoint, so a concurrent
+    fetch caching the same conversion first does not abort the transaction. No cursor
+    is opened, however many conversion threads the caller runs.
+    """
+
+    def __init__(self, env, options):
+        self.env = env
+        self.options = options
+        self.hits = Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # On error the transaction is rolled back, hits included
+        if exc_type is None:
+            self.close()
+
+    def close(self):
+        if self.hits:
+            self.env["napr.conversion.cache"]._mark_used(self.options, self.hits)
+            self.hits.clear()
+
+    def get(self, source_sha256):
+        pdf = self.env["napr.conversion.cache"]._open_pdf(source_sha256, self.options)
+        if pdf is not None:
+            self.hits[source_sha256] += 1
+        return pdf
+
+    def put(self, source_sha256, pdf):
+        Cache = self.env["napr.conversion.cache"]
+        try:
+            with self.env.cr.savepoint():
+                Cache._put_pdf(source_sha256, self.options, pdf)
+        except Exception as e:
+            Cache.invalidate_model()
+            # A concurrent fetch cached the same conversion first
+            _logger.debug("NAPR: could not cache conversion %s: %s", source_sha256, e)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import djvu_pipeline
+
+_logger = logging.getLogger(__name__)
+
+# Days a finished job is kept before autovacuum removes it
+JOB_RETENTION_DAYS = 7
+# Source attachments are created by batches of about this many bytes
+SOURCE_BATCH_BYTES = 32 * 1024 * 1024
+# ddjvu timeout of deferred conversions, in seconds: they exist for the large documents
+# a fetch could not convert in time
+DEFERRED_CONVERT_TIMEOUT = 30 * 60
+
+
+class NaprConversionJob(models.Model):
+    """Deferred conversion of a registry document attached with a lighter profile.
+
+    The fetch wizard attaches a quick preview PDF right away and queues the DJVU source
+    here, as an attachment of the job; the cron converts it with ``profile`` and
+    replaces the content of the preview attachment, one committed transaction per
+    document. On failure the preview stays. The source is deleted once the job has run
+    either way, and autovacuum removes old jobs together with any source left.
+    """
+    _name = "napr.conversion.job"
+    _description = "NAPR Deferred Conversion"
+    _order = "id"
+
+    attachment_id = fields.Many2one("ir.attachment", required=True, ondelete="cascade", readonly=True)
+    profile = fields.Selection([
+        ("archive", "Archive"),
+        ("full", "Full"),
+    ], default="full", required=True, readonly=True)
+    state = fields.Selection([
+        ("queued", "Queued"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ], default="queued", required=True, index=True, readonly=True)
+    error = fields.Text(readonly=True)
+
+    @api.model
+    def _enqueue(self, pairs, profile="full"):
+        """Queue ``(preview attachment, DJVU file)`` pairs for conversion with ``profile``.
+
+        Jobs are created together; their sources are read one at a time and created in
+        batches of at most ``SOURCE_BATCH_BYTES``.
+        """
+        if not pairs:
+            return self.browse()
+        jobs = self.sudo().create([{
+            "attachment_id": attachment.id,
+            "profile": profile,
+        } for attachment, _source in pairs])
+
+        Attachment = self.env["ir.attachment"].sudo()
+        batch, batch_bytes = [], 0
+        for job, (attachment, source) in zip(jobs, pairs):
+            raw = source.read()
+            batch.append({
+                "name": attachment.name.replace(".pdf", ".djvu"),
+                "res_model": self._name,
+                "res_id": job.id,
+                "raw": raw,
+                "mimetype": "image/vnd.djvu",
+            })
+            batch_bytes += len(raw)
+            if batch_bytes >= SOURCE_BATCH_BYTES:
+                Attachment.create(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            Attachment.create(batch)
+        self.env.ref("networker_contact.ir_cron_run_napr_conversion_jobs")._trigger()
+        return jobs
+
+    def _get_source_attachments(self):
+        return self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_id", "in", self.ids),
+        ])
+
+    def unlink(self):
+        sources = self._get_source_attachments()
+        res = super().unlink()
+        sources.unlink()
+        return res
+
+    @api.model
+    def _cron_run_jobs(self):
+        """Convert queued documents, committing after each one."""
+        for job in self.sudo().search([("state", "=", "queued")]):
+            try:
+                job._run()
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("NAPR: deferred conversion %s failed", job.id)
+                job.write({"state": "failed", "error": str(e)})
+                job._get_source_attachments().unlink()
+            self.env.cr.commit()
+
+    def _run(self):
+        self.ensure_one()
+        source = self._get_source_attachments()[:1]
+        if not source:
+            self.write({"state": "failed", "error": "DJVU source is missing"})
+            return
+        options = djvu_pipeline.PROFILES[self.profile]
+        with self.env["napr.conversion.cache"]._batch(" ".join(options)) as cache:
+            content, _filename, converted = djvu_pipeline.convert_cached(
+                source.raw, source.name, cache, options, timeout=DEFERRED_CONVERT_TIMEOUT)
+        if not converted:
+            self.write({"state": "failed", "error": "ddjvu conversion failed"})
+            source.unlink()
+            return
+        self.attachment_id.raw = content
+        self.state = "done"
+        source.unlink()
+        _logger.info("NAPR: %s converted with the %s profile (%d bytes)",
+                     self.attachment_id.name, self.profile, len(content))
+
+    @api.autovacuum
+    def _gc_done_jobs(self):
+        limit_date = fields.Datetime.now() - timedelta(days=JOB_RETENTION_DAYS)
+        jobs = self.sudo().search([("state", "in", ("done", "failed")), ("write_date", "<", limit_date)])
+        jobs.unlink()
+        # Sources whose job is gone (e.g. deleted with its preview attachment)
+        self.env.cr.execute(SQL(
+            """SELECT id FROM ir_attachment attachment
+                WHERE attachment.res_model = %s
+                  AND NOT EXISTS (SELECT 1 FROM napr_conversion_job job WHERE job.id = attachment.res_id)""",
+            self._name,
+        ))
+        orphans = self.env["ir.attachment"].sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        orphans.unlink()
+        _logger.info("NAPR: removed %d finished conversion jobs and %d orphan sources", len(jobs), len(orphans))
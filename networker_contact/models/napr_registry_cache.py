@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import registry_client
+
+_logger = logging.getLogger(__name__)
+
+# Defaults of the networker_contact.registry_cache_* system parameters, in hours
+DEFAULT_TTL_HOURS = 7 * 24
+DEFAULT_NEGATIVE_TTL_HOURS = 12
+# Entries not refreshed for this many days are removed by autovacuum
+STALE_ENTRY_DAYS = 90
+
+
+class NaprRegistryCache(models.Model):
+    """Registry data per VAT, so repeated lookups do not scrape NAPR and companyinfo.ge again.
+
+    Each source has its own fetch timestamp. An entry is fresh for
+    ``networker_contact.registry_cache_ttl_hours`` when the source knew the VAT, and for
+    ``networker_contact.registry_cache_negative_ttl_hours`` when it did not ("not found"
+    is cached too). Failed requests are never cached.
+    """
+    _name = "napr.registry.cache"
+    _description = "NAPR Registry Cache"
+    _order = "vat"
+    _rec_name = "vat"
+    _log_access = False
+
+    vat = fields.Char("VAT", required=True, readonly=True)
+    legal_name = fields.Char(readonly=True)
+    legal_code_id = fields.Char("Legal Code ID", readonly=True)
+    legal_status = fields.Selection([
+        ("functioning", "Functioning"),
+        ("not_found", "Not Found"),
+    ], readonly=True)
+    napr_fetched_at = fields.Datetime("NAPR Fetched At", readonly=True)
+    corp_id = fields.Char("companyinfo.ge ID", readonly=True)
+    corp_name = fields.Char("companyinfo.ge Name", readonly=True)
+    director = fields.Char(readonly=True)
+    director_fetched = fields.Boolean(readonly=True)
+    companyinfo_fetched_at = fields.Datetime("companyinfo.ge Fetched At", readonly=True)
+
+    _sql_constraints = [
+        ("vat_unique", "UNIQUE(vat)", "One registry cache entry per VAT."),
+    ]
+
+    # -------------------------------------------------------------------------
+    # Freshness
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_ttls(self):
+        """Return the ``(ttl, negative_ttl)`` timedeltas configured in system parameters."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        ttls = []
+        for key, default in (("ttl_hours", DEFAULT_TTL_HOURS), ("negative_ttl_hours", DEFAULT_NEGATIVE_TTL_HOURS)):
+            try:
+                hours = float(ICP.get_param(f"networker_contact.registry_cache_{key}", default))
+            except ValueError:
+                hours = default
+            ttls.append(timedelta(hours=hours))
+        return tuple(ttls)
+
+    def _is_fresh(self, fetched_at, found, now, ttls):
+        return bool(fetched_at) and fetched_at >= now - (ttls[0] if found else ttls[1])
+
+    def _napr_fresh(self, now, ttls):
+        return self._is_fresh(self.napr_fetched_at, self.legal_status == "functioning", now, ttls)
+
+    def _companyinfo_fresh(self, now, ttls, with_director=False):
+        if with_director and self.corp_id and not self.director_fetched:
+            return False
+        return self._is_fresh(self.companyinfo_fetched_at, bool(self.corp_id), now, ttls)
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_entries(self, vats):
+        return {entry.vat: entry for entry in self.sudo().search([("vat", "in", list(vats))])}
+
+    @api.model
+    def _lookup_many(self, vats, companyinfo=True, director_vats=(), force=False):
+        """Return ``{vat: RegistryLookup}`` for ``vats``, from the cache when it is fresh.
+
+        Stale or missing entries are fetched concurrently (NAPR and, when ``companyinfo``
+        is set, companyinfo.ge), stored, then returned with the errors of this run.
+        ``force`` ignores the cache.
+        """
+        vats = list(dict.fromkeys(vat.strip() for vat in vats if vat and vat.strip()))
+        director_vats = {vat.strip() for vat in director_vats}
+        now = fields.Datetime.now()
+        ttls = self._get_ttls()
+        entries = self._get_entries(vats)
+
+        napr_vats, companyinfo_vats = [], []
+        for vat in vats:
+            entry = entries.get(vat, self.browse())
+            if force or not entry._napr_fresh(now, ttls):
+                napr_vats.append(vat)
+            if companyinfo and (force or not entry._companyinfo_fresh(now, ttls, vat in director_vats)):
+                companyinfo_vats.append(vat)
+        if len(napr_vats) < len(vats):
+            _logger.info("NAPR cache: %d of %d VAT(s) served from cache", len(vats) - len(napr_vats), len(vats))
+
+        fetched = registry_client.get_client().lookup_many(napr_vats, companyinfo_vats, director_vats)
+        if fetched:
+            self._store(fetched.values(), companyinfo_vats, director_vats, now)
+            entries = self._get_entries(vats)
+
+        results = {}
+        for vat in vats:
+            entry = entries.get(vat)
+            lookup = fetched.get(vat)
+            napr_error = lookup.napr_error if lookup else None
+            api_error = lookup.api_error if lookup else None
+            results[vat] = registry_client.RegistryLookup(
+                vat,
+                None if napr_error or not entry or not entry.napr_fetched_at else (entry.legal_name or ""),
+                entry.legal_code_id or "" if entry else "",
+                napr_error,
+                entry.corp_id if entry else None,
+                None if api_error or not entry else entry.corp_name or None,
+                entry.director if entry else None,
+                api_error,
+            )
+        return results
+
+    @api.model
+    def _lookup(self, vat, companyinfo=False, force=False):
+        return self._lookup_many([vat], companyinfo=companyinfo, force=force).get(vat.strip())
+
+    @api.model
+    def _store(self, lookups, companyinfo_vats=(), director_vats=(), now=None):
+        """Upsert the successful parts of ``RegistryLookup`` results.
+
+        companyinfo.ge data is only stored for ``companyinfo_vats``, the VATs it was asked for.
+        """
+        now = now or fields.Datetime.now()
+        companyinfo_vats = set(companyinfo_vats)
+        napr_rows, companyinfo_rows = [], []
+        for lookup in lookups:
+            if lookup.napr_name is not None and not lookup.napr_error:
+                napr_rows.append(SQL(
+                    "(%s, %s, %s, %s, %s)", lookup.vat, lookup.napr_name or None, lookup.legal_code_id or None,
+                    "functioning" if lookup.napr_name else "not_found", now,
+                ))
+            if not lookup.api_error and lookup.vat in companyinfo_vats:
+                companyinfo_rows.append(SQL(
+                    "(%s, %s, %s, %s, %s, %s)", lookup.vat, lookup.corp_id, lookup.api_name, lookup.director,
+                    lookup.vat in director_vats, now,
+                ))
+        if napr_rows:
+            self.env.cr.execute(SQL(
+                """INSERT INTO napr_registry_cache (vat, legal_name, legal_code_id, legal_status, napr_fetched_at)
+                   VALUES %s
+                   ON CONFLICT (vat) DO UPDATE SET
+                       legal_name = EXCLUDED.legal_name,
+                       legal_code_id = EXCLUDED.legal_code_id,
+                       legal_status = EXCLUDED.legal_status,
+                       napr_fetched_at = EXCLUDED.napr_fetched_at""",
+                SQL(", ").join(napr_rows),
+            ))
+        if companyinfo_rows:
+            self.env.cr.execute(SQL(
+                """INSERT INTO napr_registry_cache (vat, corp_id, corp_name, director, director_fetched, companyinfo_fetched_at)
+                   VALUES %s
+                   ON CONFLICT (vat) DO UPDATE SET
+                       corp_id = EXCLUDED.corp_id,
+                       corp_name = EXCLUDED.corp_name,
+                       director = COALESCE(EXCLUDED.director, napr_registry_cache.director),
+                       director_fetched = EXCLUDED.director_fetched OR napr_registry_cache.director_fetched,
+                       companyinfo_fetched_at = EXCLUDED.companyinfo_fetched_at""",
+                SQL(", ").join(companyinfo_rows),
+            ))
+        if napr_rows or companyinfo_rows:
+            self.invalidate_model()
+
+    @api.autovacuum
+    def _gc_stale_entries(self):
+        limit_date = fields.Datetime.now() - timedelta(days=STALE_ENTRY_DAYS)
+        self.env.cr.execute(SQL(
+            """DELETE FROM napr_registry_cache
+                WHERE COALESCE(napr_fetched_at, companyinfo_fetched_at) < %s
+                  AND COALESCE(companyinfo_fetched_at, napr_fetched_at) < %s""",
+            limit_date, limit_date,
+        ))
+        _logger.info("NAPR cache: removed %d stale entries", self.env.cr.rowcount)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import logging
+from urllib.parse import parse_qsl, urlsplit, urlencode
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+
+def blob_key(url):
+    """Identify a GetBlob document by its query parameters, whatever the host or their order."""
+    parts = urlsplit(url or "")
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return urlencode(query) if query else parts.path
+
+
+class NaprRegistryDocument(models.Model):
+    """Registry documents already attached to a partner, by GetBlob key and DJVU checksum.
+
+    The fetch wizard skips indexed documents before any download, so refreshing a
+    known company only fetches new filings. A forced refresh downloads them again but
+    converts and re-attaches only those whose checksum changed. Deleting the
+    attachment makes the document new again.
+    """
+    _name = "napr.registry.document"
+    _description = "NAPR Registry Document"
+    _order = "partner_id, file_name"
+    _rec_name = "file_name"
+    _log_access = False
+
+    partner_id = fields.Many2one("res.partner", required=True, ondelete="cascade", readonly=True)
+    blob_key = fields.Char("GetBlob Key", required=True, readonly=True)
+    file_name = fields.Char(readonly=True)
+    source_sha256 = fields.Char("DJVU SHA-256", readonly=True)
+    attachment_id = fields.Many2one("ir.attachment", ondelete="set null", readonly=True)
+    fetched_at = fields.Datetime(readonly=True)
+
+    _sql_constraints = [
+        ("partner_blob_unique", "UNIQUE(partner_id, blob_key)", "One index entry per partner and document."),
+    ]
+
+    @api.model
+    def _get_known(self, partner):
+        """Return ``{blob_key: entry}`` of the documents of ``partner`` still attached."""
+        entries = self.sudo().search([("partner_id", "=", partner.id), ("attachment_id", "!=", False)])
+        return {entry.blob_key: entry for entry in entries}
+
+    @api.model
+    def _record(self, partner, fetched_attachments):
+        """Upsert the index from ``(FetchedDocument, ir.attachment)`` pairs."""
+        now = fields.Datetime.now()
+        # One row per key: a key repeated in one INSERT ... ON CONFLICT statement is an error
+        rows = {
+            blob_key(f.doc["bid_url"]): SQL("(%s, %s, %s, %s, %s, %s)", partner.id, blob_key(f.doc["bid_url"]),
+                                             f.file_name, f.sha256, attachment.id, now)
+            for f, attachment in fetched_attachments
+        }
+        if not rows:
+            return
+        self.env.cr.execute(SQL(
+            """INSERT INTO napr_registry_document (partner_id, blob_key, file_name, source_sha256, attachment_id, fetched_at)
+               VALUES %s
+               ON CONFLICT (partner_id, blob_key) DO UPDATE SET
+                   file_name = EXCLUDED.file_name,
+                   source_sha256 = COALESCE(EXCLUDED.source_sha256, napr_registry_document.source_sha256),
+                   attachment_id = EXCLUDED.attachment_id,
+                   fetched_at = EXCLUDED.fetched_at""",
+            SQL(", ").join(rows.values()),
+        ))
+        self.invalidate_model()
+        _logger.info("NAPR: indexed %d document(s) of partner %s", len(rows), partner.id)
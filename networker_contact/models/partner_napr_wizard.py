@@ -7,13 +7,14 @@ import time
 import logging
 import requests
 import html as _html
-import subprocess
-import tempfile
 from urllib.parse import urljoin
 
 from odoo import fields, models, _
 from odoo.exceptions import UserError
 
+from ..tools import djvu_pipeline, registry_client
+from . import napr_registry_document
+
 _logger = logging.getLogger(__name__)
 
 # ---- Endpoints
@@ -21,14 +22,13 @@ CAPTCHA_ENTRY_URL = "https://enreg.reestri.gov.ge/main.php?m=new_index"
 CAPTCHA_SEED_URL  = "https://enreg.reestri.gov.ge/simple-php-captcha-master/icaptcha.php"
 CAPTCHA_IMG_URL   = "https://enreg.reestri.gov.ge/simple-php-captcha-master/simple-php-captcha.php"
 RESULT_URL        = "https://enreg.reestri.gov.ge/main.php"        # show_legal_person / show_app
-SEARCH_URL        = "https://enreg.reestri.gov.ge/main.php"        # VAT search
 DEA_RESULT_URL    = "https://enreg.reestri.gov.ge/_dea/main.php"   # _dea show_app sometimes lives here
 DJVU_HOST         = "https://bs.napr.gov.ge"
 
 # ---- Patterns
-DJVU_SIG = b"AT&TFORM"
+# Attachments are created by batches of about this many bytes
+ATTACH_BATCH_BYTES = 32 * 1024 * 1024
 ID_REGEX = re.compile(r"საიდენტიფიკაციო კოდი</td>\s*<td><strong>(\d+)</strong>")
-LEGAL_REGEX = re.compile(r"show_legal_person\((\d+)\)", re.I)
 PID_REGEX   = re.compile(r"show_app\((\d+)\s*,", re.I)
 
 # greedy but safe: handles single/double quotes, relative/absolute urls, &amp; etc.
@@ -53,8 +53,15 @@ class PartnerNaprFetchWizard(models.TransientModel):
     vat           = fields.Char(readonly=True)
     captcha_image = fields.Binary(string="CAPTCHA", readonly=True)
     captcha_text  = fields.Char(string="Enter CAPTCHA")
-    convert_to_pdf = fields.Boolean(string="Convert DJVU to PDF", default=True, 
-                                   help="Automatically convert DJVU files to PDF format")
+    conversion_profile = fields.Selection([
+        ("none", "Keep DJVU"),
+        ("preview", "Preview first, full PDF in background"),
+        ("archive", "Archive (reduced resolution)"),
+        ("full", "Full fidelity"),
+    ], string="PDF Conversion", default="preview", required=True,
+        help="Preview attaches a first-page PDF in seconds and replaces it with the full "
+             "conversion in the background.")
+    force_refresh = fields.Boolean(help="Download documents already attached again and update those that changed.")
     _cookie_json  = fields.Text(string="Session Cookies", readonly=True)
 
     # -------------------------------------------------------------------------
@@ -116,30 +123,7 @@ class PartnerNaprFetchWizard(models.TransientModel):
 
     def _extract_legal_name(self, html: str) -> str:
         """Extract legal name from the search results table"""
-        import re
-        
-        # Based on your example, the name is in a td with whitespace around it
-        # Look for pattern like: <td valign="top">     შპს ტრონიქს ჯორჯია  </td>
-        name_pattern = r'<td valign="top">\s*([^\d<][^<]*?)\s*</td>'
-        matches = re.findall(name_pattern, html or "", re.DOTALL | re.MULTILINE)
-        
-        for match in matches:
-            cleaned = match.strip()
-            # Valid company name: 
-            # - Not empty, not just numbers
-            # - Not status text like "აქტიური"
-            # - Not legal form like "შეზღუდული პასუხისმგებლობის საზოგადოება"
-            # - Contains Georgian characters or common prefixes
-            if (cleaned and 
-                not re.match(r'^\d+$', cleaned) and
-                cleaned not in ['', '&nbsp;'] and
-                'აქტიური' not in cleaned and
-                'შეზღუდული პასუხისმგებლობის საზოგადოება' not in cleaned and
-                ('შპს' in cleaned or 'ოოო' in cleaned or 'სს' in cleaned or
-                 any('ა' <= c <= 'ჰ' for c in cleaned))):
-                return cleaned
-                
-        return ""
+        return registry_client.extract_legal_name(html)
 
     def _extract_docs(self, html: str, vat: str, company_id: str):
         docs = []
@@ -160,75 +144,78 @@ class PartnerNaprFetchWizard(models.TransientModel):
         _logger.debug("NAPR: extracted %d docs (company_id=%s)", len(docs), company_id)
         return docs
 
-    def _convert_djvu_to_pdf(self, djvu_content: bytes, filename: str) -> tuple[bytes, str]:
-        """
-        Convert DJVU content to PDF using ddjvu system tool
-        Returns: (content_bytes, new_filename)
+    def _attach_fetched_documents(self, fetched, replace=None):
+        """Attach ``FetchedDocument`` files to the partner; return ``(attached, converted)``.
+
+        ``attached`` lists ``(FetchedDocument, ir.attachment)`` pairs. Documents whose
+        ``bid_url`` is in ``replace`` overwrite that attachment instead (changed filings).
+        Files are read one at a time and passed as ``raw`` (no base64 copy); attachments
+        are created in batches of at most ``ATTACH_BATCH_BYTES`` so that memory stays
+        bounded however many documents the company has. Attached and duplicate documents
+        are recorded in ``napr.registry.document``.
         """
-        if not self.convert_to_pdf:
-            return djvu_content, filename
-            
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.djvu', delete=False) as djvu_file, \
-                 tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as pdf_file:
-                
-                # Write DJVU data
-                djvu_file.write(djvu_content)
-                djvu_file.flush()
-                
-                # Convert using ddjvu (requires djvulibre-bin package)
-                result = subprocess.run([
-                    'ddjvu', '-format=pdf', djvu_file.name, pdf_file.name
-                ], capture_output=True, timeout=60, text=True)
-                
-                if result.returncode == 0:
-                    # Read the converted PDF
-                    with open(pdf_file.name, 'rb') as f:
-                        pdf_content = f.read()
-                    
-                    if pdf_content:
-                        new_filename = filename.replace('.djvu', '.pdf')
-                        _logger.info("NAPR: converted %s to PDF (%d bytes)", filename, len(pdf_content))
-                        return pdf_content, new_filename
-                else:
-                    _logger.warning("NAPR: ddjvu conversion failed for %s: %s", filename, result.stderr)
-                    
-        except FileNotFoundError:
-            _logger.error("NAPR: ddjvu command not found. Install djvulibre-bin package.")
-        except subprocess.TimeoutExpired:
-            _logger.error("NAPR: ddjvu conversion timeout for %s", filename)
-        except Exception as e:
-            _logger.warning("NAPR: DJVU to PDF conversion failed for %s: %s", filename, e)
-        finally:
-            # Cleanup temp files
-            try:
-                import os
-                if 'djvu_file' in locals():
-                    os.unlink(djvu_file.name)
-                if 'pdf_file' in locals():
-                    os.unlink(pdf_file.name)
-            except:
-                pass
-        
-        # Return original if conversion fails
-        return djvu_content, filename
+        Attachment = self.env["ir.attachment"]
+        replace = replace or {}
+        names = {f.file_name for f in fetched if f.file}
+        existing = {attachment.name: attachment for attachment in Attachment.search([
+            ("res_model", "=", "res.partner"),
+            ("res_id", "=", self.partner_id.id),
+            ("name", "in", list(names)),
+        ])} if names else {}
+
+        attached, duplicates, converted = [], [], 0
+        batch, batch_fetched, batch_bytes = [], [], 0
+        for f in fetched:
+            if not f.file:
+                continue
+            attachment = replace.get(f.doc["bid_url"])
+            if attachment:
+                attachment.write({"name": f.file_name, "raw": f.file.read(), "mimetype": f.mimetype})
+                f.file.close()
+                attached.append((f, attachment))
+                converted += f.converted
+                _logger.info("NAPR: updated changed %s", f.file_name)
+                continue
+            if f.file_name in existing:
+                _logger.info("NAPR: duplicate %s skipped", f.file_name)
+                if existing[f.file_name]:
+                    duplicates.append((f, existing[f.file_name]))
+                continue
+            # Names attached by this run are only known once their batch is created
+            existing[f.file_name] = None
+            raw = f.file.read()
+            f.file.close()
+            batch.append({
+                "name": f.file_name,
+                "res_model": "res.partner",
+                "res_id": self.partner_id.id,
+                "raw": raw,
+                "mimetype": f.mimetype,
+            })
+            batch_fetched.append(f)
+            batch_bytes += len(raw)
+            converted += f.converted
+            _logger.info("NAPR: attached %s (%d bytes)", f.file_name, len(raw))
+            if batch_bytes >= ATTACH_BATCH_BYTES:
+                attached.extend(zip(batch_fetched, Attachment.create(batch)))
+                batch, batch_fetched, batch_bytes = [], [], 0
+        if batch:
+            attached.extend(zip(batch_fetched, Attachment.create(batch)))
+        self.env["napr.registry.document"]._record(self.partner_id, attached + duplicates)
+        return attached, converted
 
     # -------------------------------------------------------------------------
     # VAT -> legal_code_id
     # -------------------------------------------------------------------------
-    def _resolve_legal_code_id(self, session: requests.Session, vat: str) -> str:
-        params = {"c": "search", "m": "find_legal_persons", "s_legal_person_idnumber": vat.strip()}
-        r = session.get(SEARCH_URL, params=params, timeout=30)
-        html = self._decode_html(r)
-        _logger.debug("NAPR: search url=%s status=%s len=%d", r.url, r.status_code, len(html))
-        r.raise_for_status()
-        found = LEGAL_REGEX.findall(html)
-        if not found:
-            self._dump_text(f"napr_search_{vat}", html)
+    def _resolve_legal_code_id(self, vat: str) -> str:
+        lookup = self.env["napr.registry.cache"]._lookup(vat)
+        if lookup.napr_error:
+            raise lookup.napr_error
+        if not lookup.legal_code_id:
             _logger.error("NAPR: could not resolve legal_code_id for VAT=%s", vat)
             return ""
-        _logger.info("NAPR: resolved legal_code_id=%s for VAT=%s", found[0], vat)
-        return found[0]
+        _logger.info("NAPR: resolved legal_code_id=%s for VAT=%s", lookup.legal_code_id, vat)
+        return lookup.legal_code_id
 
     # -------------------------------------------------------------------------
     # Actions
@@ -271,13 +258,13 @@ class PartnerNaprFetchWizard(models.TransientModel):
 
         vat = self.partner_id.vat.strip()
         cap = self.captcha_text.strip()
-        _logger.info("NAPR: fetch partner=%s VAT=%s captcha='%s' convert_pdf=%s", 
-                    self.partner_id.display_name, vat, cap, self.convert_to_pdf)
+        _logger.info("NAPR: fetch partner=%s VAT=%s captcha='%s' profile=%s",
+                    self.partner_id.display_name, vat, cap, self.conversion_profile)
 
         s = self._session_from_cookies()
 
         # 1) VAT -> legal_code_id
-        legal_code_id = self._resolve_legal_code_id(s, vat)
+        legal_code_id = self._resolve_legal_code_id(vat)
         if not legal_code_id:
             raise UserError(_("Could not resolve legal_code_id for VAT %s") % vat)
 
@@ -321,61 +308,56 @@ class PartnerNaprFetchWizard(models.TransientModel):
             self._dump_text(f"napr_result_{vat}", r.content)
             raise UserError(_("No .djvu links found on the page."))
 
-        # 4) Attach downloads
-        Attachment = self.env["ir.attachment"]
-        created = 0
-        converted = 0
-        
-        for d in docs:
-            try:
-                fr = s.get(d["bid_url"], timeout=60)
-                fr.raise_for_status()
-                content = fr.content or b""
-                ctype = (fr.headers.get("Content-Type") or "").lower()
-                _logger.debug("NAPR: GET %s -> ctype=%s bytes=%d", d["bid_url"], ctype, len(content))
-                
-                if not (content.startswith(DJVU_SIG) or "djvu" in ctype):
-                    _logger.info("NAPR: skip %s (not djvu)", d["file_name"])
-                    continue
-
-                # Convert DJVU to PDF if requested
-                final_content, final_name = self._convert_djvu_to_pdf(content, d["file_name"])
-                
-                # Track if conversion happened
-                if final_name.endswith('.pdf') and d["file_name"].endswith('.djvu'):
-                    converted += 1
-                    final_mimetype = "application/pdf"
-                else:
-                    final_mimetype = fr.headers.get("Content-Type") or "image/vnd.djvu"
-
-                # Check for duplicates
-                exists = Attachment.search([
-                    ("res_model", "=", "res.partner"),
-                    ("res_id", "=", self.partner_id.id),
-                    ("name", "=", final_name),
-                ], limit=1)
-                if exists:
-                    _logger.info("NAPR: duplicate %s skipped", final_name)
-                    continue
-
-                Attachment.create({
-                    "name": final_name,
-                    "res_model": "res.partner",
-                    "res_id": self.partner_id.id,
-                    "datas": base64.b64encode(final_content),
-                    "mimetype": final_mimetype,
-                })
-                created += 1
-                _logger.info("NAPR: attached %s (%d bytes)", final_name, len(final_content))
-                
-            except Exception as e:
-                _logger.warning("NAPR: failed downloading %s: %s", d.get("file_name"), e)
+        # 4) Skip documents already attached (napr.registry.document) before any
+        #    download; a forced refresh re-downloads them but only keeps changed ones.
+        known = self.env["napr.registry.document"]._get_known(self.partner_id)
+        replace, skip_sha256 = {}, set()
+        if self.force_refresh:
+            skip_sha256 = {entry.source_sha256 for entry in known.values() if entry.source_sha256}
+            for doc in docs:
+                entry = known.get(napr_registry_document.blob_key(doc["bid_url"]))
+                if entry:
+                    replace[doc["bid_url"]] = entry.attachment_id
+        else:
+            new_docs = [doc for doc in docs if napr_registry_document.blob_key(doc["bid_url"]) not in known]
+            if len(new_docs) < len(docs):
+                _logger.info("NAPR: %d of %d document(s) already attached", len(docs) - len(new_docs), len(docs))
+            if not new_docs:
+                return {
+                    "type": "ir.actions.client",
+                    "tag": "display_notification",
+                    "params": {"title": "NAPR", "message": "No new files attached.", "sticky": False},
+                }
+            docs = new_docs
+
+        # 5) Download and convert concurrently, then attach in bounded batches.
+        #    Previews keep their DJVU, converted in full by napr.conversion.job later.
+        convert = self.conversion_profile != "none"
+        preview = self.conversion_profile == "preview"
+        options = djvu_pipeline.PROFILES.get(self.conversion_profile, djvu_pipeline.PDF_OPTIONS)
+        with self.env["napr.conversion.cache"]._batch(" ".join(options)) as cache:
+            fetched = djvu_pipeline.fetch_documents(s, docs, convert=convert, cache=cache, options=options,
+                                                    keep_source=preview, skip_sha256=skip_sha256)
+        try:
+            attached, converted = self._attach_fetched_documents(fetched, replace)
+            created = len(attached)
+            if preview:
+                self.env["napr.conversion.job"]._enqueue(
+                    [(attachment, f.source) for f, attachment in attached if f.source])
+        finally:
+            for f in fetched:
+                if f.file:
+                    f.file.close()
+                if f.source:
+                    f.source.close()
 
         # Build result message
         if created:
             msg_parts = [f"Attached {created} file(s)"]
             if converted:
                 msg_parts.append(f"({converted} converted to PDF)")
+                if preview:
+                    msg_parts.append("- full PDFs follow in the background")
             msg = " ".join(msg_parts) + "."
         else:
             msg = "No new files attached."
@@ -396,19 +378,12 @@ class PartnerNaprFetchWizard(models.TransientModel):
         vat = self.partner_id.vat.strip()
         _logger.info("NAPR: fetching legal name for VAT=%s", vat)
 
-        s = self._new_session()
-        
-        # Search for the company using VAT
-        params = {"c": "search", "m": "find_legal_persons", "s_legal_person_idnumber": vat}
-        r = s.get(SEARCH_URL, params=params, timeout=30)
-        html = self._decode_html(r)
-        _logger.debug("NAPR: search url=%s status=%s len=%d", r.url, r.status_code, len(html))
-        r.raise_for_status()
-
-        # Extract legal name from the response
-        legal_name = self._extract_legal_name(html)
+        # Search for the company using VAT, through the registry cache
+        lookup = self.env["napr.registry.cache"]._lookup(vat)
+        if lookup.napr_error:
+            raise lookup.napr_error
+        legal_name = lookup.napr_name
         if not legal_name:
-            self._dump_text(f"napr_legal_name_search_{vat}", html)
             raise UserError(_("Could not find legal name for VAT %s") % vat)
 
         # Update partner name
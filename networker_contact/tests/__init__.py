@@ -0,0 +1,4 @@
+from . import test_napr_conversion_cache
+from . import test_napr_registry_cache
+from . import test_napr_registry_document
+from . import test_partner_napr_wizard
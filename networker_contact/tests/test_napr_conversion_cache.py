@@ -0,0 +1,41 @@
+from odoo.tests import TransactionCase, tagged
+
+OPTIONS = "-format=pdf"
+
+
+@tagged("post_install", "-at_install")
+class TestNaprConversionCache(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Cache = self.env["napr.conversion.cache"]
+
+    def _entry(self, sha):
+        return self.Cache.search([("source_sha256", "=", sha), ("options", "=", OPTIONS)])
+
+    def test_put_then_get(self):
+        with self.Cache._batch(OPTIONS) as cache:
+            self.assertIsNone(cache.get("aaa"))
+            cache.put("aaa", b"%PDF-1.4 cached")
+            # Stored once, a second put is ignored
+            cache.put("aaa", b"%PDF-1.4 other")
+            for _i in range(2):
+                with cache.get("aaa") as pdf:
+                    self.assertEqual(pdf.read(), b"%PDF-1.4 cached")
+            # Hits are counted when the batch closes
+            self.assertEqual(self._entry("aaa").hits, 0)
+        self.assertRecordValues(self._entry("aaa"), [{"hits": 2, "size": len(b"%PDF-1.4 cached")}])
+
+    def test_options_are_part_of_the_key(self):
+        with self.Cache._batch(OPTIONS) as cache:
+            cache.put("bbb", b"%PDF-1.4 full")
+        with self.Cache._batch("-format=pdf -page=1") as cache:
+            self.assertIsNone(cache.get("bbb"))
+
+    def test_no_hits_counted_on_error(self):
+        with self.Cache._batch(OPTIONS) as cache:
+            cache.put("ccc", b"%PDF-1.4")
+        with self.assertRaises(ZeroDivisionError), self.Cache._batch(OPTIONS) as cache:
+            cache.get("ccc").close()
+            1 / 0
+        self.assertEqual(self._entry("ccc").hits, 0)
@@ -0,0 +1,114 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.networker_contact.tools import registry_client
+
+
+class FakeRegistry:
+    """Stands for ``RegistryClient``: answers from ``names`` and records what it was asked."""
+
+    def __init__(self, names, errors=()):
+        self.names = names
+        self.errors = set(errors)
+        self.calls = []
+
+    def lookup_many(self, napr_vats=(), companyinfo_vats=(), director_vats=()):
+        napr_vats, companyinfo_vats = list(napr_vats), list(companyinfo_vats)
+        self.calls.append((napr_vats, companyinfo_vats))
+        results = {}
+        for vat in dict.fromkeys(napr_vats + companyinfo_vats):
+            napr_error = ConnectionError("NAPR is down") if vat in self.errors and vat in napr_vats else None
+            name = self.names.get(vat, "")
+            results[vat] = registry_client.RegistryLookup(
+                vat,
+                name if vat in napr_vats and not napr_error else None,
+                "1234" if name and vat in napr_vats else None,
+                napr_error,
+                f"corp-{vat}" if name and vat in companyinfo_vats else None,
+                name or None if vat in companyinfo_vats else None,
+                None,
+                None,
+            )
+        return results
+
+    @property
+    def napr_vats(self):
+        return [vat for napr_vats, _companyinfo_vats in self.calls for vat in napr_vats]
+
+
+@tagged("post_install", "-at_install")
+class TestNaprRegistryCache(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Cache = self.env["napr.registry.cache"]
+        self.registry_fake = FakeRegistry({"400000001": "შპს ტესტი", "400000002": "შპს მეორე"})
+        self.startPatcher(patch.object(registry_client, "get_client", return_value=self.registry_fake))
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("networker_contact.registry_cache_ttl_hours", 24)
+        ICP.set_param("networker_contact.registry_cache_negative_ttl_hours", 2)
+
+    def _age(self, vat, hours):
+        entry = self.Cache.search([("vat", "=", vat)])
+        entry.write({
+            "napr_fetched_at": entry.napr_fetched_at - timedelta(hours=hours),
+            "companyinfo_fetched_at": entry.companyinfo_fetched_at and entry.companyinfo_fetched_at - timedelta(hours=hours),
+        })
+
+    def test_miss_then_hit(self):
+        result = self.Cache._lookup("400000001")
+        self.assertEqual(result.napr_name, "შპს ტესტი")
+        self.assertEqual(result.legal_code_id, "1234")
+        self.assertEqual(self.Cache._lookup(" 400000001 ").napr_name, "შპს ტესტი")
+        self.assertEqual(self.registry_fake.napr_vats, ["400000001"])
+        self.assertEqual(self.Cache.search([("vat", "=", "400000001")]).legal_status, "functioning")
+
+    def test_stale_entry_is_refetched(self):
+        self.Cache._lookup("400000001")
+        self._age("400000001", 23)
+        self.Cache._lookup("400000001")
+        self.assertEqual(len(self.registry_fake.calls), 1)
+        self._age("400000001", 2)
+        self.Cache._lookup("400000001")
+        self.assertEqual(self.registry_fake.napr_vats, ["400000001", "400000001"])
+
+    def test_not_found_uses_negative_ttl(self):
+        self.assertEqual(self.Cache._lookup("499999999").napr_name, "")
+        self.assertEqual(self.Cache.search([("vat", "=", "499999999")]).legal_status, "not_found")
+        self._age("499999999", 1)
+        self.assertEqual(self.Cache._lookup("499999999").napr_name, "")
+        self.assertEqual(len(self.registry_fake.calls), 1)
+        self._age("499999999", 2)
+        self.Cache._lookup("499999999")
+        self.assertEqual(self.registry_fake.napr_vats, ["499999999", "499999999"])
+
+    def test_force(self):
+        self.Cache._lookup("400000001")
+        self.Cache._lookup("400000001", force=True)
+        self.assertEqual(self.registry_fake.napr_vats, ["400000001", "400000001"])
+
+    def test_errors_are_not_cached(self):
+        self.registry_fake.errors.add("400000002")
+        result = self.Cache._lookup("400000002")
+        self.assertIsNone(result.napr_name)
+        self.assertTrue(result.napr_error)
+        self.assertFalse(self.Cache.search([("vat", "=", "400000002")]))
+        self.registry_fake.errors.clear()
+        self.assertEqual(self.Cache._lookup("400000002").napr_name, "შპს მეორე")
+        self.assertEqual(self.registry_fake.napr_vats, ["400000002", "400000002"])
+
+    def test_lookup_many_fetches_only_missing(self):
+        self.Cache._lookup_many(["400000001"])
+        results = self.Cache._lookup_many(["400000001", "400000002", "", "400000002"])
+        self.assertEqual(list(results), ["400000001", "400000002"])
+        self.assertEqual(results["400000002"].api_name, "შპს მეორე")
+        self.assertEqual(self.registry_fake.calls[1], (["400000002"], ["400000002"]))
+
+    def test_companyinfo_cached_separately(self):
+        self.Cache._lookup("400000001")
+        self.assertEqual(self.registry_fake.calls, [(["400000001"], [])])
+        result = self.Cache._lookup_many(["400000001"])["400000001"]
+        self.assertEqual(self.registry_fake.calls[1], ([], ["400000001"]))
+        self.assertEqual((result.napr_name, result.corp_id), ("შპს ტესტი", "corp-400000001"))
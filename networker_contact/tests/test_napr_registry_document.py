@@ -0,0 +1,60 @@
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.networker_contact.models.napr_registry_document import blob_key
+from odoo.addons.networker_contact.tools.djvu_pipeline import FetchedDocument
+
+BLOB_URL = "https://enreg.reestri.gov.ge/main.php?m=new_index&c=app&a=getblob&id=42"
+
+
+@tagged("post_install", "-at_install")
+class TestNaprRegistryDocument(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env["res.partner"].create({"name": "Registry Test LLC", "is_company": True})
+        cls.Document = cls.env["napr.registry.document"]
+
+    def _attachment(self, name):
+        return self.env["ir.attachment"].create({
+            "name": name, "raw": b"%PDF-1.4", "res_model": "res.partner", "res_id": self.partner.id,
+        })
+
+    def _fetched(self, url, file_name, sha256):
+        return FetchedDocument({"bid_url": url}, None, file_name, "application/pdf", True, None, None, sha256)
+
+    def test_blob_key(self):
+        self.assertEqual(
+            blob_key(BLOB_URL),
+            blob_key("http://other-host/main.php?id=42&a=getblob&c=app&m=new_index"),
+        )
+        self.assertNotEqual(blob_key(BLOB_URL), blob_key(BLOB_URL.replace("id=42", "id=43")))
+        self.assertEqual(blob_key("https://example.com/files/doc.djvu"), "/files/doc.djvu")
+        self.assertEqual(blob_key(None), "")
+
+    def test_record_and_known(self):
+        first = self._attachment("statute.pdf")
+        self.Document._record(self.partner, [
+            (self._fetched(BLOB_URL, "statute.pdf", "aaa"), first),
+            # The same document listed twice in one fetch
+            (self._fetched(BLOB_URL.replace("&id=42", "") + "&id=42", "statute.pdf", "aaa"), first),
+        ])
+        known = self.Document._get_known(self.partner)
+        self.assertEqual(list(known), [blob_key(BLOB_URL)])
+        self.assertRecordValues(known[blob_key(BLOB_URL)], [{
+            "file_name": "statute.pdf", "source_sha256": "aaa", "attachment_id": first.id,
+        }])
+
+        # A forced refresh re-attaches the document; unknown checksums keep the stored one
+        second = self._attachment("statute (1).pdf")
+        self.Document._record(self.partner, [(self._fetched(BLOB_URL, "statute (1).pdf", None), second)])
+        entries = self.Document.search([("partner_id", "=", self.partner.id)])
+        self.assertRecordValues(entries, [{
+            "file_name": "statute (1).pdf", "source_sha256": "aaa", "attachment_id": second.id,
+        }])
+
+    def test_deleted_attachment_is_unknown(self):
+        attachment = self._attachment("extract.pdf")
+        self.Document._record(self.partner, [(self._fetched(BLOB_URL, "extract.pdf", "bbb"), attachment)])
+        attachment.unlink()
+        self.assertEqual(self.Document._get_known(self.partner), {})
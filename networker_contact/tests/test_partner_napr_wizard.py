@@ -0,0 +1,46 @@
+import io
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.networker_contact.models.napr_registry_document import blob_key
+from odoo.addons.networker_contact.tools.djvu_pipeline import FetchedDocument
+
+BLOB_URL = "https://bs.napr.gov.ge/GetBlob?pid=7&bid=42"
+
+
+@tagged("post_install", "-at_install")
+class TestPartnerNaprFetchWizard(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env["res.partner"].create({"name": "Registry Test LLC", "is_company": True, "vat": "400000001"})
+
+    def _wizard(self, profile):
+        return self.env["partner.napr.fetch.wizard"].create({"partner_id": self.partner.id, "conversion_profile": profile})
+
+    def _attachment(self, name, raw, mimetype):
+        return self.env["ir.attachment"].create({
+            "name": name, "raw": raw, "mimetype": mimetype, "res_model": "res.partner", "res_id": self.partner.id,
+        })
+
+    def _fetched(self, file_name, raw, mimetype, converted):
+        return FetchedDocument({"bid_url": BLOB_URL, "file_name": "statute.djvu"}, io.BytesIO(raw), file_name,
+                               mimetype, converted, None, None, "sha")
+
+    def test_refresh_renames_djvu_converted_to_pdf(self):
+        attachment = self._attachment("statute.djvu", b"AT&TFORM old", "image/vnd.djvu")
+        fetched = self._fetched("statute.pdf", b"%PDF-1.4 new", "application/pdf", True)
+        attached, converted = self._wizard("full")._attach_fetched_documents([fetched], {BLOB_URL: attachment})
+        self.assertEqual(attached, [(fetched, attachment)])
+        self.assertEqual(converted, 1)
+        self.assertRecordValues(attachment, [{"name": "statute.pdf", "mimetype": "application/pdf"}])
+        self.assertEqual(attachment.raw, b"%PDF-1.4 new")
+
+    def test_refresh_renames_pdf_kept_as_djvu(self):
+        attachment = self._attachment("statute.pdf", b"%PDF-1.4 old", "application/pdf")
+        fetched = self._fetched("statute.djvu", b"AT&TFORM new", "image/vnd.djvu", False)
+        self._wizard("none")._attach_fetched_documents([fetched], {BLOB_URL: attachment})
+        self.assertRecordValues(attachment, [{"name": "statute.djvu", "mimetype": "image/vnd.djvu"}])
+        known = self.env["napr.registry.document"]._get_known(self.partner)
+        self.assertEqual(known[blob_key(BLOB_URL)].file_name, "statute.djvu")
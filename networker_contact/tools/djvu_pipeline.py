@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""Concurrent, memory-bounded download and DJVU -> PDF conversion of NAPR documents.
+
+Downloads run on a thread pool over one pooled session and are streamed in chunks into
+spooled temporary files (kept in memory while small, moved to disk beyond
+``SPOOL_MAX_SIZE``); the DJVU signature is sniffed from the first chunk so other
+content is dropped without being read. Every DJVU file is handed to the conversion pool
+as soon as it arrives, so conversions overlap the remaining downloads. Conversion is
+done by ``ddjvu`` subprocesses reading and writing files; the pool is sized to the CPU
+count, which bounds the number of concurrent ``ddjvu`` processes.
+
+Nothing here touches the ORM: results are open files returned to the caller, which
+creates the attachments and closes the files.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+DJVU_SIG = b"AT&TFORM"
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT = 60
+CONVERT_TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+# Downloads larger than this are spooled to disk instead of memory
+SPOOL_MAX_SIZE = 2 * 1024 * 1024
+# ddjvu arguments of each conversion profile; also part of the conversion cache key.
+# ddjvu has no greyscale output, the archive profile lowers resolution and JPEG quality.
+PROFILES = {
+    "preview": ("-format=pdf", "-page=1", "-scale=100", "-quality=50"),
+    "archive": ("-format=pdf", "-scale=150", "-quality=60"),
+    "full": ("-format=pdf",),
+}
+PDF_OPTIONS = PROFILES["full"]
+
+# file is an open binary file positioned at 0, or None when the document was skipped
+# or failed (see error); source is the original DJVU when it was asked to be kept and
+# sha256 the checksum of the downloaded DJVU
+FetchedDocument = namedtuple("FetchedDocument", [
+    "doc", "file", "file_name", "mimetype", "converted", "error", "source", "sha256",
+], defaults=(None,))
+
+
+def pdf_filename(filename):
+    return filename.replace(".djvu", ".pdf")
+
+
+def _spool(content=b""):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    if content:
+        spool.write(content)
+        spool.seek(0)
+    return spool
+
+
+def convert_djvu_file(djvu_path, filename, timeout=CONVERT_TIMEOUT, options=PDF_OPTIONS):
+    """Convert the DJVU file at ``djvu_path`` with ``ddjvu``.
+
+    Returns the PDF as an open file (its path is already unlinked), or None when the
+    conversion fails.
+    """
+    pdf_path = None
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+            pdf_path = pdf_file.name
+
+        # Convert using ddjvu (requires djvulibre-bin package)
+        result = subprocess.run(["ddjvu", *options, djvu_path, pdf_path],
+                                capture_output=True, timeout=timeout, text=True)
+        if result.returncode == 0:
+            if os.path.getsize(pdf_path):
+                _logger.info("NAPR: converted %s to PDF (%d bytes)", filename, os.path.getsize(pdf_path))
+                return open(pdf_path, "rb")
+        else:
+            _logger.warning("NAPR: ddjvu conversion failed for %s: %s", filename, result.stderr)
+    except FileNotFoundError:
+        _logger.error("NAPR: ddjvu command not found. Install djvulibre-bin package.")
+    except subprocess.TimeoutExpired:
+        _logger.error("NAPR: ddjvu conversion timeout for %s", filename)
+    except Exception as e:
+        _logger.warning("NAPR: DJVU to PDF conversion failed for %s: %s", filename, e)
+    finally:
+        if pdf_path:
+            try:
+                # An open PDF stays readable until it is closed
+                os.unlink(pdf_path)
+            except OSError:
+                pass
+    return None
+
+
+def convert_djvu_to_pdf(djvu_content, filename, timeout=CONVERT_TIMEOUT, options=PDF_OPTIONS):
+    """Convert DJVU bytes with ``ddjvu``; return ``(content, filename, converted)``.
+
+    The original content and name are returned when the conversion fails.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".djvu") as djvu_file:
+        djvu_file.write(djvu_content)
+        djvu_file.flush()
+        pdf = convert_djvu_file(djvu_file.name, filename, timeout, options)
+    if pdf is None:
+        return djvu_content, filename, False
+    with pdf:
+        return pdf.read(), pdf_filename(filename), True
+
+
+def convert_cached(djvu_content, filename, cache=None, options=PDF_OPTIONS, timeout=CONVERT_TIMEOUT):
+    """``convert_djvu_to_pdf`` through ``cache``, if any.
+
+    ``cache.get(sha256)`` returns an open PDF file or None, ``cache.put(sha256, pdf)``
+    stores PDF bytes.
+    """
+    if cache is None:
+        return convert_djvu_to_pdf(djvu_content, filename, timeout, options)
+    source_sha256 = hashlib.sha256(djvu_content).hexdigest()
+    cached = cache.get(source_sha256)
+    if cached is not None:
+        with cached:
+            pdf = cached.read()
+        _logger.info("NAPR: reused cached PDF of %s (%d bytes)", filename, len(pdf))
+        return pdf, pdf_filename(filename), True
+    content, new_filename, converted = convert_djvu_to_pdf(djvu_content, filename, timeout, options)
+    if converted:
+        cache.put(source_sha256, content)
+    return content, new_filename, converted
+
+
+def _download(session, doc, timeout):
+    """Stream ``doc`` into a spooled file; return ``(file, content_type, sha256)``.
+
+    ``file`` is None when the first bytes and the content type show it is not a DJVU.
+    """
+    with session.get(doc["bid_url"], timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        ctype = response.headers.get("Content-Type") or ""
+        chunks = response.iter_content(CHUNK_SIZE)
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= len(DJVU_SIG):
+                break
+        if not (head.startswith(DJVU_SIG) or "djvu" in ctype.lower()):
+            return None, ctype, None
+
+        digest = hashlib.sha256(head)
+        spool = _spool()
+        spool.write(head)
+        size = len(head)
+        for chunk in chunks:
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+    _logger.debug("NAPR: GET %s -> ctype=%s bytes=%d", doc["bid_url"], ctype.lower(), size)
+    spool.seek(0)
+    return spool, ctype, digest.hexdigest()
+
+
+def _release(spool, keep_source):
+    """Return ``spool`` rewound with ``keep_source``, close it and return None otherwise."""
+    if keep_source:
+        spool.seek(0)
+        return spool
+    spool.close()
+    return None
+
+
+def _convert_download(spool, filename, options, keep_source=False):
+    """Convert a downloaded DJVU; return ``(file, converted, source)``.
+
+    ``spool`` is returned as ``source`` (rewound) with ``keep_source``, closed otherwise
+    once it is replaced by the PDF.
+    """
+    # ddjvu needs a path: copy the spool chunk by chunk into a named file
+    with tempfile.NamedTemporaryFile(suffix=".djvu") as djvu_file:
+        shutil.copyfileobj(spool, djvu_file, CHUNK_SIZE)
+        djvu_file.flush()
+        pdf = convert_djvu_file(djvu_file.name, filename, options=options)
+    if pdf is None:
+        spool.seek(0)
+        return spool, False, None
+    return pdf, True, _release(spool, keep_source)
+
+
+def fetch_documents(session, docs, convert=True, download_workers=DOWNLOAD_WORKERS, convert_workers=None,
+                    timeout=DOWNLOAD_TIMEOUT, cache=None, options=PDF_OPTIONS, keep_source=False,
+                    skip_sha256=()):
+    """Download ``docs`` (dicts with ``bid_url`` and ``file_name``) and convert them.
+
+    ``options`` are the ddjvu arguments (see ``PROFILES``), ``cache`` an optional
+    conversion cache for them (see ``convert_cached``), and ``keep_source`` keeps the
+    DJVU of converted documents. The cache is only called from the calling thread: a
+    download is looked up as it completes, before it reaches the conversion pool, and
+    conversions are stored once the pool is done. Downloads whose
+    checksum is in ``skip_sha256`` (unchanged documents) are dropped unconverted. Returns one
+    ``FetchedDocument`` per doc, in the order of ``docs``; the caller must close their
+    files.
+    """
+    if not docs:
+        return []
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=download_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    results = [None] * len(docs)
+    conversions = {}
+    convert_workers = convert_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=min(download_workers, len(docs)), thread_name_prefix="napr-dl") as downloads, \
+         ThreadPoolExecutor(max_workers=convert_workers, thread_name_prefix="napr-ddjvu") as converter:
+        pending = {downloads.submit(_download, session, doc, timeout): index for index, doc in enumerate(docs)}
+        for future in as_completed(pending):
+            index = pending[future]
+            doc = docs[index]
+            try:
+                spool, ctype, source_sha256 = future.result()
+            except Exception as e:
+                _logger.warning("NAPR: failed downloading %s: %s", doc.get("file_name"), e)
+                results[index] = FetchedDocument(doc, None, doc["file_name"], None, False, e, None)
+                continue
+            if spool is None:
+                _logger.info("NAPR: skip %s (not djvu)", doc["file_name"])
+                results[index] = FetchedDocument(doc, None, doc["file_name"], None, False, None, None)
+                continue
+            if source_sha256 in skip_sha256:
+                _logger.info("NAPR: skip %s (unchanged)", doc["file_name"])
+                spool.close()
+                results[index] = FetchedDocument(doc, None, doc["file_name"], None, False, None, None, source_sha256)
+                continue
+            mimetype = ctype or "image/vnd.djvu"
+            if convert:
+                cached = cache.get(source_sha256) if cache is not None else None
+                if cached is not None:
+                    _logger.info("NAPR: reused cached PDF of %s", doc["file_name"])
+                    results[index] = FetchedDocument(
+                        doc, cached, pdf_filename(doc["file_name"]), "application/pdf", True, None,
+                        _release(spool, keep_source), source_sha256)
+                    continue
+                future = converter.submit(_convert_download, spool, doc["file_name"], options, keep_source)
+                conversions[future] = (index, mimetype, source_sha256)
+            else:
+                results[index] = FetchedDocument(doc, spool, doc["file_name"], mimetype, False, None, None,
+                                                 source_sha256)
+
+        for future in as_completed(conversions):
+            index, mimetype, source_sha256 = conversions[future]
+            doc = docs[index]
+            try:
+                file, converted, source = future.result()
+            except Exception as e:
+                _logger.warning("NAPR: failed converting %s: %s", doc.get("file_name"), e)
+                results[index] = FetchedDocument(doc, None, doc["file_name"], None, False, e, None)
+                continue
+            if converted and cache is not None:
+                cache.put(source_sha256, file.read())
+                file.seek(0)
+            results[index] = FetchedDocument(
+                doc, file, pdf_filename(doc["file_name"]) if converted else doc["file_name"],
+                "application/pdf" if converted else mimetype, converted, None, source, source_sha256)
+    return results
@@ -0,0 +1,172 @@
+"""Concurrent client for the Georgian company registries (NAPR and companyinfo.ge).
+
+Lookups of many VAT numbers are fanned out on a thread pool. HTTP goes through a
+bounded pool of keep-alive sessions, and a semaphore per host caps the number of
+concurrent requests each registry receives. Nothing here touches the ORM: callers
+collect all results first and write them afterwards, so the wall time of a bulk lookup
+follows the slowest request instead of the sum of all of them.
+"""
+import logging
+import queue
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+NAPR_SEARCH_URL = "https://enreg.reestri.gov.ge/main.php"
+COMPANYINFO_SEARCH_URL = "https://api.companyinfo.ge/api/corporations/search"
+COMPANYINFO_DETAILS_URL = "https://api.companyinfo.ge/api/company-info/{}"
+DIRECTOR_ROLE = "დირექტორი"
+
+# napr_name is None when NAPR was not asked or the request failed, "" when it found no
+# legal name; api_name is None when companyinfo.ge was not asked, failed or has no match
+RegistryLookup = namedtuple("RegistryLookup", [
+    "vat", "napr_name", "legal_code_id", "napr_error", "corp_id", "api_name", "director", "api_error",
+])
+
+_LEGAL_CODE_RE = re.compile(r"show_legal_person\((\d+)\)", re.I)
+_NAME_CELL_RE = re.compile(r'<td valign="top">\s*([^\d<][^<]*?)\s*</td>', re.DOTALL | re.MULTILINE)
+_DIGITS_RE = re.compile(r'^\d+$')
+
+
+def extract_legal_name(html):
+    """Extract the legal name from a NAPR search result page ("" when none is found)."""
+    for match in _NAME_CELL_RE.findall(html or ""):
+        cleaned = match.strip()
+        if (cleaned and
+            not _DIGITS_RE.match(cleaned) and
+            cleaned not in ['', '&nbsp;'] and
+            'აქტიური' not in cleaned and
+            'შეზღუდული პასუხისმგებლობის საზოგადოება' not in cleaned and
+            ('შპს' in cleaned or 'ოოო' in cleaned or 'სს' in cleaned or
+             any('ა' <= c <= 'ჰ' for c in cleaned))):
+            return cleaned
+    return ""
+
+
+class RegistryClient:
+    """Thread-safe registry client.
+
+    :param max_workers: lookups running in parallel
+    :param per_host: concurrent requests allowed per registry host
+    :param timeout: timeout of every HTTP request, in seconds
+    """
+
+    def __init__(self, max_workers=16, per_host=6, timeout=30):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self._sessions = queue.LifoQueue()
+        for _i in range(max_workers):
+            self._sessions.put(self._new_session())
+        self._host_limits = {}
+        self._host_limits_lock = threading.Lock()
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update({"User-Agent": "Mozilla/5.0 (X11; Linux x86_64)"})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.per_host)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @contextmanager
+    def _session(self):
+        # Bounded: at most max_workers sessions exist, a caller waits for a free one
+        session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _get(self, url, params=None):
+        with self._host_limit(url), self._session() as session:
+            response = session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def fetch_napr(self, vat):
+        """Return ``(legal_name, legal_code_id)`` of the NAPR search, ``""`` for what is not found."""
+        response = self._get(NAPR_SEARCH_URL, params={
+            "c": "search", "m": "find_legal_persons", "s_legal_person_idnumber": vat,
+        })
+        response.encoding = response.apparent_encoding or "utf-8"
+        html = response.text
+        legal_code = _LEGAL_CODE_RE.search(html)
+        return extract_legal_name(html), legal_code.group(1) if legal_code else ""
+
+    def fetch_companyinfo(self, vat, with_director=True):
+        """Return ``(corp_id, name, director)`` from companyinfo.ge, all None if it is unknown there."""
+        items = self._get(COMPANYINFO_SEARCH_URL, params={"idCode": vat}).json().get("items")
+        if not items:
+            return None, None, None
+        corp_id, name = items[0].get("id"), items[0].get("name")
+        director = None
+        if corp_id and with_director:
+            details = self._get(COMPANYINFO_DETAILS_URL.format(corp_id)).json()
+            director = next((
+                person["personName"] for person in details.get("persons") or ()
+                if person.get("personRole") == DIRECTOR_ROLE and person.get("personName")
+            ), None)
+        return str(corp_id) if corp_id else None, name, director
+
+    def lookup_many(self, napr_vats=(), companyinfo_vats=(), director_vats=()):
+        """Look VATs up in the registries in parallel; return ``{vat: RegistryLookup}``.
+
+        NAPR is asked for ``napr_vats``, companyinfo.ge for ``companyinfo_vats``, and the
+        director only for VATs in ``director_vats``. Errors are captured in the result
+        instead of being raised.
+        """
+        napr_vats = list(dict.fromkeys(vat for vat in napr_vats if vat))
+        companyinfo_vats = list(dict.fromkeys(vat for vat in companyinfo_vats if vat))
+        if not (napr_vats or companyinfo_vats):
+            return {}
+        director_vats = set(director_vats)
+        workers = min(self.max_workers, len(napr_vats) + len(companyinfo_vats))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="registry") as executor:
+            napr = {vat: executor.submit(self.fetch_napr, vat) for vat in napr_vats}
+            api = {vat: executor.submit(self.fetch_companyinfo, vat, vat in director_vats)
+                   for vat in companyinfo_vats}
+
+            results = {}
+            for vat in dict.fromkeys(napr_vats + companyinfo_vats):
+                napr_name = legal_code_id = napr_error = None
+                corp_id = api_name = director = api_error = None
+                if vat in napr:
+                    napr_error = napr[vat].exception()
+                    if not napr_error:
+                        napr_name, legal_code_id = napr[vat].result()
+                if vat in api:
+                    api_error = api[vat].exception()
+                    if not api_error:
+                        corp_id, api_name, director = api[vat].result()
+                results[vat] = RegistryLookup(
+                    vat, napr_name, legal_code_id, napr_error, corp_id, api_name, director, api_error)
+        return results
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client, so keep-alive connections survive between lookups."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RegistryClient()
+        return _client
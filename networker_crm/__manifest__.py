@@ -1,11 +1,13 @@
 {
     "name": "networker_crm",
     "version": "18.0.1.0.0",
-    "depends": ["web", "crm"],
+    "depends": ["web", "crm", "networker_contact"],
     "data": [
         "security/ir.model.access.csv",
         "data/crm_lead_actions.xml",
+        "data/ir_cron_data.xml",
         "views/lead_from_contacts_wizard_views.xml",
+        "views/lead_generation_job_views.xml",
         "views/crm_lead_kanban_inherit.xml",
     ],
     "assets": {
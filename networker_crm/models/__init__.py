@@ -1 +1,5 @@
 from . import lead_from_contacts_wizard
+from . import lead_generation_job
+from . import lead_candidate_cursor
+from . import res_partner
+from . import crm_lead
@@ -0,0 +1,11 @@
+from odoo import models, tools
+
+
+class CrmLead(models.Model):
+    _inherit = "crm.lead"
+
+    def init(self):
+        super().init()
+        # Anti/semi-join of the lead wizard's contact usage filter
+        tools.create_index(self.env.cr, "crm_lead_networker_active_partner_idx", self._table,
+                           ["partner_id"], where="active")
@@ -0,0 +1,37 @@
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class LeadCandidateCursor(models.Model):
+    """Last partner handed out by the lead wizard, per combination of its filters.
+
+    Kept out of ``ir.config_parameter``, whose writes clear the caches of every
+    worker, since the cursor moves on each generation.
+    """
+    _name = "lead.candidate.cursor"
+    _description = "Lead Candidate Cursor"
+    _rec_name = "filter_key"
+    _log_access = False
+
+    filter_key = fields.Char(required=True, readonly=True)
+    last_partner_id = fields.Integer(readonly=True)
+
+    _sql_constraints = [
+        ("filter_key_unique", "UNIQUE(filter_key)", "One cursor per filter."),
+    ]
+
+    @api.model
+    def _get_cursor(self, filter_key):
+        self.env.cr.execute(SQL(
+            "SELECT last_partner_id FROM lead_candidate_cursor WHERE filter_key = %s", filter_key,
+        ))
+        row = self.env.cr.fetchone()
+        return row[0] if row else 0
+
+    @api.model
+    def _set_cursor(self, filter_key, partner_id):
+        self.env.cr.execute(SQL(
+            """INSERT INTO lead_candidate_cursor (filter_key, last_partner_id) VALUES (%s, %s)
+               ON CONFLICT (filter_key) DO UPDATE SET last_partner_id = EXCLUDED.last_partner_id""",
+            filter_key, partner_id,
+        ))
@@ -1,8 +1,9 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.tools import SQL
 import logging
-import requests
-import re
+
+from odoo.addons.networker_contact.tools import registry_client
 
 _logger = logging.getLogger(__name__)
 
@@ -20,6 +21,10 @@ class LeadFromContactsWizard(models.TransientModel):
         ('used', 'Used Contacts'),
         ('never_used', 'Never Used Contacts')
     ], string="Contact Usage", default='never_used')
+    run_in_background = fields.Boolean(
+        "Run in Background",
+        help="Generate the leads in a background job processed in chunks, each committed on its own. "
+             "Use it for large batches; progress is shown on the CRM pipeline.")
 
     @api.model
     def default_get(self, fields_list):
@@ -57,97 +62,88 @@ class LeadFromContactsWizard(models.TransientModel):
         return dom
 
     def _filter_partners_with_fetchable_names(self, partners):
-        """Filter partners and fetch data from enreg.reestri.gov.ge and companyinfo.ge"""
-        valid_partners = []
-        session = requests.Session()
-        session.headers.update({
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64)",
-        })
-
-        for partner in partners:
-            if not partner.vat:
-                _logger.info("Partner %s has no VAT, skipping", partner.name)
+        """Filter partners and fetch data from enreg.reestri.gov.ge and companyinfo.ge
+
+        Lookups go through ``napr.registry.cache``; the ones it cannot answer run
+        concurrently and complete before any partner is written, so the HTTP requests
+        never hold the transaction's row locks.
+        """
+        with_vat = partners.filtered(lambda p: p.vat and p.vat.strip())
+        for partner in partners - with_vat:
+            _logger.info("Partner %s has no VAT, skipping", partner.name)
+
+        has_director = "x_studio_director" in with_vat._fields
+        lookups = self.env["napr.registry.cache"]._lookup_many(
+            with_vat.mapped("vat"),
+            director_vats=[p.vat for p in with_vat if has_director and not p.x_studio_director],
+        )
+
+        Partner = self.env['res.partner']
+        has_legal_status = 'x_studio_legal_status' in Partner._fields
+        has_legal_name = 'x_studio_legal_name' in Partner._fields
+        statuses = {}
+
+        def legal_status_id(status_name):
+            # Resolved once per run instead of once per partner
+            if status_name not in statuses:
+                status = has_legal_status and self._get_or_create_legal_status(status_name)
+                statuses[status_name] = status.id if status else None
+            return statuses[status_name]
+
+        # Collect every partner's updates first, then write partners sharing the same
+        # values together: one UPDATE (and one recompute) per distinct update
+        updates_by_partner = {}
+        valid_ids = []
+        for partner in with_vat:
+            lookup = lookups.get(partner.vat.strip())
+            if not lookup:
                 continue
-
-            legal_name_napr = None
-            try:
-                SEARCH_URL_NAPR = "https://enreg.reestri.gov.ge/main.php"
-                params_napr = {"c": "search", "m": "find_legal_persons", "s_legal_person_idnumber": partner.vat.strip()}
-                r_napr = session.get(SEARCH_URL_NAPR, params=params_napr, timeout=30)
-                r_napr.raise_for_status()
-                r_napr.encoding = r_napr.apparent_encoding or "utf-8"
-                html_napr = r_napr.text
-                legal_name_napr = self._extract_legal_name_from_html(html_napr)
-
-                if legal_name_napr:
-                    updates = {"name": legal_name_napr}
-                    if hasattr(partner, 'x_studio_legal_status'):
-                        legal_status_record = self._get_or_create_legal_status('ფუნქციონირებადი')
-                        if legal_status_record:
-                            updates["x_studio_legal_status"] = legal_status_record.id
-                    if hasattr(partner, 'x_studio_legal_name'):
-                        updates["x_studio_legal_name"] = legal_name_napr
-                    partner.write(updates)
-                    _logger.info("Partner %s: successfully fetched legal name '%s' from NAPR", partner.vat, legal_name_napr)
+            legal_name_napr = lookup.napr_name
+            updates = {}
+            if legal_name_napr:
+                updates["name"] = legal_name_napr
+                if legal_status_id('ფუნქციონირებადი'):
+                    updates["x_studio_legal_status"] = legal_status_id('ფუნქციონირებადი')
+                if has_legal_name:
+                    updates["x_studio_legal_name"] = legal_name_napr
+                _logger.info("Partner %s: successfully fetched legal name '%s' from NAPR", partner.vat, legal_name_napr)
+            else:
+                if legal_status_id('შეჩერებული'):
+                    updates["x_studio_legal_status"] = legal_status_id('შეჩერებული')
+                if lookup.napr_error:
+                    _logger.warning("Error fetching legal name for partner %s from NAPR: %s", partner.vat, lookup.napr_error)
                 else:
-                    updates = {}
-                    if hasattr(partner, 'x_studio_legal_status'):
-                        legal_status_record = self._get_or_create_legal_status('შეჩერებული')
-                        if legal_status_record:
-                            updates["x_studio_legal_status"] = legal_status_record.id
-                    if updates:
-                        partner.write(updates)
                     _logger.info("Partner %s: could not fetch legal name from NAPR, set status to 'შეჩერებული'", partner.vat)
 
-            except Exception as e:
-                updates = {}
-                if hasattr(partner, 'x_studio_legal_status'):
-                    legal_status_record = self._get_or_create_legal_status('შეჩერებული')
-                    if legal_status_record:
-                        updates["x_studio_legal_status"] = legal_status_record.id
-                if updates:
-                    partner.write(updates)
-                _logger.warning("Error fetching legal name for partner %s from NAPR: %s", partner.vat, e)
-
-            try:
-                search_url_api = "https://api.companyinfo.ge/api/corporations/search"
-                params_api = {"idCode": partner.vat.strip()}
-                r_search_api = session.get(search_url_api, params=params_api, timeout=30)
-                r_search_api.raise_for_status()
-                search_data = r_search_api.json()
-
-                if search_data.get("items"):
-                    corp_info = search_data["items"][0]
-                    corp_id = corp_info.get("id")
-                    legal_name_api = corp_info.get("name")
-
-                    if not legal_name_napr and legal_name_api:
-                        partner.name = legal_name_api
-
-                    if corp_id and hasattr(partner, 'x_studio_director') and not partner.x_studio_director:
-                        details_url_api = f"https://api.companyinfo.ge/api/company-info/{corp_id}"
-                        r_details_api = session.get(details_url_api, timeout=30)
-                        r_details_api.raise_for_status()
-                        details_data = r_details_api.json()
-
-                        if details_data.get("persons"):
-                            for person in details_data["persons"]:
-                                if person.get("personRole") == "დირექტორი":
-                                    director_name = person.get("personName")
-                                    if director_name:
-                                        partner.x_studio_director = director_name
-                                        _logger.info("Found director '%s' for partner %s", director_name, partner.name)
-                                        break
-                else:
-                    _logger.info("Partner %s: could not find corporation info on companyinfo.ge API", partner.vat)
-
-            except Exception as e:
-                _logger.warning("Error fetching data for partner %s from companyinfo.ge: %s", partner.vat, e)
-
-            if partner.name:
-                 valid_partners.append(partner)
+            if lookup.api_error:
+                _logger.warning("Error fetching data for partner %s from companyinfo.ge: %s", partner.vat, lookup.api_error)
+            elif lookup.api_name is None:
+                _logger.info("Partner %s: could not find corporation info on companyinfo.ge API", partner.vat)
+            else:
+                if not legal_name_napr and lookup.api_name:
+                    updates["name"] = lookup.api_name
+                if lookup.director and has_director and not partner.x_studio_director:
+                    updates["x_studio_director"] = lookup.director
+                    _logger.info("Found director '%s' for partner %s", lookup.director, updates.get("name", partner.name))
+
+            if updates:
+                updates_by_partner[partner.id] = updates
+            if updates.get("name") or partner.name:
+                valid_ids.append(partner.id)
+
+        self._write_partner_updates(updates_by_partner)
+        return Partner.browse(valid_ids)
 
-        return self.env['res.partner'].browse([p.id for p in valid_partners])
+    @api.model
+    def _write_partner_updates(self, updates_by_partner):
+        """Write ``{partner_id: vals}`` with one ``write`` per distinct ``vals``."""
+        groups = {}
+        for partner_id, vals in updates_by_partner.items():
+            groups.setdefault(tuple(sorted(vals.items())), []).append(partner_id)
+        for vals, partner_ids in groups.items():
+            self.env['res.partner'].browse(partner_ids).write(dict(vals))
+        if groups:
+            _logger.info("Updated %d partner(s) with %d write(s)", len(updates_by_partner), len(groups))
 
     def _get_or_create_legal_status(self, status_name):
         """Get or create a legal status record with the given name"""
@@ -163,19 +159,83 @@ class LeadFromContactsWizard(models.TransientModel):
 
     def _extract_legal_name_from_html(self, html):
         """Extract legal name from the NAPR search results"""
-        name_pattern = r'<td valign="top">\s*([^\d<][^<]*?)\s*</td>'
-        matches = re.findall(name_pattern, html or "", re.DOTALL | re.MULTILINE)
-        for match in matches:
-            cleaned = match.strip()
-            if (cleaned and
-                not re.match(r'^\d+$', cleaned) and
-                cleaned not in ['', '&nbsp;'] and
-                'აქტიური' not in cleaned and
-                'შეზღუდული პასუხისმგებლობის საზოგადოება' not in cleaned and
-                ('შპს' in cleaned or 'ოოო' in cleaned or 'სს' in cleaned or
-                 any('ა' <= c <= 'ჰ' for c in cleaned))):
-                return cleaned
-        return ""
+        return registry_client.extract_legal_name(html)
+
+    def _select_candidate_partners(self, domain, limit):
+        """Return up to ``limit`` partners matching ``domain`` and the contact usage filter.
+
+        The usage filter is an anti-join (never used) or semi-join (used) on active
+        ``crm.lead`` rows. Candidates are taken in ``id`` order after the last partner
+        returned by the previous run, wrapping around at the end, so successive runs
+        page through fresh candidates instead of retrying the same first ones. Each
+        query walks the ``id`` index and stops after ``limit`` rows.
+        """
+        Cursor = self.env["lead.candidate.cursor"]
+        cursor_key = self._candidate_cursor_key()
+        cursor = Cursor._get_cursor(cursor_key)
+
+        partner_ids = self._query_candidate_ids(domain, SQL("> %s", cursor), limit)
+        if len(partner_ids) < limit and cursor:
+            # Wrap around to the partners before the cursor
+            partner_ids += self._query_candidate_ids(domain, SQL("<= %s", cursor), limit - len(partner_ids))
+
+        if partner_ids:
+            Cursor._set_cursor(cursor_key, partner_ids[-1])
+        return self.env["res.partner"].browse(partner_ids)
+
+    def _candidate_cursor_key(self):
+        """Identify the wizard's partner filters, so that runs with different filters page independently.
+
+        The salesperson is left out: everyone running the same filter shares its rotation.
+        """
+        return "|".join([
+            self.contact_usage_filter or "",
+            ",".join(map(str, sorted(self.industry_ids.ids))),
+            ",".join(map(str, sorted(self.legal_form_ids.ids))),
+            "mobile" if self.has_mobile else "",
+        ])
+
+    def _query_candidate_ids(self, domain, id_condition, limit):
+        """Return the ids of up to ``limit`` candidates whose id satisfies ``id_condition``, in id order."""
+        query = self.env["res.partner"]._search(domain)
+        partner_id = SQL.identifier(query.table, "id")
+        lead_exists = SQL(
+            "EXISTS (SELECT 1 FROM crm_lead lead WHERE lead.partner_id = %s AND lead.active)", partner_id)
+        if self.contact_usage_filter == 'never_used':
+            query.add_where(SQL("NOT %s", lead_exists))
+        elif self.contact_usage_filter == 'used':
+            query.add_where(lead_exists)
+        query.add_where(SQL("%s %s", partner_id, id_condition))
+        query.order = partner_id
+        query.limit = limit
+        self.env.cr.execute(query.select(partner_id))
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _filter_contact_usage(self, partners, contact_usage_filter):
+        """Re-apply the contact usage filter to ``partners`` against the current leads."""
+        if contact_usage_filter not in ('used', 'never_used') or not partners:
+            return partners
+        self.env["crm.lead"].flush_model(["partner_id", "active"])
+        self.env.cr.execute(SQL(
+            "SELECT DISTINCT partner_id FROM crm_lead WHERE active AND partner_id = ANY(%s)", partners.ids,
+        ))
+        used_ids = {row[0] for row in self.env.cr.fetchall()}
+        if contact_usage_filter == 'used':
+            return partners.filtered(lambda p: p.id in used_ids)
+        return partners.filtered(lambda p: p.id not in used_ids)
+
+    @api.model
+    def _prepare_lead_values(self, partners, user):
+        return [
+            {
+                "name": f"Lead: {p.name}",
+                "partner_id": p.id,
+                "user_id": user.id or False,
+                "type": "opportunity",
+            }
+            for p in partners
+        ]
 
     def action_generate(self):
         self.ensure_one()
@@ -183,9 +243,8 @@ class LeadFromContactsWizard(models.TransientModel):
         if not limit:
             return {"type": "ir.actions.act_window_close"}
 
-        partners = self.env["res.partner"].search(self._build_partner_domain())
-
-        if not partners:
+        domain = self._build_partner_domain()
+        if not self.env["res.partner"].search_count(domain, limit=1):
             return {
                 "type": "ir.actions.client",
                 "tag": "display_notification",
@@ -197,19 +256,9 @@ class LeadFromContactsWizard(models.TransientModel):
                 }
             }
 
-        if self.contact_usage_filter != 'all':
-            existing_lead_partners_query = self.env["crm.lead"].read_group(
-                domain=[("partner_id", "in", partners.ids), ("active", "=", True)],
-                fields=["partner_id"], groupby=["partner_id"]
-            )
-            existing_lead_partner_ids = {res["partner_id"][0] for res in existing_lead_partners_query if res.get("partner_id")}
+        partners_to_process = self._select_candidate_partners(domain, limit)
 
-            if self.contact_usage_filter == 'never_used':
-                partners = partners.filtered(lambda p: p.id not in existing_lead_partner_ids)
-            elif self.contact_usage_filter == 'used':
-                partners = partners.filtered(lambda p: p.id in existing_lead_partner_ids)
-
-        if not partners:
+        if not partners_to_process:
             return {
                 "type": "ir.actions.client",
                 "tag": "display_notification",
@@ -221,7 +270,24 @@ class LeadFromContactsWizard(models.TransientModel):
                 }
             }
 
-        partners_to_process = partners[:limit]
+        if self.run_in_background:
+            job = self.env["lead.generation.job"].create({
+                "user_id": self.user_id.id or False,
+                "contact_usage_filter": self.contact_usage_filter,
+                "partner_ids": [fields.Command.set(partners_to_process.ids)],
+            })
+            return {
+                "type": "ir.actions.client",
+                "tag": "display_notification",
+                "params": {
+                    "title": _("Lead Generation Started"),
+                    "message": _("%(job)s will process %(count)s contact(s) in the background.",
+                                 job=job.name, count=len(partners_to_process)),
+                    "type": "info",
+                    "sticky": False,
+                    "next": {"type": "ir.actions.act_window_close"},
+                }
+            }
 
         valid_partners = self._filter_partners_with_fetchable_names(partners_to_process)
         
@@ -237,17 +303,7 @@ class LeadFromContactsWizard(models.TransientModel):
                 }
             }
 
-        partners_to_create = valid_partners
-        
-        to_create = [
-            {
-                "name": f"Lead: {p.name}",
-                "partner_id": p.id,
-                "user_id": self.user_id.id or False,
-                "type": "opportunity",
-            }
-            for p in partners_to_create
-        ]
+        to_create = self._prepare_lead_values(valid_partners, self.user_id)
         
         if not to_create:
             return {
@@ -0,0 +1,132 @@
+from odoo import api, fields, models, _
+import logging
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 25
+
+
+class LeadGenerationJob(models.Model):
+    """Lead generation running in the background, chunk by chunk.
+
+    The candidate partners are stored on the job; the cron processes them in chunks of
+    ``chunk_size`` (registry lookups, partner updates, lead creation), committing after
+    each chunk. The contact usage filter is checked again for every chunk, since other
+    jobs or users may have created leads meanwhile. A job interrupted by a crash or a
+    worker restart resumes with the partners it had not processed yet.
+    """
+    _name = "lead.generation.job"
+    _description = "Lead Generation Job"
+    _order = "id desc"
+
+    name = fields.Char(compute="_compute_name")
+    user_id = fields.Many2one("res.users", string="Salesperson")
+    state = fields.Selection([
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+        ("cancelled", "Cancelled"),
+    ], default="queued", required=True, index=True, readonly=True)
+    chunk_size = fields.Integer(default=DEFAULT_CHUNK_SIZE)
+    contact_usage_filter = fields.Selection([
+        ('all', 'All Contacts'),
+        ('used', 'Used Contacts'),
+        ('never_used', 'Never Used Contacts')
+    ], string="Contact Usage", default='all', readonly=True)
+    partner_ids = fields.Many2many(
+        "res.partner", "lead_generation_job_partner_rel", "job_id", "partner_id",
+        string="Candidates", readonly=True)
+    processed_partner_ids = fields.Many2many(
+        "res.partner", "lead_generation_job_processed_rel", "job_id", "partner_id",
+        string="Processed", readonly=True)
+    lead_ids = fields.Many2many("crm.lead", string="Leads", readonly=True)
+    total_count = fields.Integer("Candidates", readonly=True)
+    processed_count = fields.Integer("Processed", readonly=True)
+    lead_count = fields.Integer("Leads Created", readonly=True)
+    progress = fields.Float(compute="_compute_progress")
+    error = fields.Text(readonly=True)
+
+    @api.depends("create_date")
+    def _compute_name(self):
+        for job in self:
+            job.name = _("Lead generation #%s", job.id) if job.id else _("New lead generation")
+
+    @api.depends("processed_count", "total_count")
+    def _compute_progress(self):
+        for job in self:
+            job.progress = 100.0 * job.processed_count / job.total_count if job.total_count else 0.0
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        jobs = super().create(vals_list)
+        for job in jobs:
+            job.total_count = len(job.partner_ids)
+        self.env.ref("networker_crm.ir_cron_run_lead_generation_jobs")._trigger()
+        return jobs
+
+    def action_cancel(self):
+        self.filtered(lambda j: j.state in ("queued", "running")).write({"state": "cancelled"})
+
+    def action_retry(self):
+        self.filtered(lambda j: j.state == "failed").write({"state": "queued", "error": False})
+        self.env.ref("networker_crm.ir_cron_run_lead_generation_jobs")._trigger()
+
+    def action_open_leads(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": "crm.lead",
+            "name": self.name,
+            "view_mode": "list,form",
+            "domain": [("id", "in", self.lead_ids.ids)],
+        }
+
+    # -------------------------------------------------------------------------
+    # Processing
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_run_jobs(self):
+        """Run queued jobs and resume interrupted ones, committing after every chunk."""
+        for job in self.search([("state", "in", ("queued", "running"))], order="id"):
+            job.state = "running"
+            self.env.cr.commit()
+            try:
+                while job.state == "running" and job._run_next_chunk():
+                    self.env.cr.commit()
+                    # Picks up a cancellation made from the UI meanwhile
+                    job.invalidate_recordset(["state"])
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Lead generation job %s failed", job.id)
+                job.write({"state": "failed", "error": str(e)})
+            self.env.cr.commit()
+
+    def _run_next_chunk(self):
+        """Process the next chunk of candidates; return False once none is left."""
+        self.ensure_one()
+        remaining = self.partner_ids - self.processed_partner_ids
+        if not remaining:
+            self.state = "done"
+            _logger.info("Lead generation job %s done: %d lead(s) from %d candidate(s)",
+                         self.id, self.lead_count, self.total_count)
+            return False
+
+        chunk = remaining.sorted("id")[:max(self.chunk_size, 1)]
+        Wizard = self.env["lead.from.contacts.wizard"]
+        fetchable = Wizard._filter_partners_with_fetchable_names(chunk)
+        # Right before creating the leads, as late as possible
+        valid_partners = Wizard._filter_contact_usage(fetchable, self.contact_usage_filter)
+        if len(valid_partners) < len(fetchable):
+            _logger.info("Lead generation job %s: %d partner(s) skipped, their leads changed meanwhile",
+                         self.id, len(fetchable) - len(valid_partners))
+        leads = self.env["crm.lead"].create(Wizard._prepare_lead_values(valid_partners, self.user_id))
+        self.write({
+            "processed_partner_ids": [fields.Command.link(partner.id) for partner in chunk],
+            "lead_ids": [fields.Command.link(lead.id) for lead in leads],
+            "processed_count": self.processed_count + len(chunk),
+            "lead_count": self.lead_count + len(leads),
+        })
+        _logger.info("Lead generation job %s: %d/%d candidate(s) processed, %d lead(s) created",
+                     self.id, self.processed_count, self.total_count, self.lead_count)
+        return True
@@ -0,0 +1,20 @@
+from odoo import models, tools
+
+# Columns the lead wizard filters companies on (``_build_partner_domain``). The Studio
+# ones only exist in some databases; upgrade the module after adding one to index it.
+CANDIDATE_FILTER_COLUMNS = ("x_studio_industries", "industry_id", "x_legal_forms_id", "x_studio_legal_form")
+
+
+class ResPartner(models.Model):
+    _inherit = "res.partner"
+
+    def init(self):
+        super().init()
+        # Candidate scans walk companies in id order (see _select_candidate_partners)
+        tools.create_index(self.env.cr, "res_partner_networker_company_id_idx", self._table,
+                           ["id"], where="is_company")
+        for column in CANDIDATE_FILTER_COLUMNS:
+            if not tools.column_exists(self.env.cr, self._table, column):
+                continue
+            tools.create_index(self.env.cr, f"res_partner_networker_{column}_idx", self._table,
+                               [column, "id"], where="is_company")
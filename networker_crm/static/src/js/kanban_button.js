@@ -2,15 +2,48 @@
 import { registry } from "@web/core/registry";
 import { KanbanController } from "@web/views/kanban/kanban_controller";
 import { kanbanView } from "@web/views/kanban/kanban_view";
+import { useService } from "@web/core/utils/hooks";
+import { onMounted, onWillStart, onWillUnmount, useState } from "@odoo/owl";
+
+const JOB_POLL_INTERVAL = 10000;
 
 class NetworkerCrmKanbanController extends KanbanController {
     static template = "networker_crm.CustomKanbanView";
     setup() {
         super.setup();
         this.actionService = this.env.services.action;
+        this.orm = useService("orm");
+        this.leadJobs = useState({ count: 0, progress: 0 });
+        onWillStart(() => this.loadLeadJobs());
+        onMounted(() => {
+            // Only poll while a job is in progress; new jobs are picked up when the wizard closes
+            this.leadJobsTimer = setInterval(() => this.leadJobs.count && this.loadLeadJobs(), JOB_POLL_INTERVAL);
+        });
+        onWillUnmount(() => clearInterval(this.leadJobsTimer));
+    }
+    async loadLeadJobs() {
+        const jobs = await this.orm.searchRead(
+            "lead.generation.job",
+            [["state", "in", ["queued", "running"]]],
+            ["processed_count", "total_count"]
+        );
+        const total = jobs.reduce((sum, job) => sum + job.total_count, 0);
+        const processed = jobs.reduce((sum, job) => sum + job.processed_count, 0);
+        const hadJobs = this.leadJobs.count > 0;
+        this.leadJobs.count = jobs.length;
+        this.leadJobs.progress = total ? Math.floor((100 * processed) / total) : 0;
+        if (hadJobs && !jobs.length) {
+            // A background job just finished: show its leads
+            await this.model.load();
+        }
     }
     async openGenerateWizard() {
-        await this.actionService.doAction("networker_crm.action_lead_from_contacts_wizard");
+        await this.actionService.doAction("networker_crm.action_lead_from_contacts_wizard", {
+            onClose: () => this.loadLeadJobs(),
+        });
+    }
+    async openLeadJobs() {
+        await this.actionService.doAction("networker_crm.action_lead_generation_job");
     }
 }
 
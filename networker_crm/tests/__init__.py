@@ -0,0 +1 @@
+from . import test_candidate_selection
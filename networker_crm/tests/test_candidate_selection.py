@@ -0,0 +1,91 @@
+from unittest.mock import MagicMock, patch
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.networker_contact.tools import registry_client
+
+
+@tagged("post_install", "-at_install")
+class TestCandidateSelection(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partners = cls.env["res.partner"].create([
+            {"name": f"Candidate {i}", "is_company": True} for i in range(5)
+        ])
+        cls.domain = [("id", "in", cls.partners.ids)]
+        cls.env["crm.lead"].create([
+            {"name": "Open lead", "partner_id": cls.partners[1].id, "type": "opportunity"},
+            {"name": "Archived lead", "partner_id": cls.partners[2].id, "type": "opportunity", "active": False},
+        ])
+
+    def _wizard(self, contact_usage_filter="all", **values):
+        wizard = self.env["lead.from.contacts.wizard"].create(dict(values, contact_usage_filter=contact_usage_filter))
+        self.env["lead.candidate.cursor"]._set_cursor(wizard._candidate_cursor_key(), 0)
+        return wizard
+
+    def test_pages_in_id_order_and_wraps_around(self):
+        wizard = self._wizard()
+        p = self.partners
+        self.assertEqual(wizard._select_candidate_partners(self.domain, 2), p[0] | p[1])
+        self.assertEqual(wizard._select_candidate_partners(self.domain, 2), p[2] | p[3])
+        self.assertEqual(wizard._select_candidate_partners(self.domain, 2).ids, [p[4].id, p[0].id])
+        self.assertEqual(wizard._select_candidate_partners(self.domain, 2), p[1] | p[2])
+        # A limit above the number of candidates returns each of them once
+        self.assertEqual(wizard._select_candidate_partners(self.domain, 10).ids, (p[3:] + p[:3]).ids)
+
+    def test_usage_filters(self):
+        p = self.partners
+        never_used = self._wizard("never_used")._select_candidate_partners(self.domain, 10)
+        self.assertEqual(never_used, p - p[1])
+        used = self._wizard("used")._select_candidate_partners(self.domain, 10)
+        self.assertEqual(used, p[1])
+
+    def test_cursor_per_filter(self):
+        every = self._wizard()
+        never_used = self._wizard("never_used")
+        mobile = self._wizard(has_mobile=True)
+        self.assertNotEqual(every._candidate_cursor_key(), never_used._candidate_cursor_key())
+        self.assertNotEqual(every._candidate_cursor_key(), mobile._candidate_cursor_key())
+
+        self.assertEqual(every._select_candidate_partners(self.domain, 3), self.partners[:3])
+        self.assertEqual(never_used._select_candidate_partners(self.domain, 2), self.partners[0] | self.partners[2])
+        self.assertEqual(every._select_candidate_partners(self.domain, 1), self.partners[3])
+        self.assertEqual(never_used._select_candidate_partners(self.domain, 1), self.partners[3])
+
+    def test_salespeople_share_the_rotation(self):
+        other_user = self.env["res.users"].create({"name": "Other Salesperson", "login": "other_salesperson"})
+        mine = self._wizard()
+        # Not through _wizard(), which resets the cursor
+        theirs = self.env["lead.from.contacts.wizard"].create({"contact_usage_filter": "all", "user_id": other_user.id})
+        self.assertEqual(mine._select_candidate_partners(self.domain, 2), self.partners[:2])
+        self.assertEqual(theirs._select_candidate_partners(self.domain, 2), self.partners[2:4])
+
+    def test_filter_contact_usage(self):
+        Wizard = self.env["lead.from.contacts.wizard"]
+        p = self.partners
+        self.assertEqual(Wizard._filter_contact_usage(p, "all"), p)
+        self.assertEqual(Wizard._filter_contact_usage(p, "used"), p[1])
+        # Leads created after the selection, e.g. between two chunks of a background job
+        self.env["crm.lead"].create({"name": "New lead", "partner_id": p[3].id})
+        self.assertEqual(Wizard._filter_contact_usage(p, "never_used"), p[0] | p[2] | p[4])
+        self.assertFalse(Wizard._filter_contact_usage(p.browse(), "never_used"))
+
+    def test_partners_without_vat_are_skipped(self):
+        with_vat, blank, spaces = self.env["res.partner"].create([
+            {"name": "Old name", "is_company": True, "vat": "400000001"},
+            {"name": "No VAT", "is_company": True, "vat": ""},
+            {"name": "Blank VAT", "is_company": True, "vat": "   "},
+        ])
+        client = MagicMock()
+        client.lookup_many.side_effect = lambda napr_vats, companyinfo_vats, director_vats: {
+            vat: registry_client.RegistryLookup(vat, "შპს ტესტი", "1234", None, None, None, None, None)
+            for vat in napr_vats
+        }
+        with patch.object(registry_client, "get_client", return_value=client):
+            valid = self._wizard()._filter_partners_with_fetchable_names(with_vat | blank | spaces)
+        self.assertEqual(valid, with_vat)
+        self.assertEqual(with_vat.name, "შპს ტესტი")
+        napr_vats = client.lookup_many.call_args.args[0]
+        self.assertEqual(napr_vats, ["400000001"])